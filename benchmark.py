@@ -0,0 +1,217 @@
+import csv
+import json
+import os
+import sys
+import time
+from dijkstra.find_paths import Network
+from scenarios import ScenarioRunner
+from synthetic import SyntheticNetworkGenerator
+
+"""
+    Benchmark suite of the freight network model. Synthetic networks of
+    growing sizes are generated and the main stages of the model are timed
+    on each of them, to find out how they scale. Results are written as JSON
+    or CSV records, to be compared between versions of the model.
+"""
+
+
+class BenchmarkSuite(object):
+
+    """Times the stages of the model on synthetic networks of several sizes.
+
+    Each size multiplies the number of nodes and od pairs of BASE_CONFIG.
+    For every size a network is generated with the same seed and these
+    benchmarks are timed (see BENCHMARKS):
+        generate: Generation of the synthetic inputs.
+        graphs: Building dijkstra graphs of railway and roadway links.
+        all_pairs: Shortest paths between all pairs of nodes (only up to
+            ALL_PAIRS_MAX_NODES, as it grows with the cube of nodes).
+        build: Building the FreightNetwork from in memory workbooks.
+        cost_network: Costing the network at the current situation.
+        scenario_<policy>: Each policy of ScenarioRunner, from a snapshot of
+            the current situation.
+        optimizer_<name>: Each optimizer, from a snapshot of the network with
+            all possible traffic derived to railway."""
+
+    BASE_CONFIG = {"nodes": 50, "od_pairs": 500}
+    SIZES = [1, 2, 4]
+    SEED = 1
+    ALL_PAIRS_MAX_NODES = 100
+
+    # optimizers are run with small budgets, to keep them comparable
+    OPTIMIZERS = {
+        "links": lambda fn: fn.min_network_cost_deriving_links(True),
+        "ods": lambda fn: fn.min_network_cost_deriving_ods(True),
+        "rerouting": lambda fn: fn.min_network_cost_rerouting_links(True),
+        "annealing": lambda fn: fn.min_network_cost_annealing(
+            max_evaluations=200, seed=1)
+    }
+
+    BENCHMARKS = (["generate", "graphs", "all_pairs", "build",
+                   "cost_network"] +
+                  ["scenario_" + policy
+                   for policy in sorted(ScenarioRunner.POLICIES)] +
+                  ["optimizer_" + name for name in sorted(OPTIMIZERS)])
+
+    FIELDS = ["size", "nodes", "od_pairs", "rail_links", "road_links",
+              "rail_od_pairs", "road_od_pairs", "benchmark", "seconds"]
+
+    def __init__(self, sizes=None, base_config=None, benchmarks=None,
+                 seed=None):
+        """
+        Args:
+            sizes (opt): List of multipliers of BASE_CONFIG nodes and od pairs.
+            base_config (opt): Arguments of SyntheticNetworkGenerator for
+                size 1.
+            benchmarks (opt): List of benchmarks to run (see BENCHMARKS).
+            seed (opt): Seed of the synthetic networks.
+        """
+
+        self.sizes = sizes or self.SIZES
+        self.base_config = base_config or self.BASE_CONFIG
+        self.benchmarks = benchmarks or self.BENCHMARKS
+        self.seed = seed if seed is not None else self.SEED
+
+        for benchmark in self.benchmarks:
+            if benchmark not in self.BENCHMARKS:
+                raise ValueError("Unknown benchmark " + benchmark)
+
+        self.records = []
+
+    # PUBLIC
+    def run(self):
+        """Run the benchmarks on every size.
+
+        Returns:
+            List with a dictionary of results (see FIELDS) of each benchmark
+                run, by size.
+        """
+
+        for size in self.sizes:
+            self.run_size(size)
+
+        return self.records
+
+    def run_size(self, size):
+        """Run the benchmarks on a network of one size."""
+
+        config = dict(self.base_config)
+        config["nodes"] = int(config["nodes"] * size)
+        config["od_pairs"] = int(config["od_pairs"] * size)
+        generator = SyntheticNetworkGenerator(seed=self.seed, **config)
+
+        info = {"size": size, "nodes": config["nodes"],
+                "od_pairs": config["od_pairs"]}
+
+        self._time(info, "generate", generator.generate)
+        fn = generator.build()
+        info.update(self._get_network_info(fn))
+
+        # complete the generation record with the size of the network
+        for record in self.records:
+            if record["size"] == size:
+                record.update(info)
+
+        self._time(info, "graphs", self._build_graphs, fn)
+        if config["nodes"] <= self.ALL_PAIRS_MAX_NODES:
+            self._time(info, "all_pairs", self._find_all_pairs, fn)
+        self._time(info, "build", generator.build)
+        self._time(info, "cost_network", fn.cost_network)
+
+        baseline = fn.snapshot()
+        for policy in sorted(ScenarioRunner.POLICIES):
+            scenario = {"name": policy, "projection_factor": 1.0,
+                        "restrictions": False, "policy": policy}
+            self._time(info, "scenario_" + policy,
+                       ScenarioRunner.run_scenario, fn, baseline, scenario)
+
+        fn.restore(baseline)
+        fn.derive.all_to_railway()
+        fn.cost_network()
+        all_to_railway = fn.snapshot()
+        for name in sorted(self.OPTIMIZERS):
+            fn.restore(all_to_railway)
+            self._time(info, "optimizer_" + name, self.OPTIMIZERS[name], fn)
+
+    def write(self, path):
+        """Write records of the benchmarks to a JSON or CSV file."""
+
+        extension = os.path.splitext(path)[1].lower()
+
+        if extension == ".json":
+            with open(path, "w") as f:
+                json.dump(self.records, f, indent=2)
+
+        elif extension == ".csv":
+            with open(path, "wb") as f:
+                writer = csv.DictWriter(f, self.FIELDS)
+                writer.writeheader()
+                writer.writerows(self.records)
+
+        else:
+            raise ValueError("Benchmark output must be .json or .csv: " + path)
+
+    # PRIVATE
+    def _time(self, info, benchmark, function, *args):
+        """Time a function if the benchmark was asked for, keeping a record."""
+
+        if benchmark not in self.benchmarks:
+            return
+
+        start = time.time()
+        function(*args)
+        seconds = time.time() - start
+
+        record = dict(info)
+        record["benchmark"] = benchmark
+        record["seconds"] = seconds
+        self.records.append(record)
+
+        print "Benchmark", benchmark, "size", info["size"], ":", seconds
+
+    def _get_network_info(self, fn):
+
+        return {"rail_links": len(fn.rail.links),
+                "road_links": len(fn.road.links),
+                "rail_od_pairs": len(list(fn.rail.iter_od_pairs())),
+                "road_od_pairs": len(list(fn.road.iter_od_pairs()))}
+
+    def _build_graphs(self, fn):
+
+        for mn in (fn.rail, fn.road):
+            Network().create_graphs(mn.links)
+
+    def _find_all_pairs(self, fn):
+
+        for mn in (fn.rail, fn.road):
+            network = Network()
+            network.create_graphs(mn.links)
+            network.find_shortest_paths("isolated_gauges")
+
+
+def main(output=None, sizes=None):
+    """Run the benchmark suite and write its results.
+
+    Args:
+        output (opt): JSON or CSV file where results are written.
+        sizes (opt): List of sizes to benchmark.
+    """
+
+    suite = BenchmarkSuite(sizes)
+    suite.run()
+    suite.write(output or "benchmark.json")
+
+    return suite.records
+
+
+if __name__ == '__main__':
+
+    # parse arguments if called with arguments
+    if len(sys.argv) > 2:
+        main(sys.argv[1], [float(size) for size in sys.argv[2:]])
+
+    elif len(sys.argv) == 2:
+        main(sys.argv[1])
+
+    else:
+        main()
@@ -0,0 +1,116 @@
+import cPickle
+import os
+import sys
+import time
+from snapshot import get_ods_state, set_ods_state
+
+"""
+    Checkpoints of long optimization runs of a FreightNetwork. Networks are
+    saved once, as they are when the run starts, and every checkpoint only
+    keeps tons and paths of their od pairs and the position of the optimizer.
+"""
+
+
+class Checkpointer(object):
+
+    """Saves periodic checkpoints of an optimization run to a file.
+
+    The first time each checkpointer saves, railway and roadway networks are
+    pickled to a base file (path + ".base"), replacing any base file left by
+    another run. Every checkpoint then pickles to path the tons
+    and paths of the od pairs of both networks, the phase of the run, the
+    candidates of the optimizer and the position of the next one to be
+    analyzed. Files are replaced atomically, so an interrupted run always
+    leaves a complete checkpoint."""
+
+    EVERY_SECONDS = 300
+    PICKLE_PROTOCOL = 2
+
+    def __init__(self, path, every_seconds=None):
+        """
+        Args:
+            path: File where checkpoints are saved.
+            every_seconds (opt): Minimum seconds between two checkpoints.
+        """
+
+        self.path = path
+        self.base_path = path + ".base"
+        self.every_seconds = every_seconds or self.EVERY_SECONDS
+        self.last_save = None
+        self.base_saved = False
+
+    # PUBLIC
+    def save(self, fn, phase, candidates, position):
+        """Save a checkpoint of the current state of the run.
+
+        Args:
+            fn: FreightNetwork being optimized.
+            phase: Name of the phase of the run being done.
+            candidates: List of candidates of the optimizer.
+            position: Position of the next candidate to be analyzed.
+        """
+
+        if not self.base_saved:
+            self._dump((fn.rail, fn.road), self.base_path)
+            self.base_saved = True
+
+        checkpoint = {"base": os.path.abspath(self.base_path),
+                      "phase": phase,
+                      "candidates": candidates,
+                      "position": position,
+                      "rail": get_ods_state(fn.rail),
+                      "road": get_ods_state(fn.road)}
+        self._dump(checkpoint, self.path)
+
+        self.last_save = time.time()
+
+    def save_if_due(self, fn, phase, candidates, position):
+        """Save a checkpoint if enough time passed since the last one."""
+
+        if (not self.last_save or
+                time.time() - self.last_save >= self.every_seconds):
+            self.save(fn, phase, candidates, position)
+
+    @classmethod
+    def load(cls, path):
+        """Load railway and roadway networks of a checkpoint.
+
+        Returns: (rail, road, resume_point)
+            rail: RailwayNetwork with the od pairs state of the checkpoint.
+            road: RoadwayNetwork with the od pairs state of the checkpoint.
+            resume_point: Tuple (phase, candidates, position) of the run.
+        """
+
+        checkpoint = cls._load(path)
+        rail, road = cls._load(checkpoint["base"])
+
+        set_ods_state(rail, checkpoint["rail"])
+        set_ods_state(road, checkpoint["road"])
+
+        resume_point = (checkpoint["phase"], checkpoint["candidates"],
+                        checkpoint["position"])
+
+        return rail, road, resume_point
+
+    # PRIVATE
+    def _dump(self, obj, path):
+        """Pickle an object replacing the file only when it's complete."""
+
+        # networks are deeply nested structures of objects
+        sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            cPickle.dump(obj, f, self.PICKLE_PROTOCOL)
+
+        # rename can't replace an existing file in windows
+        if os.path.isfile(path):
+            os.remove(path)
+        os.rename(temp_path, path)
+
+    @classmethod
+    def _load(cls, path):
+        sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+
+        with open(path, "rb") as f:
+            return cPickle.load(f)
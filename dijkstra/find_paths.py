@@ -1,9 +1,9 @@
 #!C:\Python27
 # -*- coding: utf-8 -*-
+import os
 import sys
 import time
-from openpyxl import load_workbook, Workbook
-from modules import get_graph_builder, get_path_finder_strategy
+from modules import get_graph_builder, get_path_finder_strategy, Profiler
 from pprint import pprint
 
 """
@@ -94,6 +94,10 @@ class Network():
         print "\n Saving results in excel..."
         sys.stdout.flush()
 
+        # openpyxl takes long to import, so only excel inputs and outputs
+        # import it
+        from openpyxl import Workbook
+
         # create worksheet to store all results
         wb = Workbook(write_only=True)
         ws_all = wb.create_sheet()
@@ -168,60 +172,74 @@ class Network():
         return id_od.split("-")
 
 
-def main(xl_input, xl_output, strategy_name="isolated_gauges", argument=None):
+def main(xl_input, xl_output, strategy_name="isolated_gauges", argument=None,
+         profiler=None):
     """Find shortest paths between all nodes of a network, by gauge.
 
     Args:
         xl_input: List of links of a network, by gauge.
         xl_output: List of shortest paths between all nodes, by gauge.
+        profiler (opt): Profiler of the run, as a section named after
+            xl_input.
     """
 
-    # load list of links
-    wb = load_workbook(xl_input)
+    from openpyxl import load_workbook
+
+    profiler = profiler or Profiler()
+    section = os.path.splitext(os.path.basename(xl_input))[0]
+
+    with profiler.section(section):
 
-    # create a Network object
-    network = Network()
+        # load list of links
+        wb = load_workbook(xl_input)
 
-    # create graphs from links, find shortest paths and store then in excel
-    network.create_graphs(wb)
-    # pprint(network.graphs)
-    paths = network.find_shortest_paths(strategy_name, argument)
-    network.store_paths_in_excel(paths, xl_output)
+        # create a Network object
+        network = Network()
+
+        # create graphs from links, find shortest paths and store them in
+        # excel
+        network.create_graphs(wb)
+        # pprint(network.graphs)
+        paths = network.find_shortest_paths(strategy_name, argument)
+        network.store_paths_in_excel(paths, xl_output)
 
     # return network object, in case of the user wants to use it
     return network
 
 
-def main_railway():
+def main_railway(profiler=None):
     """Find shortest paths for the railway network."""
 
     XL_INPUT = "data/railway_links.xlsx"
     XL_OUTPUT = "paths/railway_shortest_paths.xlsx"
-    network = main(XL_INPUT, XL_OUTPUT)
+    network = main(XL_INPUT, XL_OUTPUT, profiler=profiler)
 
     return network
 
 
-def main_roadway():
+def main_roadway(profiler=None):
     """Find shortest paths for the roadway network."""
 
     XL_INPUT = "data/roadway_links.xlsx"
     XL_OUTPUT = "paths/roadway_shortest_paths.xlsx"
-    network = main(XL_INPUT, XL_OUTPUT)
+    network = main(XL_INPUT, XL_OUTPUT, profiler=profiler)
 
     return network
 
 
 if __name__ == "__main__":
 
+    # take --profile flag out of the arguments
+    profiler, args = Profiler.from_argv(sys.argv[1:], "paths/profiles")
+
     # parse arguments if called with arguments
-    if len(sys.argv) == 3:
-        xl_input = sys.argv[1]
-        xl_output = sys.argv[2]
+    if len(args) == 2:
+        xl_input = args[0]
+        xl_output = args[1]
 
-        main(xl_input, xl_output)
+        main(xl_input, xl_output, profiler=profiler)
 
     # call methods using default arguments if none are passed
     else:
-        main_railway()
-        main_roadway()
+        main_railway(profiler)
+        main_roadway(profiler)
@@ -1,3 +1,4 @@
 from dijkstra import dijkstra
 from graph import get_graph_builder
 from path_finder import get_path_finder_strategy
+from profiler import Profiler, get_file_name
@@ -1,6 +1,6 @@
 #!C:\Python27
 # -*- coding: utf-8 -*-
-from openpyxl import worksheet, Workbook
+import sys
 
 
 class Graph(dict):
@@ -63,7 +63,7 @@ class SingleWorksheet(BaseGraphBuilder):
     def accepts(self, ws_links):
 
         has_gauges = None
-        is_ws = (type(ws_links) == worksheet.worksheet.Worksheet)
+        is_ws = _is_worksheet(ws_links)
 
         if is_ws:
             first_cell_value = ws_links.cell(column=1, row=2).value
@@ -117,7 +117,7 @@ class SingleWorksheetWithGauges(BaseGraphBuilder):
     def accepts(self, ws_links):
 
         has_gauges = None
-        is_ws = (type(ws_links) == worksheet.worksheet.Worksheet)
+        is_ws = _is_worksheet(ws_links)
 
         if is_ws:
             first_cell_value = ws_links.cell(column=1, row=2).value
@@ -183,7 +183,7 @@ class WorkbookSingleWorksheet(BaseGraphBuilder):
     """docstring for WorkbookWithGauges"""
     @classmethod
     def accepts(self, wb_links):
-        return type(wb_links) == Workbook and len(wb_links.worksheets) == 1
+        return _is_workbook(wb_links) and len(wb_links.worksheets) == 1
 
     def get_graphs(self, wb_links):
 
@@ -197,7 +197,7 @@ class MultipleWorksheets(BaseGraphBuilder):
 
     @classmethod
     def accepts(self, wb_links):
-        return type(wb_links) == Workbook
+        return _is_workbook(wb_links)
 
     def get_graphs(self, wb_links):
 
@@ -242,6 +242,29 @@ class LinksDictionary(BaseGraphBuilder):
         return graphs
 
 
+def _is_worksheet(links):
+    """Check links are an openpyxl worksheet.
+
+    If openpyxl was never imported, links can't be a worksheet, so openpyxl
+    (that takes long to import) is not imported just to check it."""
+
+    if "openpyxl" not in sys.modules:
+        return False
+
+    from openpyxl.worksheet.worksheet import Worksheet
+    return type(links) == Worksheet
+
+
+def _is_workbook(links):
+    """Check links are an openpyxl workbook (see _is_worksheet)."""
+
+    if "openpyxl" not in sys.modules:
+        return False
+
+    from openpyxl import Workbook
+    return type(links) == Workbook
+
+
 BUILDERS = [SingleWorksheet, SingleWorksheetWithGauges,
             WorkbookSingleWorksheet, MultipleWorksheets, LinksDictionary]
 
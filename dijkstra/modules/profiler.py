@@ -0,0 +1,172 @@
+import cProfile
+import os
+import re
+import sys
+import thread
+import threading
+import time
+from contextlib import contextmanager
+
+"""
+    Opt-in profiling of the sections of a run (eg. the scenarios of
+    freight_network.main or the networks of find_paths.main). It is used by
+    the entry points when they are called with the --profile flag.
+"""
+
+
+class SamplingThread(threading.Thread):
+
+    """Samples the call stack of another thread at regular intervals.
+
+    Stacks are kept as collapsed strings of frames, from the outermost to the
+    innermost one ("file:function;file:function..."), with the number of
+    times each of them was sampled."""
+
+    def __init__(self, thread_id, interval):
+        """
+        Args:
+            thread_id: Identifier of the thread to be sampled.
+            interval: Seconds between two samples.
+        """
+        super(SamplingThread, self).__init__()
+        self.daemon = True
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self._stop_sampling = threading.Event()
+
+    def run(self):
+
+        while not self._stop_sampling.is_set():
+            frame = sys._current_frames().get(self.thread_id)
+            if frame:
+                stack = self._collapse(frame)
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+            time.sleep(self.interval)
+
+    def stop(self):
+        self._stop_sampling.set()
+        self.join()
+
+    def _collapse(self, frame):
+
+        frames = []
+        while frame:
+            code = frame.f_code
+            frames.append(os.path.basename(code.co_filename) + ":" +
+                          code.co_name)
+            frame = frame.f_back
+
+        return ";".join(reversed(frames))
+
+
+class Profiler(object):
+
+    """Profiles named sections of a run, writing files for each of them.
+
+    Every section writes to the profiles directory a collapsed stack file
+    ("<section>.collapsed", one "stack count" line by sampled stack, to be
+    read by flame graph tools) and, in "cprofile" mode, a pstats file
+    ("<section>.pstats", to be read with the pstats module). In "sampling"
+    mode only a sampling thread runs, with much lower overhead.
+
+    A profiler without directory is disabled and sections run as usual."""
+
+    MODES = ["cprofile", "sampling"]
+    SAMPLING_INTERVAL = 0.005
+    FLAG = "--profile"
+    DIRECTORY = "reports/profiles"
+
+    def __init__(self, directory=None, mode="cprofile", interval=None):
+        """
+        Args:
+            directory (opt): Directory where profiles are written.
+            mode: "cprofile" or "sampling".
+            interval (opt): Seconds between two samples of the call stack.
+        """
+
+        if mode not in self.MODES:
+            raise ValueError("Unknown profile mode " + mode)
+
+        self.directory = directory
+        self.mode = mode
+        self.interval = interval or self.SAMPLING_INTERVAL
+
+    # PUBLIC
+    @classmethod
+    def from_argv(cls, argv, directory=None):
+        """Create a profiler from the --profile flag of command arguments.
+
+        The flag may be "--profile" (cprofile mode) or "--profile=<mode>".
+
+        Returns: (profiler, args)
+            profiler: Profiler, disabled if the flag was not passed.
+            args: Arguments other than the flag.
+        """
+
+        profiler = cls()
+        args = []
+        for arg in argv:
+            if arg == cls.FLAG:
+                profiler = cls(directory or cls.DIRECTORY)
+            elif arg.startswith(cls.FLAG + "="):
+                profiler = cls(directory or cls.DIRECTORY,
+                               arg.split("=", 1)[1])
+            else:
+                args.append(arg)
+
+        return profiler, args
+
+    @property
+    def enabled(self):
+        return bool(self.directory)
+
+    @contextmanager
+    def section(self, name):
+        """Profile a block of code as a section named after its description.
+
+        Args:
+            name: Description of the section (eg. the scenario), used to name
+                its profile files.
+        """
+
+        if not self.enabled:
+            yield
+            return
+
+        sampler = SamplingThread(thread.get_ident(), self.interval)
+        profile = cProfile.Profile() if self.mode == "cprofile" else None
+
+        sampler.start()
+        if profile:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+            sampler.stop()
+            self._write(name, profile, sampler.stacks)
+
+    # PRIVATE
+    def _write(self, name, profile, stacks):
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        path = os.path.join(self.directory, get_file_name(name))
+
+        if profile:
+            profile.dump_stats(path + ".pstats")
+
+        with open(path + ".collapsed", "w") as f:
+            for stack, count in sorted(stacks.iteritems()):
+                f.write(stack + " " + str(count) + "\n")
+
+        print "Profile of", name, "written to", path
+
+
+def get_file_name(name):
+    """Return a name (eg. of a section or scenario) safe to be used as the
+    name of a file."""
+    return re.sub(r"[^\w\-]+", "_", name.strip()).strip("_").lower()
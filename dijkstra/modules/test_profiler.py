@@ -0,0 +1,73 @@
+import unittest
+import os
+import pstats
+import shutil
+import tempfile
+from profiler import Profiler
+
+
+def busy_function():
+    total = 0
+    for i in xrange(300000):
+        total += i % 7
+    return total
+
+
+class ProfilerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_cprofile_section(self):
+
+        profiler = Profiler(self.temp_dir, interval=0.001)
+        with profiler.section("Derive all to railway RESTRICTED"):
+            busy_function()
+
+        path = os.path.join(self.temp_dir, "derive_all_to_railway_restricted")
+        stats = pstats.Stats(path + ".pstats")
+        self.assertIn("busy_function",
+                      [function for (file_name, line, function)
+                       in stats.stats])
+
+        with open(path + ".collapsed") as f:
+            lines = f.readlines()
+        self.assertTrue(any("test_profiler.py:busy_function" in line
+                            for line in lines))
+        for line in lines:
+            stack, count = line.rsplit(" ", 1)
+            self.assertGreater(int(count), 0)
+
+    def test_sampling_section(self):
+
+        profiler = Profiler(self.temp_dir, "sampling", 0.001)
+        with profiler.section("roadway"):
+            busy_function()
+
+        self.assertEqual(os.listdir(self.temp_dir), ["roadway.collapsed"])
+
+    def test_from_argv(self):
+
+        profiler, args = Profiler.from_argv(["a.xlsx", "b.xlsx"])
+        self.assertFalse(profiler.enabled)
+        self.assertEqual(args, ["a.xlsx", "b.xlsx"])
+
+        # a disabled profiler writes nothing
+        with profiler.section("roadway"):
+            busy_function()
+
+        profiler, args = Profiler.from_argv(["--profile=sampling", "a.xlsx"],
+                                            self.temp_dir)
+        self.assertTrue(profiler.enabled)
+        self.assertEqual(profiler.mode, "sampling")
+        self.assertEqual(args, ["a.xlsx"])
+
+        self.assertRaises(ValueError, Profiler.from_argv,
+                          ["--profile=other"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,16 @@
 from modal_networks import RailwayNetwork, RoadwayNetwork
 import numpy as np
+import math
 from optimization import WeakLinksAggregator, WeakOdsAggregator
-from optimization import LinksTrafficRerouter
+from optimization import LinksTrafficRerouter, ModalSplitAnnealer
 from modules import BaseReport
+from modules.builder.components import OdTons, Metrics
+from checkpoint import Checkpointer
+from snapshot import NetworkSnapshot, BuildSnapshot, copy_networks
+from dijkstra.modules import Profiler, get_file_name
+import copy
+import os
+import sys
 
 """
     This is the main module that will be visible to the user. Exposes
@@ -35,25 +43,22 @@ class ReroutingMethods(object):
         # get rail link from the rail network
         rail_link = self.fn.rail.get_link(id_rail_link, gauge_rail_link)
 
-        for rail_od in self.fn.rail.iter_od_pairs():
+        for rail_od in self.fn.rail.get_ods_using_link(rail_link.id,
+                                                       rail_link.gauge):
 
-            use_rail_link = rail_link.id in rail_od.links
-            use_same_gauge = rail_link.gauge == rail_od.gauge
-            if use_rail_link and use_same_gauge:
+            succeed = self.reroute_od(self.fn.rail, rail_od, rail_link)
 
-                succeed = self.reroute_od(self.fn.rail, rail_od, rail_link)
-
-                if not succeed:
-                    # derive rail tons to roadway
-                    COEFF = 1.0
-                    road_od_derivation = self.od_to_roadway(rail_od, COEFF,
-                                                            allow_original)
+            if not succeed:
+                # derive rail tons to roadway
+                COEFF = 1.0
+                road_od_derivation = self.od_to_roadway(rail_od, COEFF,
+                                                        allow_original)
 
-                    # store reference to road od pair derivation for reversion
-                    road_od_derivations.append(road_od_derivation)
+                # store reference to road od pair derivation for reversion
+                road_od_derivations.append(road_od_derivation)
 
-                else:
-                    rerouted_ods.append(rail_od)
+            else:
+                rerouted_ods.append(rail_od)
 
         return rerouted_ods, road_od_derivations
 
@@ -63,6 +68,8 @@ class ReroutingMethods(object):
         new_path = modal_network.find_shortest_path(od.id,
                                                     restrictions=[link.id])
 
+        self.fn.freight_metrics.count("reroute.ods")
+
         if new_path:
             self._update_links_tons(new_path, od)
             od.set_path(new_path.path, od.gauge)
@@ -127,36 +134,33 @@ class DerivationMethods(object):
     def __init__(self, freight_network):
         self.fn = freight_network
 
-    # PUBLIC
-    def all_to_railway(self):
-        """Derive all possible road od pairs from road mode to rail mode."""
-
-        # iterate road od_pairs
-        for road_od in self.fn.road.iter_od_pairs():
+        # railway path conditions of road od pairs, kept while no link of
+        # any network is removed or put back
+        self._path_conditions = {}
+        self._path_conditions_versions = None
 
-            # check if od_pair is derivable
-            if self._road_od_pair_is_derivable(road_od):
-
-                # derive road tons to railway
-                self.od_to_railway(road_od, allow_original=True)
+    # PUBLIC
+    def all_to_railway(self, bulk=True):
+        """Derive all possible road od pairs from road mode to rail mode.
 
-        # find lowest scale link for each od pair of the networks
-        self.fn.rail.find_lowest_scale_links()
-        self.fn.road.find_lowest_scale_links()
+        Args:
+            bulk: If True, tons of all od pairs are derived at once (see
+                _derive_ods). If False, od pairs are derived one by one.
+        """
 
-    def all_to_roadway(self):
-        """Derive all possible rail od pairs from rail mode to road mode."""
+        with self.fn.freight_metrics.timer("derive.all_to_railway"):
+            self._all_to_railway(bulk)
 
-        # iterate road od_pairs
-        for rail_od in self.fn.rail.iter_od_pairs():
+    def all_to_roadway(self, bulk=True):
+        """Derive all possible rail od pairs from rail mode to road mode.
 
-            # derive road tons to railway
-            COEFF = 1.0
-            self.od_to_roadway(rail_od, COEFF, allow_original=True)
+        Args:
+            bulk: If True, tons of all od pairs are derived at once (see
+                _derive_ods). If False, od pairs are derived one by one.
+        """
 
-        # find lowest scale link for each od pair of the networks
-        self.fn.rail.find_lowest_scale_links()
-        self.fn.road.find_lowest_scale_links()
+        with self.fn.freight_metrics.timer("derive.all_to_roadway"):
+            self._all_to_roadway(bulk)
 
     def od_to_railway(self, road_od, coeff=None, allow_original=True):
         """Derive a road od pair to railway mode.
@@ -167,33 +171,17 @@ class DerivationMethods(object):
         """
 
         # check that road od can be derived
-        if not self._road_od_pair_is_derivable(road_od):
+        if not self.road_od_pair_is_derivable(road_od):
             print "no derivable"
             return None
 
-        # get od pair caracteristics and rail od pair that will receive freight
-        id_od = road_od.id
-        category = road_od.tons.category
-        rail_od = self.fn.rail.get_od(id_od, category)
-
-        # get tons that have already been derived to rail
-        ton_derived = rail_od.tons.get_derived()
-        ton_derivable = road_od.tons.get_original()
-
         # assign default value if none coeff is passed
         if not coeff:
-            od_scale = ton_derived + ton_derivable
-            od_road_dist = road_od.dist
-            coeff = self._get_derivation_coefficient(od_scale, od_road_dist,
-                                                     category)
+            coeff = self._get_derivation_coefficient(
+                self._get_road_ton(road_od), road_od.dist,
+                road_od.tons.category)
 
-        # derive road_od pair to a rail_od pair
-        self._derive_od(road_od, rail_od, coeff,
-                        self.fn.road, self.fn.rail,
-                        allow_original)
-
-        # returns rail_od for eventual reversion
-        return rail_od
+        return self._od_to_railway(road_od, coeff, allow_original)
 
     def od_to_roadway(self, rail_od, coeff=None, allow_original=False):
         """Derive a rail od pair to roadway mode.
@@ -230,26 +218,19 @@ class DerivationMethods(object):
         # get road link from the road network
         road_link = self.fn.road.get_link(id_road_link, gauge_road_link)
 
-        for road_od in self.fn.road.iter_od_pairs():
+        for road_od in self.fn.road.get_ods_using_link(road_link.id,
+                                                       road_link.gauge):
 
-            use_road_link = road_link.id in road_od.links
-            use_same_gauge = road_link.gauge == road_od.gauge
-            is_derivable = self._road_od_pair_is_derivable(road_od)
-            if use_road_link and use_same_gauge and is_derivable:
+            if self.road_od_pair_is_derivable(road_od):
 
                 # calculate proportion of tons to be derived
-                rail_od = self.fn.rail.get_od(road_od.id,
-                                              road_od.tons.category)
-                od_ton = (road_od.tons.get_original() +
-                          rail_od.tons.get_derived())
-                distance = road_od.dist
-                category = road_od.tons.category
-                coeff = self._get_derivation_coefficient(od_ton, distance,
-                                                         category)
+                coeff = self._get_derivation_coefficient(
+                    self._get_road_ton(road_od), road_od.dist,
+                    road_od.tons.category)
 
                 # derive road tons to railway
-                rail_od_derivation = self.od_to_railway(road_od, coeff,
-                                                        allow_original)
+                rail_od_derivation = self._od_to_railway(road_od, coeff,
+                                                         allow_original)
 
                 # store reference to rail od pair derivation for reversion
                 rail_od_derivations.append(rail_od_derivation)
@@ -266,19 +247,16 @@ class DerivationMethods(object):
         # get rail link from the rail network
         rail_link = self.fn.rail.get_link(id_rail_link, gauge_rail_link)
 
-        for rail_od in self.fn.rail.iter_od_pairs():
+        for rail_od in self.fn.rail.get_ods_using_link(rail_link.id,
+                                                       rail_link.gauge):
 
-            use_rail_link = rail_link.id in rail_od.links
-            use_same_gauge = rail_link.gauge == rail_od.gauge
-            if use_rail_link and use_same_gauge:
-
-                # derive rail tons to roadway
-                COEFF = 1.0
-                road_od_derivation = self.od_to_roadway(rail_od, COEFF,
-                                                        allow_original)
+            # derive rail tons to roadway
+            COEFF = 1.0
+            road_od_derivation = self.od_to_roadway(rail_od, COEFF,
+                                                    allow_original)
 
-                # store reference to road od pair derivation for reversion
-                road_od_derivations.append(road_od_derivation)
+            # store reference to road od pair derivation for reversion
+            road_od_derivations.append(road_od_derivation)
 
         return road_od_derivations
 
@@ -318,7 +296,217 @@ class DerivationMethods(object):
                                        categories=category,
                                        id_ods=id_od)
 
+    def get_derivation_coefficients(self, ods_ton, distances, categories):
+        """Calculate the proportion of many od pairs that will be derived.
+
+        Vectorized version of _get_derivation_coefficient, taking the tons,
+        distances and categories of the od pairs as arrays.
+
+        Args:
+            ods_ton: Array with the road tons of each od pair.
+            distances: Array with the road distance of each od pair.
+            categories: Array with the product category of each od pair.
+
+        Returns:
+            Array with the derivation coefficient of each od pair.
+        """
+
+        ods_ton = np.array(ods_ton, dtype=float)
+        distances = np.array(distances, dtype=float)
+
+        # take distance and tons parameters
+        max_dist = float(self.fn.rail.params["dist_of_max_derivation"].value)
+        min_dist = float(self.fn.rail.params["min_dist_to_derive"].value)
+        t_max = float(self.fn.rail.params["tons_of_max_derivation"].value)
+        t_min = float(self.fn.rail.params["min_tons_to_derive"].value)
+
+        # get maximum and minimum derivation of each od pair category
+        derivations = {category: self._get_derivation_limits(category)
+                       for category in set(categories)}
+        max_deriv = np.array([derivations[category][0]
+                              for category in categories], dtype=float)
+        min_deriv = np.array([derivations[category][1]
+                              for category in categories], dtype=float)
+
+        # calculate max and min od tons to meet max and min derivable tons
+        # this depends on max and min derivation coefficients
+        with np.errstate(divide="ignore", invalid="ignore"):
+            max_tons = t_max / max_deriv
+            min_tons = t_min / min_deriv
+
+        # if max_tons is not greater than min_tons, it means that this
+        # dimension is more than fulfilled by the od pair, so od_ton is set to
+        # be the maximum
+        fulfilled = ~(max_tons > min_tons)
+        ods_ton = np.where(fulfilled, max_tons, ods_ton)
+        min_tons = np.where(fulfilled, max_tons, min_tons)
+
+        # get tons and distance relevant to interpolate, transforming
+        # distances in tons unit with substitution coefficient
+        coef_ton_dist = (max_tons - min_tons) / (max_dist - min_dist)
+        tons = np.minimum(ods_ton, max_tons)
+        dists = np.minimum(distances, max_dist)
+
+        # calculate vectorial distances
+        dist_to_min = np.hypot(tons - min_tons,
+                               (dists - min_dist) * coef_ton_dist)
+        dist_to_max = np.hypot(max_tons - tons,
+                               (max_dist - dists) * coef_ton_dist)
+
+        # interpolate coefficient as % of total vectorial distance
+        with np.errstate(divide="ignore", invalid="ignore"):
+            interpolation_coeff = dist_to_min / (dist_to_min + dist_to_max)
+        coeffs = (max_deriv - min_deriv) * interpolation_coeff + min_deriv
+
+        # assign zero derivation if distance and tons are lower than min
+        coeffs = np.where((distances <= min_dist) & (ods_ton >= min_tons),
+                          min_deriv, coeffs)
+
+        # assign max derivation if distance and tons are greater than max
+        coeffs = np.where((distances >= max_dist) & (ods_ton >= max_tons),
+                          max_deriv, coeffs)
+
+        return coeffs
+
+    def road_od_pair_is_derivable(self, road_od):
+        """Indicate if an od pair is derivable or not.
+
+        Args:
+            road_od: OD pair that will be checked to be derivable to railway.
+        """
+
+        if not self._road_od_pair_meets_conditions(road_od):
+            return False
+
+        # check if od pair meet minimum derivable tons to be derivable
+        orig_road_ton = self._get_road_ton(road_od)
+        coeff = self._get_derivation_coefficient(orig_road_ton, road_od.dist,
+                                                 road_od.tons.category)
+
+        return self._meets_min_tons_to_derive(orig_road_ton * coeff)
+
     # PRIVATE
+    def _all_to_railway(self, bulk):
+        """Derive all possible road od pairs to rail (see all_to_railway)."""
+
+        # road od pairs meeting derivation conditions other than tons
+        road_ods = [road_od for road_od in self.fn.road.iter_od_pairs()
+                    if self._road_od_pair_meets_conditions(road_od)]
+
+        # calculate derivation coefficients of all of them at once
+        ods_ton = np.array([self._get_road_ton(road_od)
+                            for road_od in road_ods])
+        coeffs = self.get_derivation_coefficients(
+            ods_ton, [road_od.dist for road_od in road_ods],
+            [road_od.tons.category for road_od in road_ods])
+
+        # derive road tons to railway of od pairs meeting minimum tons
+        derivable = [self._meets_min_tons_to_derive(derived_ton)
+                     for derived_ton in ods_ton * coeffs]
+        road_ods = [road_od for road_od, is_derivable
+                    in zip(road_ods, derivable) if is_derivable]
+        coeffs = coeffs[np.array(derivable, dtype=bool)]
+
+        if bulk:
+            rail_ods = [self.fn.rail.get_od(road_od.id, road_od.tons.category)
+                        for road_od in road_ods]
+            self._derive_ods(road_ods, rail_ods, coeffs,
+                             self.fn.road, self.fn.rail)
+
+        else:
+            for road_od, coeff in zip(road_ods, coeffs):
+                self._od_to_railway(road_od, float(coeff),
+                                    allow_original=True)
+
+        # find lowest scale link for each od pair of the networks
+        self.fn.rail.find_lowest_scale_links()
+        self.fn.road.find_lowest_scale_links()
+
+    def _all_to_roadway(self, bulk):
+        """Derive all rail od pairs to road (see all_to_roadway)."""
+
+        COEFF = 1.0
+
+        if bulk:
+            rail_ods = list(self.fn.rail.iter_od_pairs())
+            road_ods = [self.fn.road.get_od(rail_od.id, rail_od.tons.category)
+                        for rail_od in rail_ods]
+            coeffs = np.repeat(COEFF, len(rail_ods))
+            self._derive_ods(rail_ods, road_ods, coeffs,
+                             self.fn.rail, self.fn.road)
+
+        else:
+            # iterate road od_pairs
+            for rail_od in self.fn.rail.iter_od_pairs():
+
+                # derive road tons to railway
+                self.od_to_roadway(rail_od, COEFF, allow_original=True)
+
+        # find lowest scale link for each od pair of the networks
+        self.fn.rail.find_lowest_scale_links()
+        self.fn.road.find_lowest_scale_links()
+
+    def _od_to_railway(self, road_od, coeff, allow_original):
+        """Derive a road od pair already known to be derivable to railway."""
+
+        # get rail od pair that will receive freight
+        rail_od = self.fn.rail.get_od(road_od.id, road_od.tons.category)
+
+        # derive road_od pair to a rail_od pair
+        self._derive_od(road_od, rail_od, coeff,
+                        self.fn.road, self.fn.rail,
+                        allow_original)
+
+        # returns rail_od for eventual reversion
+        return rail_od
+
+    def _derive_ods(self, from_ods, to_ods, coeffs, from_mode, to_mode,
+                    allow_original=True):
+        """Derive many od pairs at once, as _derive_od would do one by one.
+
+        Tons derived by each od pair are calculated as arrays, and tons
+        removed from and added to each link are gathered to update every
+        link only once.
+
+        Args:
+            from_ods: List of od pairs deriving tons.
+            to_ods: List of od pairs receiving tons, in the same order.
+            coeffs: Array with the coefficient of tons derived by each one.
+            from_mode: Modal network of from_ods.
+            to_mode: Modal network of to_ods.
+        """
+
+        orig_tons_derived, returned_tons = OdTons.derive_many(
+            [od.tons for od in from_ods], [od.tons for od in to_ods], coeffs,
+            allow_original)
+        self.fn.freight_metrics.count("derive.ods", len(from_ods))
+
+        # gather tons removed from "from_mode" links and added to "to_mode"
+        removed = {}
+        added = {}
+        for from_od, to_od, orig_ton_derived, returned_ton in zip(
+                from_ods, to_ods, orig_tons_derived.tolist(),
+                returned_tons.tolist()):
+            category = from_od.tons.category
+
+            for id_from_link in from_od.links:
+                removed.setdefault((id_from_link, from_od.gauge), []).extend(
+                    [("original", category, from_od.id, orig_ton_derived),
+                     ("derived", category, from_od.id, returned_ton)])
+
+            for id_to_link in to_od.links:
+                added.setdefault((id_to_link, to_od.gauge), []).extend(
+                    [("original", category, to_od.id, returned_ton),
+                     ("derived", category, to_od.id, orig_ton_derived)])
+
+        for (id_link, gauge), link_removed in removed.iteritems():
+            from_mode.get_link(id_link, gauge).tons.update_many(
+                removed=link_removed)
+
+        for (id_link, gauge), link_added in added.iteritems():
+            to_mode.get_link(id_link, gauge).tons.update_many(
+                added=link_added)
+
     def _derive_od(self, from_od, to_od, coeff, from_mode, to_mode,
                    allow_original=True):
 
@@ -332,6 +520,7 @@ class DerivationMethods(object):
 
         orig_ton_derived, returned_ton = from_od.derive_ton(to_od, coeff,
                                                             allow_original)
+        self.fn.freight_metrics.count("derive.ods")
 
         # from_mode.increase_mobility_requirements(from_od)
         # to_mode.increase_mobility_requirements(to_od)
@@ -365,8 +554,8 @@ class DerivationMethods(object):
         #     to_link = to_mode.get_link(id_to_link, to_od.gauge)
         #     to_mode.regroup_link(to_link)
 
-    def _road_od_pair_is_derivable(self, road_od):
-        """Indicate if an od pair is derivable or not.
+    def _road_od_pair_meets_conditions(self, road_od):
+        """Indicate if an od pair meets derivation conditions but tons.
 
         Args:
             road_od: OD pair that will be checked to be derivable to railway.
@@ -376,30 +565,47 @@ class DerivationMethods(object):
         if road_od.is_intrazone() or road_od.tons.category == 0:
             return False
 
-        # check if there is an operable railway path for the od pair
-        has_railway_path = self.fn.rail.has_railway_path(road_od)
-        if not has_railway_path:
+        # check if od pair meet minimum distance to be derivable
+        if not road_od.dist > self.fn.rail.params["min_dist_to_derive"].value:
             return False
 
-        # calculate original road tons
-        id_od = road_od.id
-        category_od = road_od.tons.category
-        if self.fn.rail.has_od(id_od, category_od):
-            rail_od = self.fn.rail.get_od(id_od, category_od)
-            orig_road_ton = (road_od.tons.get_original() +
-                             rail_od.tons.get_derived())
-        else:
-            orig_road_ton = road_od.tons.get_original()
+        # check there is an operable railway path not excesively longer
+        has_railway_path, dist_rail, dist_road, railway_path_is_plausible = \
+            self._get_path_conditions(road_od)
 
-        # check if od pair meet minimum derivable tons to be derivable
-        coeff = self._get_derivation_coefficient(orig_road_ton, road_od.dist,
-                                                 category_od)
-        derived_ton = orig_road_ton * coeff
-        min_ton = derived_ton > self.fn.rail.params["min_tons_to_derive"].value
+        return has_railway_path and railway_path_is_plausible
 
-        # check if od pair meet minimum distance to be derivable
-        min_dist = road_od.dist > self.fn.rail.params[
-            "min_dist_to_derive"].value
+    def _get_path_conditions(self, road_od):
+        """Return railway path conditions of an od pair, calculated once.
+
+        Conditions are kept by (id_od, category) until a link is removed from
+        (or put back in) railway or roadway networks.
+
+        Returns: (has_railway_path, dist_rail, dist_road, is_plausible)
+            has_railway_path: True if there is an operable railway path.
+            dist_rail: Distance of the railway path (None if there is not).
+            dist_road: Distance of the roadway path (None if there is not).
+            is_plausible: True if railway path distance is not excesively
+                longer than roadway path distance.
+        """
+
+        versions = (self.fn.rail.tracker.links_version,
+                    self.fn.road.tracker.links_version)
+        if versions != self._path_conditions_versions:
+            self._path_conditions = {}
+            self._path_conditions_versions = versions
+
+        key = (road_od.id, road_od.tons.category)
+        if key not in self._path_conditions:
+            self._path_conditions[key] = self._calc_path_conditions(road_od)
+
+        return self._path_conditions[key]
+
+    def _calc_path_conditions(self, road_od):
+
+        # check if there is an operable railway path for the od pair
+        if not self.fn.rail.has_railway_path(road_od):
+            return False, None, None, False
 
         # check if railway path distance is not excesively longer than road
         max_diff = self.fn.rail.params["max_path_difference"].value
@@ -407,9 +613,21 @@ class DerivationMethods(object):
         dist_road = self.fn.road.get_path_distance(road_od)
         railway_path_is_plausible = abs(dist_rail / dist_road - 1) < max_diff
 
-        is_derivable = min_ton and min_dist and railway_path_is_plausible
+        return True, dist_rail, dist_road, railway_path_is_plausible
 
-        return is_derivable
+    def _meets_min_tons_to_derive(self, derived_ton):
+        return derived_ton > self.fn.rail.params["min_tons_to_derive"].value
+
+    def _get_road_ton(self, road_od):
+        """Return original road tons of an od pair, derived ones included."""
+
+        id_od = road_od.id
+        category_od = road_od.tons.category
+        if self.fn.rail.has_od(id_od, category_od):
+            rail_od = self.fn.rail.get_od(id_od, category_od)
+            return road_od.tons.get_original() + rail_od.tons.get_derived()
+        else:
+            return road_od.tons.get_original()
 
     def _get_derivation_coefficient(self, od_ton, distance, category):
         """Calculate the proportion of an od pair that will be derived.
@@ -421,35 +639,23 @@ class DerivationMethods(object):
         by distance and tons of od pair passed as argument.
 
         Args:
-            od: Roadway od pair that will be derived to Railway mode.
+            od_ton: Road tons of the od pair.
+            distance: Road distance of the od pair.
+            category: Product category of the od pair.
         """
 
-        # take distance parameters
+        # take distance and tons parameters
         max_dist = float(self.fn.rail.params["dist_of_max_derivation"].value)
         min_dist = float(self.fn.rail.params["min_dist_to_derive"].value)
+        t_max = float(self.fn.rail.params["tons_of_max_derivation"].value)
+        t_min = float(self.fn.rail.params["min_tons_to_derive"].value)
 
-        # get maximum derivation depending on od product category
-        max_param_name = "max_derivation_" + str(category)
-        if max_param_name in self.fn.rail.params:
-            max_deriv = float(self.fn.rail.params[max_param_name].value)
-        else:
-            max_deriv = float(self.fn.rail.params["max_derivation"].value)
-
-        # get minimum derivation depending on od product category
-        min_param_name = "min_derivation_" + str(category)
-        if min_param_name in self.fn.rail.params:
-            min_deriv = float(self.fn.rail.params[min_param_name].value)
-        else:
-            if not self.fn.rail.params["min_derivation"].value:
-                min_deriv = 0.0
-            else:
-                min_deriv = float(self.fn.rail.params["min_derivation"].value)
+        # get maximum and minimum derivation depending on od product category
+        max_deriv, min_deriv = self._get_derivation_limits(category)
 
         # calculate max and min od tons to meet max and min derivable tons
         # this depends on max and min derivation coefficients
-        t_max = float(self.fn.rail.params["tons_of_max_derivation"].value)
         max_tons = t_max / max_deriv
-        t_min = float(self.fn.rail.params["min_tons_to_derive"].value)
         min_tons = t_min / min_deriv
 
         # if max_tons is not greater than min_tons, it means that this
@@ -479,19 +685,12 @@ class DerivationMethods(object):
             tons = min(od_ton, max_tons)
             dist = min(distance, max_dist)
 
-            # transform dist in tons unit with substitution coefficient
-            dist_in_tons = dist * coef_ton_dist
-            max_dist_in_tons = max_dist * coef_ton_dist
-            min_dist_in_tons = min_dist * coef_ton_dist
-
-            # create vectors
-            od_vector = (tons, dist_in_tons)
-            max_vector = (max_tons, max_dist_in_tons)
-            min_vector = (min_tons, min_dist_in_tons)
-
-            # calculate vectorial distances
-            dist_to_min = np.linalg.norm(np.subtract(od_vector, min_vector))
-            dist_to_max = np.linalg.norm(np.subtract(max_vector, od_vector))
+            # calculate vectorial distances, with distances transformed in
+            # tons unit with substitution coefficient
+            dist_to_min = math.hypot(tons - min_tons,
+                                     (dist - min_dist) * coef_ton_dist)
+            dist_to_max = math.hypot(max_tons - tons,
+                                     (max_dist - dist) * coef_ton_dist)
             total_dist = dist_to_min + dist_to_max
 
             # calculate coefficient as % of total vectorial distance
@@ -501,6 +700,28 @@ class DerivationMethods(object):
 
         return deriv_coefficient
 
+    def _get_derivation_limits(self, category):
+        """Return maximum and minimum derivation of a product category."""
+
+        # get maximum derivation depending on od product category
+        max_param_name = "max_derivation_" + str(category)
+        if max_param_name in self.fn.rail.params:
+            max_deriv = float(self.fn.rail.params[max_param_name].value)
+        else:
+            max_deriv = float(self.fn.rail.params["max_derivation"].value)
+
+        # get minimum derivation depending on od product category
+        min_param_name = "min_derivation_" + str(category)
+        if min_param_name in self.fn.rail.params:
+            min_deriv = float(self.fn.rail.params[min_param_name].value)
+        else:
+            if not self.fn.rail.params["min_derivation"].value:
+                min_deriv = 0.0
+            else:
+                min_deriv = float(self.fn.rail.params["min_derivation"].value)
+
+        return max_deriv, min_deriv
+
 
 class FreightNetwork():
 
@@ -515,20 +736,93 @@ class FreightNetwork():
     LINKS_OPTIMIZATION_CLASS = WeakLinksAggregator
     ODS_OPTIMIZATION_CLASS = WeakOdsAggregator
     REROUTING_OPTIMIZATION_CLASS = LinksTrafficRerouter
+    ANNEALING_OPTIMIZATION_CLASS = ModalSplitAnnealer
+
+    SNAPSHOT_PATH = BuildSnapshot.PATH
 
     def __init__(self, railway_network=None, roadway_network=None,
-                 projection_factor=1.0, restrictions=False):
+                 projection_factor=1.0, restrictions=False, resume_from=None,
+                 snapshot=None):
+        """
+        Args:
+            railway_network (opt): Already built RailwayNetwork.
+            roadway_network (opt): Already built RoadwayNetwork.
+            projection_factor: Factor to project tons of od pairs.
+            restrictions: If True, restricted links are removed.
+            resume_from (opt): Checkpoint file of an interrupted optimization
+                run. Networks are restored from it, without reading the excel
+                inputs, and min_network_cost continues where it was.
+            snapshot (opt): Build snapshot file (see BuildSnapshot). Networks
+                are loaded from it if it was built from the current excel
+                inputs with the same projection_factor and restrictions,
+                otherwise they are built and the snapshot is saved again.
+                With restrictions, ".restricted" is added to the file name
+                before the extension.
+        """
+
+        # phase, candidates and position of an optimization run to resume
+        self.resume_point = None
+
+        # timers and counters of derivations and optimizations (see metrics)
+        self.freight_metrics = Metrics()
+
+        # networks loaded from a build snapshot are already fully built
+        build_snapshot = None
+        networks = None
+        if snapshot and not (resume_from or railway_network or
+                             roadway_network):
+            build_snapshot = self.get_build_snapshot(
+                snapshot, projection_factor, restrictions)
+            networks = build_snapshot.load()
 
-        self.rail = railway_network or RailwayNetwork(
-            projection_factor=projection_factor, restrictions=restrictions)
+        if resume_from:
+            self.rail, self.road, self.resume_point = \
+                Checkpointer.load(resume_from)
 
-        self.road = roadway_network or RoadwayNetwork(
-            projection_factor=projection_factor, restrictions=restrictions)
+        elif networks:
+            self.rail, self.road = networks
+
+        else:
+            self.rail = railway_network or RailwayNetwork(
+                projection_factor=projection_factor,
+                restrictions=restrictions)
+
+            self.road = roadway_network or RoadwayNetwork(
+                projection_factor=projection_factor,
+                restrictions=restrictions)
 
         self.derive = DerivationMethods(self)
         self.reroute = ReroutingMethods(self)
 
-        self.derive.all_rail_pathless_to_roadway()
+        if not resume_from and not networks:
+            self.derive.all_rail_pathless_to_roadway()
+
+            if build_snapshot:
+                build_snapshot.save(self.rail, self.road)
+
+    @classmethod
+    def get_build_snapshot(cls, path=None, projection_factor=1.0,
+                           restrictions=False):
+        """Return the build snapshot of networks built from the default excel
+        inputs with some settings.
+
+        Args:
+            path (opt): File of the snapshot (SNAPSHOT_PATH by default). With
+                restrictions, ".restricted" is added before the extension.
+            projection_factor: Factor to project tons of od pairs.
+            restrictions: If True, restricted links are removed.
+        """
+
+        input_files = (RailwayNetwork.BUILDER_CLASS().get_input_files() +
+                       RoadwayNetwork.BUILDER_CLASS().get_input_files())
+        settings = {"projection_factor": projection_factor,
+                    "restrictions": restrictions}
+
+        root, extension = os.path.splitext(path or cls.SNAPSHOT_PATH)
+        if restrictions:
+            root += ".restricted"
+
+        return BuildSnapshot(root + extension, input_files, settings)
 
     # PUBLIC
     # iters and getters
@@ -561,13 +855,20 @@ class FreightNetwork():
         return self.rail.total_cost + self.road.total_cost
 
     # costing methods
-    def cost_network(self):
-        """Cost total freight transport network."""
-        self.rail.cost_network()
-        self.road.cost_network()
+    def cost_network(self, incremental=False):
+        """Cost total freight transport network.
+
+        Args:
+            incremental: If True, after a first full costing only links and od
+                pairs changed by derivations or reroutings are re-costed.
+        """
+        self.rail.cost_network(incremental)
+        self.road.cost_network(incremental)
 
     # optimizing strategies
-    def min_network_cost_deriving_links(self):
+    def min_network_cost_deriving_links(self, incremental=False,
+                                        processes=1, lazy=False,
+                                        checkpointer=None):
         """Find modal split with minimum overall cost analyzing links.
 
         Derive traffic from one mode to the other looking for the minimum
@@ -582,10 +883,14 @@ class FreightNetwork():
         railway links will reduce the overall cost from the scenario of maximum
         traffic derivation to railway."""
 
-        self.cost_network()
-        self.LINKS_OPTIMIZATION_CLASS(self).optimize()
+        self.cost_network(incremental)
+        with self.freight_metrics.timer("optimize.links"):
+            self.LINKS_OPTIMIZATION_CLASS(
+                self, incremental, processes, lazy, checkpointer, "links",
+                self._get_resume("links")).optimize()
 
-    def min_network_cost_deriving_ods(self):
+    def min_network_cost_deriving_ods(self, incremental=False, processes=1,
+                                      lazy=False, checkpointer=None):
         """Find modal split with minimum overall cost analyzing od pairs.
 
         Derive traffic from one mode to the other looking for the minimum
@@ -601,10 +906,13 @@ class FreightNetwork():
         railway links will reduce the overall cost from the scenario of maximum
         traffic derivation to railway."""
 
-        self.cost_network()
-        self.ODS_OPTIMIZATION_CLASS(self).optimize()
+        self.cost_network(incremental)
+        with self.freight_metrics.timer("optimize.ods"):
+            self.ODS_OPTIMIZATION_CLASS(
+                self, incremental, processes, lazy, checkpointer, "ods",
+                self._get_resume("ods")).optimize()
 
-    def min_network_cost_rerouting_links(self):
+    def min_network_cost_rerouting_links(self, incremental=False):
         """Find modal split with minimum overall cost rerouting traffic.
 
         Remove railway links rerouting traffic through other links when
@@ -619,13 +927,119 @@ class FreightNetwork():
         At first sight, there is no way to know what combination of freed
         railway links will reduce the overall cost."""
 
-        self.cost_network()
-        self.REROUTING_OPTIMIZATION_CLASS(self).optimize()
+        self.cost_network(incremental)
+        with self.freight_metrics.timer("optimize.rerouting"):
+            self.REROUTING_OPTIMIZATION_CLASS(self, incremental).optimize()
+
+    def min_network_cost_annealing(self, max_evaluations=None,
+                                   max_seconds=None, seed=None):
+        """Find modal split with minimum overall cost by simulated annealing.
+
+        Starting from the current modal split, derivable od pairs (one by one
+        or all those using a rail link) are moved between modes, accepting
+        sometimes moves that increase overall cost to escape from the local
+        minimums where greedy algorithms stop. The best modal split found
+        within the budget of evaluations or seconds is restored at the end.
+
+        Args:
+            max_evaluations: Maximum number of moves to be costed.
+            max_seconds: Maximum seconds the search can take.
+            seed: Seed of the random generator, to repeat a search.
+        """
+
+        self.cost_network(incremental=True)
+        with self.freight_metrics.timer("optimize.annealing"):
+            self.ANNEALING_OPTIMIZATION_CLASS(self, True, max_evaluations,
+                                              max_seconds, seed).optimize()
+
+    def min_network_cost(self, incremental=False, processes=1, lazy=False,
+                         checkpoint=None):
+        """Find modal split with minimum overall cost.
+
+        Derive all possible traffic to railway and move it back to roadway,
+        analyzing links first and then od pairs. If the network was resumed
+        from a checkpoint, the run continues from the phase and position
+        where the checkpoint was saved.
+
+        Args:
+            checkpoint (opt): File where periodic checkpoints of the run are
+                saved, to resume it if interrupted (see resume_from).
+        """
+
+        checkpointer = Checkpointer(checkpoint) if checkpoint else None
+        phase = self.resume_point[0] if self.resume_point else None
+
+        if not phase:
+            self.derive.all_to_railway()
 
-    def min_network_cost(self):
-        self.derive.all_to_railway()
-        self.min_network_cost_deriving_links()
-        self.min_network_cost_deriving_ods()
+        if phase in (None, "links"):
+            self.min_network_cost_deriving_links(incremental, processes, lazy,
+                                                 checkpointer)
+
+        self.min_network_cost_deriving_ods(incremental, processes, lazy,
+                                           checkpointer)
+
+        self.resume_point = None
+
+    # branching methods
+    def snapshot(self):
+        """Take a snapshot of the current state of the freight network.
+
+        Returns:
+            Tuple with NetworkSnapshot objects of railway and roadway
+                networks, to be passed to restore().
+        """
+
+        return NetworkSnapshot(self.rail), NetworkSnapshot(self.road)
+
+    def restore(self, snapshot):
+        """Return the freight network to the state of a snapshot.
+
+        Args:
+            snapshot: Tuple returned by snapshot(), taken from this network.
+        """
+
+        rail_snapshot, road_snapshot = snapshot
+        rail_snapshot.restore(self.rail)
+        road_snapshot.restore(self.road)
+
+    def clone(self):
+        """Return an independent copy of the freight network."""
+
+        fn = copy.copy(self)
+        fn.rail, fn.road = copy_networks((self.rail, self.road))
+        fn.freight_metrics = copy.deepcopy(self.freight_metrics)
+        fn.derive = DerivationMethods(fn)
+        fn.reroute = ReroutingMethods(fn)
+
+        return fn
+
+    # metrics methods
+    def metrics(self):
+        """Return timers and counters of everything done with the network.
+
+        Timers and counters of the railway and roadway networks (loading
+        excel inputs, finding paths, assigning tons and costing) are prefixed
+        with "railway." and "roadway.", those of derivations and optimizers
+        with "freight.".
+
+        Returns:
+            Metrics object, that can be written to a JSON or CSV file.
+        """
+
+        metrics = Metrics()
+        metrics.update(self.freight_metrics, "freight.")
+        metrics.update(self.rail.metrics, "railway.")
+        metrics.update(self.road.metrics, "roadway.")
+
+        return metrics
+
+    def reset_metrics(self):
+        """Start timers and counters from zero (eg. for a new scenario)."""
+
+        self.freight_metrics.reset()
+        self.rail.metrics.reset()
+        self.road.metrics.reset()
 
     # report methods
     def report_to_excel(self, description=None, append_report=False):
@@ -648,73 +1062,121 @@ class FreightNetwork():
         self.road.report_to_excel(description=description,
                                   append_report=append_report)
 
+    # PRIVATE
+    def _get_resume(self, phase):
+        """Return (candidates, position) to resume a phase, if any."""
+
+        if self.resume_point and self.resume_point[0] == phase:
+            return self.resume_point[1:]
+        else:
+            return None
 
-def main():
-
-    # initialize freight transport network
-    fn = FreightNetwork(projection_factor=1.0, restrictions=False)
-    print "\n"
-
-    # cost network at current situation
-    scenario = "current situation"
-    print "Costing", scenario
-    fn.cost_network()
-    fn.report_to_excel(scenario, append_report=False)
-
-    # cost network deriving all possible freight to railway
-    scenario = "derive all to railway"
-    print "Costing", scenario
-    fn.derive.all_to_railway()
-    fn.cost_network()
-    fn.report_to_excel(scenario, append_report=True)
-
-    # cost network deriving all but some links and some od pairs
-    scenario = "derive all to railway but some links and ods"
-    print "Costing", scenario
-    fn.min_network_cost()
-    fn.cost_network()
-    fn.report_to_excel(scenario, append_report=True)
-
-    # cost network deriving all freight to roadway
-    scenario = "derive all to roadway"
-    print "Costing", scenario
-    fn.derive.all_to_roadway()
-    fn.cost_network()
-    fn.report_to_excel(scenario, append_report=True)
-
-    # WITH LINK RESTRICTIONS
-
-    # initialize freight transport network
-    print "\nCalculating costs with link restrictions\n"
-    fn = FreightNetwork(projection_factor=1.0, restrictions=True)
-
-    # cost network at current situation
-    scenario = "current situation RESTRICTED"
-    print "Costing", scenario
-    fn.cost_network()
-    fn.report_to_excel(scenario, append_report=True)
-
-    # cost network deriving all possible freight to railway
-    scenario = "derive all to railway RESTRICTED"
-    print "Costing", scenario
-    fn.derive.all_to_railway()
-    fn.cost_network()
-    fn.report_to_excel(scenario, append_report=True)
-
-    # cost network deriving all but some links and some od pairs
-    scenario = "derive all to railway but some links and ods RESTRICTED"
-    print "Costing", scenario
-    fn.min_network_cost()
-    fn.cost_network()
-    fn.report_to_excel(scenario, append_report=True)
-
-    # cost network deriving all freight to roadway
-    scenario = "derive all to roadway RESTRICTED"
-    print "Costing", scenario
-    fn.derive.all_to_roadway()
-    fn.cost_network()
-    fn.report_to_excel(scenario, append_report=True)
+
+def _write_metrics(fn, metrics_dir, scenario):
+    """Write timers and counters of a scenario and start them from zero."""
+
+    if metrics_dir:
+        fn.metrics().write(os.path.join(metrics_dir,
+                                        get_file_name(scenario) + ".json"))
+    fn.reset_metrics()
+
+
+def build_snapshot(path=None):
+    """Build the networks from the excel inputs and save them to a build
+    snapshot, with and without link restrictions.
+
+    Args:
+        path (opt): File of the snapshot (FreightNetwork.SNAPSHOT_PATH by
+            default). Snapshot with restrictions is saved with ".restricted"
+            before the extension.
+    """
+
+    for restrictions in [False, True]:
+        fn = FreightNetwork(projection_factor=1.0, restrictions=restrictions)
+        snapshot = FreightNetwork.get_build_snapshot(path, 1.0, restrictions)
+        snapshot.save(fn.rail, fn.road)
+        print "Build snapshot saved to", snapshot.path
+
+
+def main(metrics_dir=None, profiler=None):
+    """Cost the main scenarios, with and without link restrictions.
+
+    Args:
+        metrics_dir (opt): Directory where timers and counters of each
+            scenario are written, as "<scenario>.json" (name made safe for a
+            file name).
+        profiler (opt): Profiler of the run, with a section by scenario.
+    """
+
+    profiler = profiler or Profiler()
+
+    if metrics_dir and not os.path.isdir(metrics_dir):
+        os.makedirs(metrics_dir)
+
+    for restrictions in [False, True]:
+        suffix = " RESTRICTED" if restrictions else ""
+
+        # initialize freight transport network
+        if restrictions:
+            print "\nCalculating costs with link restrictions\n"
+        with profiler.section("build networks" + suffix):
+            fn = FreightNetwork(projection_factor=1.0,
+                                restrictions=restrictions)
+        print "\n"
+
+        # cost network at current situation
+        scenario = "current situation" + suffix
+        print "Costing", scenario
+        with profiler.section(scenario):
+            fn.cost_network()
+            fn.report_to_excel(scenario, append_report=restrictions)
+        _write_metrics(fn, metrics_dir, scenario)
+
+        # every scenario branches from the current situation
+        baseline = fn.snapshot()
+
+        # cost network deriving all possible freight to railway
+        scenario = "derive all to railway" + suffix
+        print "Costing", scenario
+        with profiler.section(scenario):
+            fn.derive.all_to_railway()
+            fn.cost_network()
+            fn.report_to_excel(scenario, append_report=True)
+        _write_metrics(fn, metrics_dir, scenario)
+
+        # cost network deriving all but some links and some od pairs
+        scenario = "derive all to railway but some links and ods" + suffix
+        print "Costing", scenario
+        with profiler.section(scenario):
+            fn.restore(baseline)
+            fn.min_network_cost()
+            fn.cost_network()
+            fn.report_to_excel(scenario, append_report=True)
+        _write_metrics(fn, metrics_dir, scenario)
+
+        # cost network deriving all freight to roadway
+        scenario = "derive all to roadway" + suffix
+        print "Costing", scenario
+        with profiler.section(scenario):
+            fn.restore(baseline)
+            fn.derive.all_to_roadway()
+            fn.cost_network()
+            fn.report_to_excel(scenario, append_report=True)
+        _write_metrics(fn, metrics_dir, scenario)
 
 
 if __name__ == '__main__':
-    main()
+
+    # take --profile flag out of the arguments
+    profiler, args = Profiler.from_argv(sys.argv[1:])
+
+    # save fully built networks to a snapshot file
+    if args and args[0] == "build-snapshot":
+        build_snapshot(*args[1:2])
+
+    # parse arguments if called with arguments
+    elif len(args) == 1:
+        main(args[0], profiler)
+
+    else:
+        main(profiler=profiler)
@@ -0,0 +1,186 @@
+import sys
+import types
+import numpy as np
+from dijkstra.find_paths import Network
+from modal_networks import RailwayNetwork, RoadwayNetwork
+from modules import RailwayNetworkBuilder, RoadwayNetworkBuilder
+
+"""
+    Memory accounting of modal networks. Walks the structures of a network
+    (od pairs, links with their tons, paths, parameters...) adding up the
+    approximate bytes and number of objects each of them holds, to find out
+    which one is responsible when a network doesn't fit in memory.
+"""
+
+# objects shared by the whole interpreter, never counted
+SKIPPED_TYPES = (type, types.ModuleType, types.FunctionType,
+                 types.BuiltinFunctionType, types.MethodType,
+                 types.ClassType, types.NoneType, bool)
+
+
+def get_footprint(obj, seen=None):
+    """Return approximate bytes and number of objects reachable from obj.
+
+    Objects already in seen are not counted (nor what is only reachable
+    through them), so a set shared by many calls counts every object once.
+
+    Args:
+        obj: Object to be measured.
+        seen (opt): Set of ids of objects already counted.
+
+    Returns: (size, objects)
+    """
+
+    if seen is None:
+        seen = set()
+
+    size = 0
+    objects = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, SKIPPED_TYPES):
+            continue
+        seen.add(id(obj))
+
+        size += sys.getsizeof(obj)
+        objects += 1
+
+        if isinstance(obj, dict):
+            stack.extend(obj.iterkeys())
+            stack.extend(obj.itervalues())
+
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+
+        # arrays already count their data buffer
+        elif isinstance(obj, (basestring, int, long, float, np.ndarray)):
+            pass
+
+        else:
+            if hasattr(obj, "__dict__"):
+                stack.append(obj.__dict__)
+            for cls in type(obj).__mro__:
+                for slot in getattr(cls, "__slots__", ()):
+                    if hasattr(obj, slot):
+                        stack.append(getattr(obj, slot))
+
+    return size, objects
+
+
+class NetworkMemoryFootprint(object):
+
+    """Approximate memory held by each structure of a modal network.
+
+    Structures are measured in the order of STRUCTURES, and objects shared by
+    many of them (eg. the ids of od pairs) are counted in the first one.
+    Objects of the network itself (tracker, caches, metrics...) are not
+    followed when reached from a structure, so tons of links are counted
+    with their links but not the tracker they notify. "graphs" are the
+    dijkstra graphs the path finder builds from the links, and
+    "shortest_paths" all the paths it finds between every pair of nodes
+    (only measured if asked for, as it's very expensive). "ids" is the table
+    interning ids as ints, without the ids already counted elsewhere."""
+
+    STRUCTURES = ["params", "links", "restricted_links", "od_pairs",
+                  "od_pairs_removed", "paths", "link_ods", "wagons",
+                  "locoms", "trucks", "ids"]
+
+    def __init__(self, mn, all_pairs=False):
+        """
+        Args:
+            mn: Modal network to be measured.
+            all_pairs: If True, shortest paths between all pairs of nodes
+                are found and measured.
+        """
+
+        self.mn = mn
+        self.all_pairs = all_pairs
+        self.footprint = None
+
+    # PUBLIC
+    def measure(self):
+        """Measure every structure of the network.
+
+        Returns:
+            List of (structure, bytes, objects) tuples.
+        """
+
+        # network level objects are never followed from structures
+        seen = set([id(self.mn)])
+        seen.update(id(value) for value in vars(self.mn).itervalues())
+
+        self.footprint = []
+        for structure in self.STRUCTURES:
+            if getattr(self.mn, structure, None) is not None:
+                value = getattr(self.mn, structure)
+                seen.discard(id(value))
+                size, objects = get_footprint(value, seen)
+                self.footprint.append((structure, size, objects))
+
+        network = Network()
+        network.create_graphs(self.mn.links)
+        size, objects = get_footprint(network.graphs, seen)
+        self.footprint.append(("graphs", size, objects))
+
+        if self.all_pairs:
+            paths = network.find_shortest_paths("isolated_gauges")
+            size, objects = get_footprint(paths, seen)
+            self.footprint.append(("shortest_paths", size, objects))
+
+        return self.footprint
+
+    def as_dict(self):
+
+        if self.footprint is None:
+            self.measure()
+
+        return {structure: {"bytes": size, "objects": objects}
+                for structure, size, objects in self.footprint}
+
+    def report(self):
+        """Print the footprint of every structure, with the total."""
+
+        if self.footprint is None:
+            self.measure()
+
+        print "Memory footprint of", self.mn.MODE_NAME, "network"
+        print "{:<20}{:>16}{:>12}".format("structure", "MB", "objects")
+        for structure, size, objects in self.footprint:
+            print "{:<20}{:>16,.1f}{:>12,}".format(structure,
+                                                    size / 1024.0 ** 2,
+                                                    objects)
+
+        print "{:<20}{:>16,.1f}{:>12,}".format(
+            "total", sum(size for s, size, o in self.footprint) / 1024.0 ** 2,
+            sum(objects for s, size, objects in self.footprint))
+
+
+def main(trace_memory=False, all_pairs=False, compact=False):
+    """Build railway and roadway networks and report their memory.
+
+    Args:
+        trace_memory: If True, peak memory of each build phase is reported
+            too (traced by tracemalloc, when available).
+        all_pairs: If True, memory of all the shortest paths is reported.
+        compact: If True, networks are built with slotted od pairs, links,
+            paths and tons (see CompactOD).
+    """
+
+    for mn_class, builder_class in [(RailwayNetwork, RailwayNetworkBuilder),
+                                    (RoadwayNetwork, RoadwayNetworkBuilder)]:
+        mn = mn_class(builder_class(trace_memory=trace_memory,
+                                    compact=compact))
+        NetworkMemoryFootprint(mn, all_pairs).report()
+
+        if trace_memory:
+            print "Peak memory by build phase (MB)"
+            for phase, peak_bytes in sorted(mn.metrics.memory.iteritems()):
+                print "{:<36}{:>12,.1f}".format(phase,
+                                                peak_bytes / 1024.0 ** 2)
+        print
+
+
+if __name__ == '__main__':
+    main("--trace-memory" in sys.argv, "--all-pairs" in sys.argv,
+         "--compact" in sys.argv)
@@ -2,8 +2,12 @@
 from modules import RailwayNetworkBuilder, RoadwayNetworkBuilder
 from modules import RailwayNetworkCost, RoadwayNetworkCost
 from modules import RailwayNetworkReport, RoadwayNetworkReport
-from modules.builder.components.path import Path
+from modules import RailwayIncrementalCost, RoadwayIncrementalCost
+from modules.builder.components.path import Path, CompactPath
+from modules.builder.components import ChangeTracker, LinkOdsIndex, Metrics
+from modules.builder.components import IdTable, NetworkArrays
 import math
+import numpy as np
 from dijkstra import find_paths
 import sys
 from pprint import pprint
@@ -40,6 +44,9 @@ class BaseModalNetwork(object):
     """
     RELATIVE_DENSITY_FACTOR = 2
 
+    # check that link and od based calculations of network ton-km match
+    CHECK_CONSISTENCY = False
+
     def __init__(self):
 
         self.params = {}
@@ -50,6 +57,31 @@ class BaseModalNetwork(object):
         self.paths = {}
         self.costs = {"mob": None, "inf": None, "time": None}
         self.is_simple_costed = False
+        self.compact = False
+        self.tracker = ChangeTracker()
+        self.ids = IdTable()
+        self.link_ods = LinkOdsIndex()
+        self.metrics = Metrics()
+        self.incremental_cost = self.INCREMENTAL_COST_CLASS(self)
+
+        # network aggregates calculated at a certain tracker version
+        self._cached = {}
+        self._cached_version = None
+
+        # od pairs - links incidence, kept while paths don't change
+        self._paths_incidence = None
+        self._paths_incidence_version = None
+
+        # tons of links by categories, updated only for links that change
+        self._links_scales = {}
+        self._links_scales_incidence = None
+        self.tracker.watch_links("scales")
+
+        # structure of arrays of links and od pairs, see to_arrays
+        self._arrays = None
+        self._arrays_incidence = None
+        self.tracker.watch_links("arrays")
+        self.tracker.watch_od_pairs("arrays")
 
     def __iter__(self):
         return self.iter_links()
@@ -98,90 +130,45 @@ class BaseModalNetwork(object):
     # network properties
     @property
     def ton_km(self):
-        """Sum all ton_km from all od_pairs used in the model."""
-        total_tk_link = 0.0
-        total_tk_od = 0.0
-
-        # iterate through all links adding ton * dist
-        for link in self.iter_links():
-            total_tk_link += link.tons.get() * link.dist
-
-        # iterate throught all ods adding ton * dist
-        for od in self.iter_od_pairs():
-            total_tk_od += od.tons.get() * od.dist
-
-        # control that both ways of calculate total_ton_km are the same!
-        msg = "Link and OD based ways of total_ton_km calculation" + \
-            "differ! Link: " + str(total_tk_link) + " OD: " + \
-            str(total_tk_od)
-        if total_tk_od == 0:
-            assert abs(total_tk_link - total_tk_od) < 0.01, msg
-        elif total_tk_link > 1 and total_tk_od > 1:
-            assert abs(total_tk_link / total_tk_od - 1) < 0.01, msg
-
-        return total_tk_link
+        """Sum all ton_km from all links used in the model."""
+        return self._get_cached("ton_km", self._calc_ton_km)
 
     @property
     def ton(self):
         """Sum all tons from od_pairs used in the model."""
-        total_tons = 0.0
-
-        # iterate through all od pairs adding its tons
-        for od in self.iter_od_pairs():
-            total_tons += od.tons.get()
-
-        return total_tons
+        return self._get_cached("ton", self._calc_ton)
 
     @property
     def pathless_ton(self):
         """Sum all tons from od_pairs_removed that has no path in the model."""
-        total_pathless_tons = 0.0
-
-        # iterate through all od pairs adding its tons
-        for od in self.iter_od_pairs(pathless=True):
-            total_pathless_tons += od.tons.get()
-
-        return total_pathless_tons
+        return self._get_cached("pathless_ton", self._calc_pathless_ton)
 
     @property
     def average_distance(self):
-        if self.ton != 0:
-            return self.ton_km / self.ton
-        else:
-            return 0.0
+        return self._get_cached("average_distance",
+                                self._calc_average_distance)
 
     @property
     def density(self):
         """Get average tons of density by km of network."""
-
-        # check network dimension is not zero
-        if self.dimension and self.dimension > 0:
-            density = self.ton_km / self.dimension
-
-        else:
-            density = 0
-
-        return density
+        return self._get_cached("density", self._calc_density)
 
     @property
     def dimension(self):
         """Calculate network dimension in km."""
-        return sum([link.dist for link in self.iter_links()
-                    if link.tons.get() > 0.0])
+        return self._get_cached("dimension", self._calc_dimension)
 
     @property
     def high_density_dimension(self):
         """Calculate network high density dimension in km."""
-        high_density = self.density * self.RELATIVE_DENSITY_FACTOR
-        return sum([link.dist for link in self.iter_links()
-                    if link.tons.get() > high_density])
+        return self._get_cached("high_density_dimension",
+                                self._calc_high_density_dimension)
 
     @property
     def low_density_dimension(self):
         """Calculate network low density dimension in km."""
-        low_density = self.density / self.RELATIVE_DENSITY_FACTOR
-        return sum([link.dist for link in self.iter_links()
-                    if link.tons.get() < low_density])
+        return self._get_cached("low_density_dimension",
+                                self._calc_low_density_dimension)
 
     @property
     def total_cost_tk(self):
@@ -244,6 +231,16 @@ class BaseModalNetwork(object):
         else:
             del self.links[id_link]
 
+        self.tracker.bump_links()
+
+    def get_ods_using_link(self, id_link, gauge):
+        """Return od pairs whose path uses a link-gauge of the network."""
+        return self.link_ods.get_ods(id_link, gauge)
+
+    def has_link(self, id_link, gauge):
+        """Returns true if link-gauge exists in the network."""
+        return (id_link in self.links) and (gauge in self.links[id_link])
+
     def get_od(self, id_od, category_od):
         """Returns existent od pair or create a new one if it doesn't exist.
 
@@ -267,15 +264,19 @@ class BaseModalNetwork(object):
 
         if category_od:
             od = self.od_pairs[id_od][category_od]
+            od.detach_index()
             self._add_removed_od_pair(od)
             del self.od_pairs[id_od][category_od]
 
         else:
             for category_od in self.od_pairs[id_od]:
                 od = self.od_pairs[id_od][category_od]
+                od.detach_index()
                 self._add_removed_od_pair(od)
             del self.od_pairs[id_od]
 
+        self.tracker.bump_structure()
+
     def get_regrouping_categories(self):
         """Return a list with all the categories that can be regrouped."""
 
@@ -294,39 +295,80 @@ class BaseModalNetwork(object):
 
         return regrouping_categories
 
-    def find_lowest_scale_links(self):
-        """Find the lowest scale link used by every od pair."""
+    def find_lowest_scale_links(self, ods=None):
+        """Find the lowest scale link used by every od pair.
 
-        # iterate od pairs of the network
-        for od in self.iter_od_pairs():
+        Od pairs are grouped by the categories their scale is based on and
+        the lowest scale link of their paths is found at once, for every
+        group, through the od pairs - links incidence.
+
+        Args:
+            ods (opt): Od pairs of the network to find it for, instead of all
+                of them.
+        """
 
-            # get the gauge of the link
-            gauge = od.gauge
+        links, columns, rows, indptr, indices = self._get_paths_incidence()
+        regrouping_categories = tuple(self.get_regrouping_categories())
 
-            # check if there are links (if the pair is not intrazone)
-            if not od.is_intrazone() and od.has_operable_path():
+        if ods is None:
+            ods = self.iter_od_pairs()
 
-                # find wich product categories can be regrouped with this od
-                od_category = od.tons.category
+        # group od pairs with a path by categories they can go with
+        groups = {}
+        for od in ods:
+            row = rows[(od.id, od.category)]
 
-                # if is regroupable, all regroupable categories can be with it
-                if self.is_regroupable(od_category):
-                    categories = self.get_regrouping_categories()
+            if (not od.is_intrazone() and od.has_operable_path() and
+                    indptr[row + 1] > indptr[row]):
 
-                # if is not regroupable, tons must go with the same category
+                if self.is_regroupable(od.tons.category):
+                    categories = regrouping_categories
                 else:
-                    categories = od_category
+                    categories = (od.tons.category,)
 
-                # get lowest scale link of od pair, based con regrouping categ
-                lowest_link_id = min(od.links,
-                                     key=lambda x: self.get_link(x, gauge).tons.get(categories=categories))
-                lowest_link = self.get_link(lowest_link_id, gauge)
+                groups.setdefault(categories, []).append((od, row))
 
             else:
-                lowest_link = None
+                od.set_lowest_scale_link(None)
 
-            # store a reference to lowest link in th od pair object
-            od.set_lowest_scale_link(lowest_link)
+        # store a reference to lowest link in the od pairs objects
+        for categories, ods_rows in groups.iteritems():
+            lowest_columns = self._find_lowest_scale_columns(
+                categories, np.array([row for od, row in ods_rows], dtype=int))
+
+            for (od, row), column in zip(ods_rows, lowest_columns):
+                od.set_lowest_scale_link(links[column])
+
+    def find_lowest_scale_link(self, od):
+        """Find the lowest scale link used by an od pair."""
+
+        # get the gauge of the link
+        gauge = od.gauge
+
+        # check if there are links (if the pair is not intrazone)
+        if not od.is_intrazone() and od.has_operable_path():
+
+            # find wich product categories can be regrouped with this od
+            od_category = od.tons.category
+
+            # if is regroupable, all regroupable categories can be with it
+            if self.is_regroupable(od_category):
+                categories = self.get_regrouping_categories()
+
+            # if is not regroupable, tons must go with the same category
+            else:
+                categories = od_category
+
+            # get lowest scale link of od pair, based con regrouping categ
+            lowest_link_id = min(od.links,
+                                 key=lambda x: self.get_link(x, gauge).tons.get(categories=categories))
+            lowest_link = self.get_link(lowest_link_id, gauge)
+
+        else:
+            lowest_link = None
+
+        # store a reference to lowest link in th od pair object
+        od.set_lowest_scale_link(lowest_link)
 
     def find_shortest_path(self, id_od,
                            gauge_priority=["ancha", "media", "angosta"],
@@ -334,9 +376,11 @@ class BaseModalNetwork(object):
 
         path_nodes = []
 
-        paths_network = find_paths.Network()
-        paths_network.create_graphs(self.links)
-        paths = paths_network.find_shortest_path(id_od, argument=restrictions)
+        with self.metrics.timer("find_shortest_path"):
+            paths_network = find_paths.Network()
+            paths_network.create_graphs(self.links)
+            paths = paths_network.find_shortest_path(id_od,
+                                                     argument=restrictions)
 
         if len(paths) > 0:
 
@@ -364,7 +408,10 @@ class BaseModalNetwork(object):
             assert len(path_nodes) > 0, msg
 
             path = "-".join(path_nodes)
-            RV = Path(id_od, path, gauge)
+            if self.compact:
+                RV = CompactPath(id_od, path, gauge, self.ids)
+            else:
+                RV = Path(id_od, path, gauge, self.ids)
 
         elif len(paths) == 0 and not restrictions:
             raise Exception("No path has been found for " + id_od)
@@ -459,7 +506,253 @@ class BaseModalNetwork(object):
         # ask for excel report passing RailNetwork object itself
         rep.report_to_excel(self)
 
+    def to_arrays(self):
+        """Return links and od pairs of the network as a structure of arrays.
+
+        The same NetworkArrays object is returned while paths and links of
+        the network don't change, taking again only the links and od pairs
+        whose tons changed since the last call. A change in paths or links
+        builds new arrays, following the new paths incidence.
+
+        Returns:
+            NetworkArrays with distances, tons and gross ton-km of links, tons
+                and distances of od pairs and the links of their paths.
+        """
+
+        links, columns, rows, indptr, indices = self._get_paths_incidence()
+
+        # a new incidence needs new arrays
+        if self._arrays_incidence is not self._paths_incidence:
+            ods = [None] * len(rows)
+            for od in self.iter_od_pairs():
+                ods[rows[(od.id, od.category)]] = od
+
+            self.tracker.pop_watched_links("arrays")
+            self.tracker.pop_watched_od_pairs("arrays")
+            self._arrays = NetworkArrays(links, ods, indptr, indices)
+            self._arrays_incidence = self._paths_incidence
+
+        else:
+            tracker = self.tracker
+            self._arrays.update_links(tracker.pop_watched_links("arrays"))
+            self._arrays.update_od_pairs(
+                tracker.pop_watched_od_pairs("arrays"))
+
+        return self._arrays
+
     # PRIVATE
+    # network properties calculations
+    def _get_cached(self, name, calculate):
+        """Return a network aggregate, calculating it only if tons or
+        structure of the network changed since the last time."""
+
+        if self._cached_version != self.tracker.version:
+            self._cached = {}
+            self._cached_version = self.tracker.version
+
+        if name not in self._cached:
+            self._cached[name] = calculate()
+
+        return self._cached[name]
+
+    def _store_cached(self, name, value):
+        """Store a network aggregate already known for the current state."""
+
+        if self._cached_version != self.tracker.version:
+            self._cached = {}
+            self._cached_version = self.tracker.version
+
+        self._cached[name] = value
+
+    def _calc_ton_km(self):
+        arrays = self.to_arrays()
+
+        # add up ton * dist of all links
+        total_tk_link = float(np.dot(arrays.link_tons, arrays.link_dist))
+
+        if self.CHECK_CONSISTENCY:
+            self._check_ton_km(total_tk_link)
+
+        return total_tk_link
+
+    def _check_ton_km(self, total_tk_link):
+        """Control that link and od based ton-km calculations are the same."""
+
+        total_tk_od = 0.0
+
+        # iterate throught all ods adding ton * dist
+        for od in self.iter_od_pairs():
+            total_tk_od += od.tons.get() * od.dist
+
+        # control that both ways of calculate total_ton_km are the same!
+        msg = "Link and OD based ways of total_ton_km calculation" + \
+            "differ! Link: " + str(total_tk_link) + " OD: " + \
+            str(total_tk_od)
+        if total_tk_od == 0:
+            assert abs(total_tk_link - total_tk_od) < 0.01, msg
+        elif total_tk_link > 1 and total_tk_od > 1:
+            assert abs(total_tk_link / total_tk_od - 1) < 0.01, msg
+
+    def _calc_ton(self):
+        return float(self.to_arrays().od_tons.sum())
+
+    def _calc_pathless_ton(self):
+        total_pathless_tons = 0.0
+
+        # iterate through all od pairs adding its tons
+        for od in self.iter_od_pairs(pathless=True):
+            total_pathless_tons += od.tons.get()
+
+        return total_pathless_tons
+
+    def _calc_average_distance(self):
+        ton = self.ton
+        if ton != 0:
+            return self.ton_km / ton
+        else:
+            return 0.0
+
+    def _calc_density(self):
+        dimension = self.dimension
+
+        # check network dimension is not zero
+        if dimension and dimension > 0:
+            density = self.ton_km / dimension
+
+        else:
+            density = 0
+
+        return density
+
+    def _calc_dimension(self):
+        arrays = self.to_arrays()
+        return float(arrays.link_dist[arrays.link_tons > 0.0].sum())
+
+    def _calc_high_density_dimension(self):
+        high_density = self.density * self.RELATIVE_DENSITY_FACTOR
+        arrays = self.to_arrays()
+        return float(arrays.link_dist[arrays.link_tons > high_density].sum())
+
+    def _calc_low_density_dimension(self):
+        low_density = self.density / self.RELATIVE_DENSITY_FACTOR
+        arrays = self.to_arrays()
+        return float(arrays.link_dist[arrays.link_tons < low_density].sum())
+
+    def _get_paths_incidence(self):
+        """Return the od pairs - links incidence of the network.
+
+        Incidence is stored in compressed rows: links of the path of od pair
+        in row i are indices[indptr[i]:indptr[i + 1]].
+
+        Returns: (links, columns, rows, indptr, indices)
+            links: List of links of the network, indexed by column.
+            columns: Dictionary with column of each (id_link, gauge) key.
+            rows: Dictionary with row of each (id_od, category) key.
+            indptr: Array with start of each row in indices.
+            indices: Array with columns of links used by od pairs.
+        """
+
+        if (self._paths_incidence is None or self._paths_incidence_version !=
+                self.tracker.structure_version):
+
+            links = list(self.iter_links())
+            columns = {(link.id, link.gauge): i
+                       for i, link in enumerate(links)}
+
+            rows = {}
+            indptr = [0]
+            indices = []
+            for od in self.iter_od_pairs():
+                rows[(od.id, od.category)] = len(indptr) - 1
+
+                if od.has_operable_path():
+                    for id_link in od.links:
+                        if (id_link, od.gauge) in columns:
+                            indices.append(columns[(id_link, od.gauge)])
+
+                indptr.append(len(indices))
+
+            self._paths_incidence = (links, columns, rows,
+                                     np.array(indptr, dtype=int),
+                                     np.array(indices, dtype=int))
+            self._paths_incidence_version = self.tracker.structure_version
+
+        return self._paths_incidence
+
+    def _sum_by_path(self, links_values, indptr, indices, rows):
+        """Sum values of links in the path of od pairs in some rows."""
+
+        cum_values = np.concatenate(([0.0], np.cumsum(links_values[indices])))
+
+        return cum_values[indptr[rows + 1]] - cum_values[indptr[rows]]
+
+    def _get_links_scales(self, categories):
+        """Return an array with tons of each link of the paths incidence,
+        filtered by categories.
+
+        Arrays are kept by categories and only tons of links changed since the
+        last call are taken again.
+
+        Args:
+            categories: Tuple of categories (empty for all of them).
+        """
+
+        links, columns = self._get_paths_incidence()[:2]
+
+        # a new incidence needs new arrays
+        if self._links_scales_incidence is not self._paths_incidence:
+            self._links_scales = {}
+            self._links_scales_incidence = self._paths_incidence
+            self.tracker.pop_watched_links("scales")
+
+        # update changed links in every array already calculated
+        for link_key in self.tracker.pop_watched_links("scales"):
+            if link_key in columns:
+                link = links[columns[link_key]]
+                for scale_categories, scales in self._links_scales.items():
+                    scales[columns[link_key]] = link.tons.get(
+                        categories=list(scale_categories))
+
+        if categories not in self._links_scales:
+            self._links_scales[categories] = np.array(
+                [link.tons.get(categories=list(categories)) for link in links],
+                dtype=float)
+
+        return self._links_scales[categories]
+
+    def _find_lowest_scale_columns(self, categories, rows):
+        """Find the lowest scale link of the paths of od pairs in some rows.
+
+        Args:
+            categories: Tuple of categories that scale of links is based on.
+            rows: Array of rows of the paths incidence, with non empty paths.
+
+        Returns:
+            Array with the column of the lowest scale link of each row.
+        """
+
+        indptr, indices = self._get_paths_incidence()[3:]
+        scales = self._get_links_scales(categories)
+
+        # columns of the links of the paths, one path after the other
+        lengths = indptr[rows + 1] - indptr[rows]
+        offsets = np.cumsum(lengths) - lengths
+        positions = (np.repeat(indptr[rows] - offsets, lengths) +
+                     np.arange(lengths.sum()))
+        path_columns = indices[positions]
+        path_scales = scales[path_columns]
+
+        # segmented min over the links of each path
+        segments = np.repeat(np.arange(len(rows)), lengths)
+        min_scales = np.minimum.reduceat(path_scales, offsets)
+
+        # first link of each path reaching the minimum, as min() would do
+        is_min = path_scales == min_scales[segments]
+        first_min = np.unique(segments[is_min], return_index=True)[1]
+
+        return path_columns[is_min][first_min]
+
+    # others
     def _use_existent_links(self, path):
 
         RV = True
@@ -475,6 +768,7 @@ class BaseModalNetwork(object):
     def _create_od_pair(self, id_od, category_od):
         network_builder = self.BUILDER_CLASS()
         network_builder.create_od_pair(self, id_od, category_od)
+        self.tracker.bump_structure()
 
     def _reset_links(self):
         for link in self.iter_links():
@@ -487,12 +781,15 @@ class BaseModalNetwork(object):
         for od in self.iter_od_pairs():
 
             if od.tons.get() < 0.001:
+                od.detach_index()
                 self.od_pairs[od.id].pop(od.tons.category)
 
                 # check if there is any od_pair left, of another category
                 if len(self.od_pairs[od.id]) == 0:
                     self.od_pairs.pop(od.id)
 
+                self.tracker.bump_structure()
+
     def _add_removed_od_pair(self, od):
         """Add an od pair to removed od pair dictionary.
 
@@ -516,6 +813,7 @@ class RoadwayNetwork(BaseModalNetwork):
     REPORT_CLASS = RoadwayNetworkReport
     COST_CLASS = RoadwayNetworkCost
     BUILDER_CLASS = RoadwayNetworkBuilder
+    INCREMENTAL_COST_CLASS = RoadwayIncrementalCost
     MODE_NAME = "Roadway"
 
     def __init__(self, builder=None, projection_factor=1.0,
@@ -560,12 +858,28 @@ class RoadwayNetwork(BaseModalNetwork):
         """Calculates time cost for current mobility requirements."""
         self.costs["time"] = {"total_time": 0.0}
 
-    def cost_network(self):
-        """Cost infrastructure and mobility of the network."""
+    def cost_network(self, incremental=False):
+        """Cost infrastructure and mobility of the network.
+
+        Args:
+            incremental: If True, only links and od pairs that changed since
+                the last incremental costing are re-costed.
+        """
 
-        self.calc_mobility_cost()
-        self.calc_infrastructure_cost()
-        self.calc_time_cost()
+        if incremental and self.incremental_cost.is_based:
+            with self.metrics.timer("cost.incremental"):
+                self.incremental_cost.update()
+
+        else:
+            with self.metrics.timer("cost.mobility"):
+                self.calc_mobility_cost()
+            with self.metrics.timer("cost.infrastructure"):
+                self.calc_infrastructure_cost()
+            with self.metrics.timer("cost.time"):
+                self.calc_time_cost()
+
+            if incremental:
+                self.incremental_cost.rebase()
 
     def get_wagons_per_locomotive(self):
         """Dummy method to match railway interface for reporting."""
@@ -582,6 +896,8 @@ class RoadwayNetwork(BaseModalNetwork):
 
     # PRIVATE
     def _reset_network(self):
+        self.incremental_cost.invalidate()
+        self.tracker.bump()
         self._reset_links()
         self._clean_od_pairs()
 
@@ -597,7 +913,9 @@ class RailwayNetwork(BaseModalNetwork):
     REPORT_CLASS = RailwayNetworkReport
     COST_CLASS = RailwayNetworkCost
     BUILDER_CLASS = RailwayNetworkBuilder
+    INCREMENTAL_COST_CLASS = RailwayIncrementalCost
     MODE_NAME = "Railway"
+    BATCHED_REGROUP = False
 
     def __init__(self, builder=None, projection_factor=1.0,
                  restrictions=False):
@@ -644,23 +962,43 @@ class RailwayNetwork(BaseModalNetwork):
 
         self.is_simple_costed = True
 
-    def calc_optimized_mobility_cost(self):
+    def calc_optimized_mobility_cost(self, batched=None):
         """Regroup trains operating below maximum capacity.
 
         Check if regrouping trains in a single link is more cost-effective than
         previous situation, where some trains where operating below their
-        maximum capacity. If its not the case, revert regrouping."""
+        maximum capacity. If its not the case, link is not regrouped.
+
+        Links were always left regrouped before, as reverting a regroup
+        reverted none of it, so mobility costs are slightly different.
+
+        Args:
+            batched: If True, all links are decided in a single sweep taking
+                units of rolling material as continuous. If False, links are
+                decided one at a time. Default is BATCHED_REGROUP.
+        """
 
         # check that simple cost mobility was calculated
         if not self.is_simple_costed:
             self.calc_simple_mobility_cost()
 
-        # iterate through all links
-        for link in self.iter_links():
-            self.regroup_link(link)
+        # ton-km don't change while regrouping links
+        total_ton_km = self.ton_km
+
+        if batched is None:
+            batched = self.BATCHED_REGROUP
+
+        with self.metrics.timer("cost.regroup_links"):
+            if batched:
+                self._regroup_links_batch(total_ton_km)
+
+            # iterate through all links
+            else:
+                for link in self.iter_links():
+                    self.regroup_link(link, total_ton_km)
 
         # calculate and store mobility costs
-        self.costs["mob"] = self._calc_mobility_cost()
+        self.costs["mob"] = self._calc_mobility_cost(total_ton_km)
 
         # now network is not simple costed anymore (is optimized costed)
         self.is_simple_costed = False
@@ -681,18 +1019,36 @@ class RailwayNetwork(BaseModalNetwork):
     def cost_time(self):
         """Cost time related requirements in the railway network."""
 
-        self.find_lowest_scale_links()
+        # lowest scale links only change if tons or paths changed
+        self._get_cached("lowest_scale_links", self.find_lowest_scale_links)
+
         network_cost = self.COST_CLASS(self)
         self.costs["time"] = network_cost.cost_time()
 
-    def cost_network(self):
+    def cost_network(self, incremental=False):
         """Cost infrastructure and mobility of the network.
 
-        It uses de best cost approach (optimized mobility cost)."""
+        It uses de best cost approach (optimized mobility cost).
 
-        self.calc_optimized_mobility_cost()
-        self.calc_infrastructure_cost()
-        self.cost_time()
+        Args:
+            incremental: If True, only links and od pairs that changed since
+                the last incremental costing are re-costed.
+        """
+
+        if incremental and self.incremental_cost.is_based:
+            with self.metrics.timer("cost.incremental"):
+                self.incremental_cost.update()
+
+        else:
+            with self.metrics.timer("cost.mobility"):
+                self.calc_optimized_mobility_cost()
+            with self.metrics.timer("cost.infrastructure"):
+                self.calc_infrastructure_cost()
+            with self.metrics.timer("cost.time"):
+                self.cost_time()
+
+            if incremental:
+                self.incremental_cost.rebase()
 
     # others
     def has_railway_path(self, od):
@@ -851,6 +1207,44 @@ class RailwayNetwork(BaseModalNetwork):
 
         return num_regroups
 
+    def get_ods_turnouts_regroups(self, ods):
+        """Count turnouts and regroups in the paths of many od pairs.
+
+        Turnouts and regroups of every link are taken once into arrays and
+        summed by od pair through the od pairs - links incidence, which is
+        kept while paths of the network don't change.
+
+        Args:
+            ods: List of od pairs of the network.
+
+        Returns: (num_turnouts, num_regroups)
+            Arrays with turnouts and regroups in the path of each od pair.
+            Regroups are only counted for od pairs that can be regrouped.
+        """
+
+        links, columns, rows, indptr, indices = self._get_paths_incidence()
+
+        # turnouts only change with tons, regroups with every costing
+        links_turnouts = self._get_cached("links_turnouts", lambda: np.array(
+            [link.number_of_turnouts for link in links], dtype=float))
+        links_regroups = np.array([link.regrouped for link in links],
+                                  dtype=float)
+
+        # sum link values by od pair path (a sparse matrix-vector product)
+        ods_rows = np.array([rows[(od.id, od.category)] for od in ods],
+                            dtype=int)
+        num_turnouts = self._sum_by_path(links_turnouts, indptr, indices,
+                                         ods_rows)
+        num_regroups = self._sum_by_path(links_regroups, indptr, indices,
+                                         ods_rows)
+
+        # regroups only delay od pairs that can be regrouped
+        can_be_regrouped = np.array([self.od_can_be_regrouped(od)
+                                     for od in ods], dtype=bool)
+        num_regroups[~can_be_regrouped] = 0.0
+
+        return num_turnouts, num_regroups
+
     def od_can_be_regrouped(self, od):
         """Check if an od pair can be regrouped."""
 
@@ -865,29 +1259,63 @@ class RailwayNetwork(BaseModalNetwork):
             raise Exception("Regroup category parameter is not 0 or 1.")
 
     # PRIVATE
-    def regroup_link(self, link):
+    def regroup_link(self, link, total_ton_km=None):
+        """Regroup trains in a link if it reduces mobility cost.
+
+        Args:
+            link: Link with idle capacity in trains that could be regrouped.
+            total_ton_km (opt): Ton-km of the network, if already known.
+        """
 
-        # store current cost of network
-        current_cost = self._calc_mobility_cost()["total_mobility"]
+        # calculate change in mobility cost without regrouping the link
+        network_cost = self.COST_CLASS(self, total_ton_km)
+        delta_cost = network_cost.cost_regroup(self._get_idle_locs(link),
+                                               link.dist)
+        self.metrics.count("regroup_link.trials")
 
-        # regroup link
-        # print "regroup ", link.id
-        self._regroup_link(link)
+        if delta_cost < 0:
+            self._regroup_link(link)
+            self.metrics.count("regroup_link.regroups")
 
-        # calculate new cost with link regrouped
-        new_cost = self._calc_mobility_cost()["total_mobility"]
+    def _regroup_links_batch(self, total_ton_km=None):
+        """Regroup trains of all links that reduce mobility cost.
 
-        if new_cost >= current_cost:
-            self._revert_regroup_link(link)
+        All links are evaluated at once against the current rolling material,
+        so regrouping one link doesn't change the decision about others."""
+
+        links = list(self.iter_links())
+        num_locs = np.array([self._get_idle_locs(link) for link in links])
+        dists = np.array([link.dist for link in links])
+
+        network_cost = self.COST_CLASS(self, total_ton_km)
+        delta_costs = network_cost.cost_regroups(num_locs, dists)
+        self.metrics.count("regroup_link.trials", len(links))
+
+        for link, delta_cost in zip(links, delta_costs):
+            if delta_cost < 0:
+                self._regroup_link(link)
+                self.metrics.count("regroup_link.regroups")
+
+    def _get_idle_locs(self, link):
+        """Calculate locomotives that can be eliminated regrouping a link."""
+
+        idle_cap_regroup = link.idle_capacity_regroup
+        loc_cap = self.params["locomotive_capacity"].value
 
-    def _calc_mobility_cost(self):
+        return math.floor(float(idle_cap_regroup) / float(loc_cap))
+
+    def _calc_mobility_cost(self, total_ton_km=None):
         """Calculates mobility cost for current mobility requirements.
 
         Creates a railway NetworkCost() object to cost mobility for a network
-        described by current parameters, locomotives, wagons and links data."""
+        described by current parameters, locomotives, wagons and links data.
+
+        Args:
+            total_ton_km (opt): Ton-km of the network, if already known.
+        """
 
         # create a railway network cost object
-        network_cost = self.COST_CLASS(self)
+        network_cost = self.COST_CLASS(self, total_ton_km)
 
         return network_cost.cost_mobility()
 
@@ -956,9 +1384,7 @@ class RailwayNetwork(BaseModalNetwork):
         """
 
         # calculate locomotives that can be eliminated
-        idle_cap_regroup = link.idle_capacity_regroup
-        loc_cap = self.params["locomotive_capacity"].value
-        idle_locs = math.floor(float(idle_cap_regroup) / float(loc_cap))
+        idle_locs = self._get_idle_locs(link)
 
         # store parameters to be used in short variables
         loc_capacity = self.params["locomotive_capacity"].value
@@ -969,25 +1395,25 @@ class RailwayNetwork(BaseModalNetwork):
 
         # update idle_capacity of link
         link.regroup(idle_locs * loc_capacity)
+        link.regrouped_locs += idle_locs
 
         # update rolling material time requirements
         self.locoms.regroup(idle_locs, link.dist)
         self.wagons.add_regroup_time(wagons_regrouped)
 
     def _revert_regroup_link(self, link):
-        """Revert previously regrouping of trains restoring idleness.
+        """Restore all the idleness removed from a link by regrouping.
+
+        It uses the locomotives actually regrouped in the link (idle
+        capacity left after regrouping can't tell them), so the link and the
+        rolling material end up exactly as they were before any regrouping.
 
         Args:
-            link: a previously regrouped link that has eliminated some idleness
-            idle_locs: number of idle locomotives
+            link: a link that may have been regrouped
         """
 
-        # calculate locomotives that can be eliminated
-        idle_cap_regroup = link.idle_capacity_regroup
-        loc_cap = self.params["locomotive_capacity"].value
-        idle_locs = math.floor(float(idle_cap_regroup) / float(loc_cap))
-
         # store parameters to be used in short variables
+        idle_locs = link.regrouped_locs
         loc_capacity = self.params["locomotive_capacity"].value
         wagon_capacity = self.params["wagon_capacity"].value
 
@@ -996,12 +1422,15 @@ class RailwayNetwork(BaseModalNetwork):
 
         # update idle_capacity of link
         link.revert_regroup(idle_locs * loc_capacity)
+        link.regrouped_locs = 0.0
 
         # update rolling material time requirements
         self.locoms.revert_regroup(idle_locs, link.dist)
         self.wagons.subtract_regroup_time(wagons_regrouped)
 
     def _reset_network(self):
+        self.incremental_cost.invalidate()
+        self.tracker.bump()
         self.wagons.reset()
         self.locoms.reset()
         self._reset_links()
@@ -1,3 +1,5 @@
 from cost import RailwayNetworkCost, RoadwayNetworkCost
 from report import RailwayNetworkReport, RoadwayNetworkReport, BaseReport
+from report import ScenariosReport
 from builder import RailwayNetworkBuilder, RoadwayNetworkBuilder
+from incremental_cost import RailwayIncrementalCost, RoadwayIncrementalCost
@@ -1,5 +1,12 @@
-from od import OD
-from path import Path
+from od import OD, CompactOD
+from path import Path, CompactPath
 from link import RailwayLink, RoadwayLink
-from parameter import Parameter
-from railway_rolling_material import RollingMaterial
+from link import CompactRailwayLink, CompactRoadwayLink
+from parameter import Parameter, CompactParameter
+from railway_rolling_material import RollingMaterial, CompactRollingMaterial
+from tracker import ChangeTracker
+from link_ods_index import LinkOdsIndex
+from tons import OdTons, CompactOdTons, LinkTons
+from metrics import Metrics
+from id_table import IdTable
+from network_arrays import NetworkArrays
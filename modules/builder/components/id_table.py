@@ -0,0 +1,140 @@
+"""Interning of node and link ids of a modal network as ints."""
+
+from array import array
+
+
+class IdTable(object):
+
+    """Maps ids of nodes and links of a network to dense ints.
+
+    Every id gets the next free index of its kind the first time it is seen,
+    so indexes can be used as keys (or positions in arrays) instead of the
+    ids. Links are also indexed by their nodes, so a path of nodes can be
+    stored as an array of link indexes.
+
+        >>> ids = IdTable()
+        >>> ids.link_index("1-3"), ids.link_index("3-7")
+        (0, 1)
+        >>> ids.path_to_links([1, 3, 7]).tolist()
+        [0, 1]
+        >>> ids.links_to_path(array("l", [0, 1]))
+        [1, 3, 7]
+    """
+
+    def __init__(self):
+        self.nodes = []
+        self.node_indexes = {}
+        self.links = []
+        self.link_indexes = {}
+        self.link_nodes = []
+
+        # link indexes by the (lower, higher) nodes of the link
+        self._links_by_nodes = {}
+
+    # PUBLIC
+    # interning methods
+    def node_index(self, node):
+        """Return index of a node, interning it if it is new."""
+
+        node = int(node)
+        if node not in self.node_indexes:
+            self.node_indexes[node] = len(self.nodes)
+            self.nodes.append(node)
+
+        return self.node_indexes[node]
+
+    def link_index(self, id_link):
+        """Return index of a link id (eg. "1-3"), interning it if it is new.
+
+        Its nodes are interned too, and the link is indexed by them."""
+
+        if id_link not in self.link_indexes:
+            nodes = tuple(sorted(int(i) for i in id_link.split("-")))
+
+            # a link id with other format (eg. "3-1") is the same link
+            if nodes in self._links_by_nodes:
+                index = self._links_by_nodes[nodes]
+
+            # links are kept with the id od pairs give them (lower node first)
+            else:
+                index = len(self.links)
+                self.links.append(str(nodes[0]) + "-" + str(nodes[1]))
+                self.link_nodes.append(nodes)
+                self._links_by_nodes[nodes] = index
+
+                for node in nodes:
+                    self.node_index(node)
+
+            self.link_indexes[id_link] = index
+
+        return self.link_indexes[id_link]
+
+    # getters
+    def get_node_index(self, node):
+        """Return index of a node, or None if it was never interned."""
+        return self.node_indexes.get(int(node))
+
+    def get_link_index(self, node_a, node_b):
+        """Return index of the link between two nodes, interning it if it is
+        new."""
+
+        nodes = (node_a, node_b) if node_a < node_b else (node_b, node_a)
+
+        if nodes not in self._links_by_nodes:
+            return self.link_index(str(nodes[0]) + "-" + str(nodes[1]))
+
+        return self._links_by_nodes[nodes]
+
+    # paths
+    def path_to_links(self, path_nodes):
+        """Return an array with the link indexes of a path of nodes.
+
+        Returns None if the path can't be rebuilt from its links (eg. a path
+        going and coming back through the same link), so it must be stored in
+        another way."""
+
+        links = array("l", [self.get_link_index(path_nodes[i],
+                                                path_nodes[i + 1])
+                            for i in xrange(len(path_nodes) - 1)])
+
+        if self.links_to_path(links) != list(path_nodes):
+            return None
+
+        return links
+
+    def links_to_path(self, links):
+        """Return the nodes of a path from the indexes of its links.
+
+        Paths are rebuilt with their first node lower than their last one, as
+        od pairs and paths keep them."""
+
+        if not links:
+            return None
+
+        link_nodes = self.link_nodes
+        first_nodes = link_nodes[links[0]]
+
+        # the first node is the one of the first link not in the second one
+        if len(links) > 1:
+            next_nodes = link_nodes[links[1]]
+            if first_nodes[0] in next_nodes:
+                first_nodes = (first_nodes[1], first_nodes[0])
+
+        path_nodes = list(first_nodes)
+        for link in links[1:]:
+            node_a, node_b = link_nodes[link]
+            if node_a == path_nodes[-1]:
+                path_nodes.append(node_b)
+            else:
+                path_nodes.append(node_a)
+
+        if path_nodes[-1] < path_nodes[0]:
+            path_nodes.reverse()
+
+        return path_nodes
+
+
+if __name__ == '__main__':
+
+    import doctest
+    doctest.testmod()
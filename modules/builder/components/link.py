@@ -1,9 +1,15 @@
 from tons import LinkTons
 
 
-class BaseLink(object):
+class AbstractLink(object):
 
-    """Base class for a link in a freight transport network."""
+    """Methods of a link in a freight transport network, without its data.
+
+    Data members are stored by subclasses, either in a __dict__ (BaseLink,
+    RoadwayLink and RailwayLink) or in slots (CompactRoadwayLink and
+    CompactRailwayLink)."""
+
+    __slots__ = ()
 
     def __init__(self, id, distance, gauge):
 
@@ -84,12 +90,17 @@ class BaseLink(object):
         self.tons.clean_insignificant_ton_values(0.01)
 
 
-class RoadwayLink(BaseLink):
+class BaseLink(AbstractLink):
 
-    """Represents a link in a roadway network.
+    """Base class for a link in a freight transport network."""
 
-    TODO: It still needs to be implemented, for the moment RailwayLink is
-    used as its good enough to act as a RoadwayLink as it is."""
+
+class BaseRoadwayLink(AbstractLink):
+
+    """Base class for roadway links, subclassed by RoadwayLink and
+    CompactRoadwayLink which store the data members."""
+
+    __slots__ = ()
 
     FIELDS = ["id_link", "gauge", "distance", "original_tons", "derived_tons",
               "tons", "gross ton-km"]
@@ -100,12 +111,28 @@ class RoadwayLink(BaseLink):
                 self.gross_ton_km]
 
 
-class RailwayLink(BaseLink):
+class RoadwayLink(BaseRoadwayLink):
 
-    """Represents a link in a railway network.
+    """Represents a link in a roadway network.
 
-    It keeps track of tons passing and idle capacity of tons that could be
-    supported with the same rolling material currently running."""
+    TODO: It still needs to be implemented, for the moment RailwayLink is
+    used as its good enough to act as a RoadwayLink as it is."""
+
+
+class CompactRoadwayLink(BaseRoadwayLink):
+
+    """Slotted RoadwayLink."""
+
+    __slots__ = ("id", "id_gauge", "gauge", "nodes", "dist", "_main_track",
+                 "eac_track", "maintenance", "net_to_gross_factor", "tons")
+
+
+class BaseRailwayLink(AbstractLink):
+
+    """Base class for railway links, subclassed by RailwayLink and
+    CompactRailwayLink which store the data members."""
+
+    __slots__ = ()
 
     FIELDS = ["id_link_gauge", "id_link", "gauge", "distance", "original_tons",
               "derived_tons",
@@ -117,12 +144,13 @@ class RailwayLink(BaseLink):
     def __init__(self, id, distance, gauge):
 
         # call superclass constructor first
-        super(RailwayLink, self).__init__(id, distance, gauge)
+        super(BaseRailwayLink, self).__init__(id, distance, gauge)
 
         # traffic parameters
         self.idle_capacity_regroup = 0.0
         self.idle_capacity_no_regroup = 0.0
         self.regrouped = False
+        self.regrouped_locs = 0.0
 
         # turnout parameters
         self.turnout_freq = None
@@ -176,9 +204,10 @@ class RailwayLink(BaseLink):
 
         Overrides super class method to take into account idle capacity."""
 
-        if self.tons.get() and self.tons.get() > 0.0:
+        ton = self.tons.get()
+        if ton and ton > 0.0:
 
-            gross_ton = (self.tons.get() * self.net_to_gross_factor)
+            gross_ton = (ton * self.net_to_gross_factor)
 
             gross_tk = gross_ton * self.dist
 
@@ -192,8 +221,9 @@ class RailwayLink(BaseLink):
         """Calculate number of turnouts needed at the link."""
 
         # check if there is traffic
-        if self.gross_ton_km > 0.1:
-            num_turnouts = self._calc_number_of_turnouts(self.gross_ton_km,
+        gross_ton_km = self.gross_ton_km
+        if gross_ton_km > 0.1:
+            num_turnouts = self._calc_number_of_turnouts(gross_ton_km,
                                                          self.dist)
         else:
             num_turnouts = 0
@@ -227,6 +257,7 @@ class RailwayLink(BaseLink):
         self.idle_capacity_no_regroup = 0.0
         self.eac_turnout = 0.0
         self.regrouped = False
+        self.regrouped_locs = 0.0
 
         # check stored values of tons are significant
         self.tons.clean_insignificant_ton_values(0.01)
@@ -251,6 +282,26 @@ class RailwayLink(BaseLink):
         return num_turnouts
 
 
+class RailwayLink(BaseRailwayLink):
+
+    """Represents a link in a railway network.
+
+    It keeps track of tons passing and idle capacity of tons that could be
+    supported with the same rolling material currently running."""
+
+
+class CompactRailwayLink(BaseRailwayLink):
+
+    """Slotted RailwayLink."""
+
+    __slots__ = ("id", "id_gauge", "gauge", "nodes", "dist", "_main_track",
+                 "eac_track", "maintenance", "net_to_gross_factor", "tons",
+                 "idle_capacity_regroup", "idle_capacity_no_regroup",
+                 "regrouped", "regrouped_locs", "turnout_freq",
+                 "turnout_freq_max_density", "turnout_max_density",
+                 "eac_turnout")
+
+
 if __name__ == '__main__':
 
     import doctest
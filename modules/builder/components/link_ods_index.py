@@ -0,0 +1,48 @@
+"""Keeps track of od pairs using each link of a modal network."""
+
+
+class LinkOdsIndex(object):
+
+    """Inverted index of od pairs by the links of their paths.
+
+    Od pairs attached to an index add themselves every time their path is
+    set, so od pairs using a link can be found without scanning the whole
+    network.
+
+    Links are identified by (id_link, gauge) keys."""
+
+    def __init__(self):
+        self.links_ods = {}
+        self.ods_links = {}
+
+    # PUBLIC
+    def get_ods(self, id_link, gauge):
+        """Return od pairs using a link, sorted by id and category."""
+
+        ods = self.links_ods.get((id_link, gauge), {})
+
+        return [ods[key] for key in sorted(ods)]
+
+    def add_od(self, od):
+        """Add the links of the path of an od pair to the index."""
+
+        self.remove_od(od)
+
+        key = (od.id, od.category)
+        if od.has_operable_path():
+            link_keys = [(id_link, od.gauge) for id_link in od.links]
+        else:
+            link_keys = []
+
+        self.ods_links[key] = link_keys
+        for link_key in link_keys:
+            self.links_ods.setdefault(link_key, {})[key] = od
+
+    def remove_od(self, od):
+        """Remove the links of the path of an od pair from the index."""
+
+        key = (od.id, od.category)
+        for link_key in self.ods_links.pop(key, []):
+            self.links_ods[link_key].pop(key, None)
+            if not self.links_ods[link_key]:
+                del self.links_ods[link_key]
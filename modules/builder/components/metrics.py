@@ -0,0 +1,188 @@
+"""Accumulates timers and counters of the phases of a freight network run."""
+
+import csv
+import json
+import os
+import time
+from contextlib import contextmanager
+
+# tracemalloc is only available in python 3 or with the pytracemalloc backport
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class Metrics(object):
+
+    """Records time spent in named phases and counts of named events.
+
+    Timers are used as context managers and accumulate seconds and calls of
+    every phase with the same name. Counters accumulate any number of events.
+    Both are cheap enough to be left in production runs.
+
+    If trace_memory is True, timers also record the peak memory of their
+    phase: bytes allocated over the memory at the start of the phase, traced
+    by tracemalloc if it is available, or otherwise the growth of the peak
+    resident memory of the process (zero if the phase stays under a previous
+    peak)."""
+
+    def __init__(self, trace_memory=False):
+        self.timers = {}
+        self.counters = {}
+        self.memory = {}
+        self.trace_memory = trace_memory
+
+    # PUBLIC
+    @contextmanager
+    def timer(self, name):
+        """Time a block of code, accumulating it in the named timer."""
+
+        if self.trace_memory:
+            start_memory = self._get_memory_start()
+
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.time() - start)
+
+            if self.trace_memory:
+                self.add_memory(name, self._get_memory_peak(start_memory))
+
+    def add_time(self, name, seconds, calls=1):
+        """Accumulate seconds spent in a phase timed elsewhere."""
+
+        timer = self.timers.setdefault(name, {"seconds": 0.0, "calls": 0})
+        timer["seconds"] += seconds
+        timer["calls"] += calls
+
+    def add_memory(self, name, peak_bytes):
+        """Keep the highest peak of memory of a phase."""
+        self.memory[name] = max(self.memory.get(name, 0), peak_bytes)
+
+    def count(self, name, number=1):
+        """Accumulate a number of events in the named counter."""
+        self.counters[name] = self.counters.get(name, 0) + number
+
+    def reset(self):
+        self.timers = {}
+        self.counters = {}
+        self.memory = {}
+
+    @classmethod
+    def start_memory_tracing(cls):
+        """Start tracemalloc, if available and not already tracing.
+
+        Returns:
+            True if tracing was started by this call.
+        """
+
+        if tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            return True
+
+        return False
+
+    @classmethod
+    def stop_memory_tracing(cls):
+        if tracemalloc and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def update(self, other, prefix=""):
+        """Accumulate timers and counters of another Metrics object.
+
+        Args:
+            other: Metrics object to be added.
+            prefix: Prefix added to the names of its timers and counters.
+        """
+
+        for name, timer in other.timers.iteritems():
+            self.add_time(prefix + name, timer["seconds"], timer["calls"])
+
+        for name, number in other.counters.iteritems():
+            self.count(prefix + name, number)
+
+        for name, peak_bytes in other.memory.iteritems():
+            self.add_memory(prefix + name, peak_bytes)
+
+    def as_dict(self):
+        metrics = {"timers": {name: dict(timer)
+                              for name, timer in self.timers.iteritems()},
+                   "counters": dict(self.counters)}
+
+        if self.memory:
+            metrics["memory"] = dict(self.memory)
+
+        return metrics
+
+    def get_rows(self):
+        """Return a row by metric, with the columns written to csv."""
+
+        rows = []
+        for name, timer in sorted(self.timers.iteritems()):
+            rows.append(["timer", name, timer["calls"], timer["seconds"],
+                         None, None])
+        for name, number in sorted(self.counters.iteritems()):
+            rows.append(["counter", name, None, None, number, None])
+        for name, peak_bytes in sorted(self.memory.iteritems()):
+            rows.append(["memory", name, None, None, None, peak_bytes])
+
+        return rows
+
+    def write(self, path):
+        """Write metrics to a JSON or CSV file."""
+
+        extension = os.path.splitext(path)[1].lower()
+
+        if extension == ".json":
+            with open(path, "w") as f:
+                json.dump(self.as_dict(), f, indent=2, sort_keys=True)
+
+        elif extension == ".csv":
+            with open(path, "wb") as f:
+                writer = csv.writer(f)
+                writer.writerow(["kind", "name", "calls", "seconds", "count",
+                                 "bytes"])
+                writer.writerows(self.get_rows())
+
+        else:
+            raise ValueError("Metrics file must be .json or .csv: " + path)
+
+    # PRIVATE
+    def _get_memory_start(self):
+
+        if tracemalloc and tracemalloc.is_tracing():
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+            return tracemalloc.get_traced_memory()[0]
+
+        return self._get_max_rss()
+
+    def _get_memory_peak(self, start_memory):
+
+        if tracemalloc and tracemalloc.is_tracing():
+            return max(0, tracemalloc.get_traced_memory()[1] - start_memory)
+
+        return max(0, self._get_max_rss() - start_memory)
+
+    def _get_max_rss(self):
+        """Peak resident memory of the process, in bytes (linux)."""
+
+        # getrusage keeps the peak of the parent process across exec, the
+        # high water mark in /proc is only that of the process
+        if os.path.isfile("/proc/self/status"):
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) * 1024
+
+        if not resource:
+            return 0
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
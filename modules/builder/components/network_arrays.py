@@ -0,0 +1,111 @@
+"""Structure of arrays view of the links and od pairs of a modal network."""
+
+import numpy as np
+
+
+class NetworkArrays(object):
+
+    """Numeric columns of links and od pairs of a modal network as arrays.
+
+    Links are kept in the order of the columns of the paths incidence of the
+    network, and od pairs in the order of its rows, so the links of the path
+    of the od pair in row i are path_indices[path_indptr[i]:path_indptr[i+1]]
+    and vectorized calculations can go from od pairs to links and back.
+
+    Arrays are filled from the link and od pair objects, that are still the
+    ones the network changes. Only the links and od pairs given to
+    update_links and update_od_pairs are taken again, so they can be kept in
+    sync with the objects at the cost of what changed.
+
+    Link arrays: link_dist, link_tons, link_original_tons, link_derived_tons,
+        link_gross_ton_km.
+    Od pair arrays: od_dist, od_tons, od_original_tons, od_derived_tons.
+    """
+
+    LINK_ARRAYS = ["link_dist", "link_tons", "link_original_tons",
+                   "link_derived_tons", "link_gross_ton_km"]
+    OD_ARRAYS = ["od_dist", "od_tons", "od_original_tons", "od_derived_tons"]
+
+    def __init__(self, links, ods, indptr, indices):
+        """
+        Args:
+            links: List of links, indexed by column.
+            ods: List of od pairs, indexed by row.
+            indptr: Array with start of the links of each row in indices.
+            indices: Array with columns of links used by od pairs.
+        """
+
+        self.links = links
+        self.ods = ods
+        self.link_keys = [(link.id, link.gauge) for link in links]
+        self.od_keys = [(od.id, od.category) for od in ods]
+        self.link_columns = {key: i for i, key in enumerate(self.link_keys)}
+        self.od_rows = {key: i for i, key in enumerate(self.od_keys)}
+        self.path_indptr = indptr
+        self.path_indices = indices
+
+        for name in self.LINK_ARRAYS:
+            setattr(self, name, np.zeros(len(links), dtype=float))
+        for name in self.OD_ARRAYS:
+            setattr(self, name, np.zeros(len(ods), dtype=float))
+
+        self.update_links()
+        self.update_od_pairs()
+
+    # PUBLIC
+    def update_links(self, keys=None):
+        """Take again the values of some links (all of them by default).
+
+        Args:
+            keys: Iterable of (id_link, gauge) keys. Links not in the arrays
+                are ignored.
+        """
+
+        if keys is None:
+            columns = xrange(len(self.links))
+        else:
+            columns = [self.link_columns[key] for key in keys
+                       if key in self.link_columns]
+
+        for column in columns:
+            link = self.links[column]
+            self.link_dist[column] = link.dist
+            self.link_tons[column] = link.tons.get()
+            self.link_original_tons[column] = link.tons.get_original()
+            self.link_derived_tons[column] = link.tons.get_derived()
+            self.link_gross_ton_km[column] = link.gross_ton_km
+
+    def update_od_pairs(self, keys=None):
+        """Take again the values of some od pairs (all of them by default).
+
+        Args:
+            keys: Iterable of (id_od, category) keys. Od pairs not in the
+                arrays are ignored.
+        """
+
+        if keys is None:
+            rows = xrange(len(self.ods))
+        else:
+            rows = [self.od_rows[key] for key in keys if key in self.od_rows]
+
+        for row in rows:
+            od = self.ods[row]
+            self.od_dist[row] = od.dist or 0.0
+            self.od_tons[row] = od.tons.get()
+            self.od_original_tons[row] = od.tons.get_original()
+            self.od_derived_tons[row] = od.tons.get_derived()
+
+    def get_path_links(self, row):
+        """Return the columns of the links in the path of an od pair."""
+        return self.path_indices[self.path_indptr[row]:
+                                 self.path_indptr[row + 1]]
+
+    def as_dict(self):
+        """Return arrays by name, with the paths incidence."""
+
+        arrays = {name: getattr(self, name)
+                  for name in self.LINK_ARRAYS + self.OD_ARRAYS}
+        arrays["path_indptr"] = self.path_indptr
+        arrays["path_indices"] = self.path_indices
+
+        return arrays
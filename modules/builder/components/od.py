@@ -1,5 +1,5 @@
-from tons import OdTons
-from path import BasePath
+from tons import OdTons, CompactOdTons
+from path import BasePath, CompactBasePath
 
 """OD classes are used either by Railway or Roadway networks."""
 
@@ -12,41 +12,31 @@ class OdCost():
         self.immo_value = None
 
 
-class OD(BasePath):
+class CompactOdCost(object):
 
-    """Represents an od pair in a railway or roadway network.
+    """Slotted OdCost."""
 
-    It carries tons of freight and has path, gauge and distance. Roadway od
-    pairs are considered to have unique gauge."""
+    __slots__ = ("deposit", "short_freight", "immo_value")
 
-    NF = "{:,.1f}"
-    FIELDS = ["id_od", "gauge", "distance", "original ton", "derived ton",
-              "ton", "railway_category", "path", "id_lowest_link",
-              "ton_lowest_link", "deposit_cost", "short_freight_cost",
-              "immo_value_cost"]
+    def __init__(self):
+        self.deposit = None
+        self.short_freight = None
+        self.immo_value = None
 
-    def __init__(self, id, ton, path=None, gauge=None, dist=None,
-                 category=None):
 
-        # call constructors of superclasses
-        super(OD, self).__init__()
+class BaseOD(BasePath):
 
-        # identification properties
-        self.id = self._get_safe_id(id)
-        self.nodes = [int(i) for i in self.id.split("-")]
+    """Base class for od pairs, with their methods but not their data.
 
-        # path properties
-        self.path = path
-        self.path_nodes = self._get_path_nodes(self.path)
-        self.gauge = gauge
-        self.dist = dist
-        self.links = self._create_links_list(self.path_nodes)
+    It is subclassed by OD and CompactOD, which store the data members."""
 
-        # traffic properties
-        self.lowest_link = None
+    __slots__ = ()
 
-        self.tons = OdTons(ton, category)
-        self.cost = OdCost()
+    NF = "{:,.1f}"
+    FIELDS = ["id_od", "gauge", "distance", "original ton", "derived ton",
+              "ton", "railway_category", "path", "id_lowest_link",
+              "ton_lowest_link", "deposit_cost", "short_freight_cost",
+              "immo_value_cost"]
 
     def __repr__(self):
         return "OD: " + self.id.ljust(10) + \
@@ -99,19 +89,33 @@ class OD(BasePath):
 
     # cost getters
     def calc_distance(self, network_links):
-        self.dist = super(OD, self).calc_distance(network_links)
+        self.dist = super(BaseOD, self).calc_distance(network_links)
 
     # setters
     def set_path(self, path, gauge):
         """Take a path and gauge and set it to the od pair."""
 
         # set data members
-        self.path = path
         self.gauge = gauge
+        self._store_path(path)
 
-        # get path nodes from new path and create links dictionary
-        self.path_nodes = self._get_path_nodes(self.path)
-        self.links = self._create_links_list(self.path_nodes)
+        # a new path changes the links used by the od pair tons
+        self.tons.notify_path_change()
+        if self.link_ods_index:
+            self.link_ods_index.add_od(self)
+
+    def attach_index(self, link_ods_index):
+        """Attach a LinkOdsIndex to be kept up to date with the od path."""
+
+        self.link_ods_index = link_ods_index
+        self.link_ods_index.add_od(self)
+
+    def detach_index(self):
+        """Remove the od pair from its LinkOdsIndex (if any)."""
+
+        if self.link_ods_index:
+            self.link_ods_index.remove_od(self)
+            self.link_ods_index = None
 
     def set_lowest_scale_link(self, link):
         self.lowest_link = link
@@ -164,3 +168,84 @@ class OD(BasePath):
                                                         allow_original)
 
         return (ton_to_derive, ton_to_return)
+
+
+class OD(BaseOD):
+
+    """Represents an od pair in a railway or roadway network.
+
+    It carries tons of freight and has path, gauge and distance. Roadway od
+    pairs are considered to have unique gauge. Once an IdTable is attached,
+    the indexes of the links of its path are kept too (link_indexes)."""
+
+    def __init__(self, id, ton, path=None, gauge=None, dist=None,
+                 category=None, ids=None):
+
+        # call constructors of superclasses
+        super(OD, self).__init__()
+
+        # identification properties
+        self.id = self._get_safe_id(id)
+        self.nodes = [int(i) for i in self.id.split("-")]
+
+        # path properties
+        self.path = path
+        self.path_nodes = self._get_path_nodes(self.path)
+        self.gauge = gauge
+        self.dist = dist
+        self.links = self._create_links_list(self.path_nodes)
+        self.ids = ids
+        self.link_indexes = self._get_link_indexes(self.links)
+
+        # traffic properties
+        self.lowest_link = None
+
+        # index of od pairs by link of the network owning the od pair
+        self.link_ods_index = None
+
+        self.tons = OdTons(ton, category)
+        self.cost = OdCost()
+
+    # PRIVATE
+    def _store_path(self, path):
+        """Take a path string, getting path nodes and links from it."""
+
+        self.path = path
+        self.path_nodes = self._get_path_nodes(self.path)
+        self.links = self._create_links_list(self.path_nodes)
+        self.link_indexes = self._get_link_indexes(self.links)
+
+
+class CompactOD(CompactBasePath, BaseOD):
+
+    """Slotted od pair, storing its path once as an array of ints.
+
+    It behaves as OD, but path string, path nodes and links are derived from
+    the array every time they are asked for (see CompactBasePath), and nodes
+    from the id. Used by networks with hundreds of thousands of od pairs,
+    where the memory taken by each object matters more than the time spent
+    deriving its links."""
+
+    __slots__ = ("id", "_path", "gauge", "dist", "lowest_link",
+                 "link_ods_index", "tons", "cost", "ids")
+
+    def __init__(self, id, ton, path=None, gauge=None, dist=None,
+                 category=None, ids=None):
+
+        # identification properties
+        self.id = self._get_safe_id(id)
+
+        # path properties
+        self.ids = ids
+        self._store_path(path)
+        self.gauge = gauge
+        self.dist = dist
+
+        # traffic properties
+        self.lowest_link = None
+
+        # index of od pairs by link of the network owning the od pair
+        self.link_ods_index = None
+
+        self.tons = CompactOdTons(ton, category)
+        self.cost = CompactOdCost()
@@ -1,4 +1,9 @@
-class Parameter():
+class BaseParameter(object):
+
+    """Base class for parameters, subclassed by Parameter and
+    CompactParameter which store the data members."""
+
+    __slots__ = ()
 
     NF = "{:,.1f}"
 
@@ -16,3 +21,15 @@ class Parameter():
         return "Parameter: " + str(self.id).ljust(28) + \
                "Value: " + str(self.value).ljust(11) + \
                "Description: " + str(self.desc)
+
+
+class Parameter(BaseParameter):
+
+    """Represents a parameter used in the calculations of a modal network."""
+
+
+class CompactParameter(BaseParameter):
+
+    """Slotted Parameter."""
+
+    __slots__ = ("id", "value", "desc")
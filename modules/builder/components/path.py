@@ -1,5 +1,11 @@
+from array import array
+
+
 class BasePath(object):
 
+    # methods only, slots are declared by concrete classes
+    __slots__ = ()
+
     # PUBLIC
     # others
     def calc_distance(self, network_links):
@@ -25,7 +31,22 @@ class BasePath(object):
         """Check if origin = destination."""
         return len(self.nodes) == 2 and self.nodes[0] == self.nodes[1]
 
+    def attach_ids(self, ids):
+        """Keep the indexes of the links of the path in an IdTable."""
+
+        self.ids = ids
+        self.link_indexes = self._get_link_indexes(self.links)
+
     # PRIVATE
+    def _get_link_indexes(self, links):
+        """Return an array with the indexes of links in the IdTable, or
+        None if no IdTable is attached."""
+
+        if not self.ids:
+            return None
+
+        return array("l", [self.ids.link_index(id_link) for id_link in links])
+
     def _create_links_list(self, path_nodes):
         """Create list with all links used by OD path."""
 
@@ -116,9 +137,10 @@ class Path(BasePath):
 
     """Represents a railway or roadway path.
 
-    Roadway paths are considered to have unique gauge."""
+    Roadway paths are considered to have unique gauge. If an IdTable is
+    given, the indexes of its links are kept too (link_indexes)."""
 
-    def __init__(self, id, path, gauge):
+    def __init__(self, id, path, gauge, ids=None):
         self.id = self._get_safe_id(id)
         self.nodes = [int(i) for i in self.id.split("-")]
 
@@ -128,7 +150,100 @@ class Path(BasePath):
 
         self.gauge = gauge
 
+        self.ids = ids
+        self.link_indexes = self._get_link_indexes(self.links)
+
     def __repr__(self):
         return "OD: " + self.id.ljust(10) + \
                "Path: " + self.path.ljust(70) + \
                "Gauge: " + str(self.gauge)
+
+
+class CompactBasePath(BasePath):
+
+    """Base class for paths stored once, as an array of ints.
+
+    Path string, path nodes and links are derived from the array when asked
+    for, instead of being kept as three lists of python objects. Once an
+    IdTable of the network is attached, the array has the indexes of the
+    links of the path, otherwise it has the nodes of the path. A path that
+    can't be stored in an array (eg. a "not found" one) is kept as it is."""
+
+    __slots__ = ()
+
+    @property
+    def nodes(self):
+        return [int(i) for i in self.id.split("-")]
+
+    @property
+    def path(self):
+        path_nodes = self.path_nodes
+        if path_nodes:
+            return self._path_nodes_to_string(path_nodes)
+        return self._path
+
+    @property
+    def path_nodes(self):
+        if not isinstance(self._path, array):
+            return self._get_path_nodes(self._path)
+        elif self.ids:
+            return self.ids.links_to_path(self._path)
+        return self._path.tolist()
+
+    @property
+    def links(self):
+        if isinstance(self._path, array) and self.ids:
+            links = self.ids.links
+            return [links[i] for i in self._path]
+        return self._create_links_list(self.path_nodes)
+
+    @property
+    def link_indexes(self):
+        if isinstance(self._path, array) and self.ids:
+            return self._path
+        return self._get_link_indexes(self.links)
+
+    # PUBLIC
+    def attach_ids(self, ids):
+        """Store the path as an array of link indexes of an IdTable."""
+
+        path = self.path
+        self.ids = ids
+        self._store_path(path)
+
+    # PRIVATE
+    def _store_path(self, path):
+        """Store a path string as an array of its links or nodes."""
+
+        path_nodes = self._get_path_nodes(path)
+        path_array = None
+
+        if path_nodes and self.ids:
+            path_array = self.ids.path_to_links(path_nodes)
+        elif path_nodes:
+            path_array = array("l", path_nodes)
+
+        self._path = path if path_array is None else path_array
+
+
+class CompactPath(CompactBasePath):
+
+    """Slotted Path, storing its path once as an array of ints."""
+
+    __slots__ = ("id", "_path", "gauge", "ids")
+
+    def __init__(self, id, path, gauge, ids=None):
+        self.id = self._get_safe_id(id)
+        self.ids = ids
+        self._store_path(path)
+
+        # as Path does, a path without nodes is not kept
+        if not self.path_nodes:
+            self._path = None
+
+        self.gauge = gauge
+
+    def __repr__(self):
+        return "OD: " + self.id.ljust(10) + \
+               "Path: " + str(self.path).ljust(70) + \
+               "Gauge: " + str(self.gauge)
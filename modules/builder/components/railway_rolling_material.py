@@ -1,13 +1,12 @@
 import math
 
 
-class RollingMaterial():
+class BaseRollingMaterial(object):
 
-    """Represents the entire park of one type of rolling material (wagon
-       or locomotive).
+    """Base class for rolling material, subclassed by RollingMaterial and
+    CompactRollingMaterial which store the data members."""
 
-       Keep track of service-hours required to the park and can give the amount
-       of park needed to meet the requirement."""
+    __slots__ = ()
 
     NF = "{:,.1f}"
 
@@ -347,6 +346,30 @@ class RollingMaterial():
         return units_needed * self.capacity - ton
 
 
+class RollingMaterial(BaseRollingMaterial):
+
+    """Represents the entire park of one type of rolling material (wagon
+       or locomotive).
+
+       Keep track of service-hours required to the park and can give the amount
+       of park needed to meet the requirement."""
+
+
+class CompactRollingMaterial(BaseRollingMaterial):
+
+    """Slotted RollingMaterial."""
+
+    __slots__ = ("running", "idle_heads", "idle_turnout", "idle_regroup",
+                 "idle_capacity", "saved_idle_turnout", "saved_running",
+                 "minimum_units", "speed", "availability", "capacity",
+                 "head_stops_time", "turnout_time", "turnout_freq",
+                 "regroup_time")
+
+    # PRIVATE
+    def _get_data_members_list(self):
+        return [(attr, getattr(self, attr)) for attr in self.__slots__]
+
+
 def test():
 
     rm = RollingMaterial()
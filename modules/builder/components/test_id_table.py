@@ -0,0 +1,47 @@
+import unittest
+from array import array
+from id_table import IdTable
+
+
+class IdTableTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.ids = IdTable()
+        for id_link in ["1-3", "3-7", "7-1003", "1003-12"]:
+            self.ids.link_index(id_link)
+
+    def test_dense_indexes(self):
+
+        self.assertEqual(len(self.ids.links), 4)
+        self.assertEqual(self.ids.nodes, [1, 3, 7, 1003, 12])
+        self.assertEqual(self.ids.get_node_index(1003), 3)
+        self.assertEqual(self.ids.get_node_index("1003"), 3)
+        self.assertEqual(self.ids.get_node_index(99), None)
+
+        # the same link in other formats has the same index
+        self.assertEqual(self.ids.link_index("12-1003"), 3)
+        self.assertEqual(self.ids.link_index("003-001"), 0)
+        self.assertEqual(self.ids.links[3], "12-1003")
+
+    def test_paths(self):
+
+        links = self.ids.path_to_links([1, 3, 7, 1003, 12])
+        self.assertEqual(links.tolist(), [0, 1, 2, 3])
+        self.assertEqual(self.ids.links_to_path(links), [1, 3, 7, 1003, 12])
+
+        # paths are rebuilt with their lowest end node first
+        self.assertEqual(self.ids.links_to_path(array("l", [3, 2, 1])),
+                         [3, 7, 1003, 12])
+        self.assertEqual(self.ids.links_to_path(array("l", [0])), [1, 3])
+
+        # new links are interned
+        links = self.ids.path_to_links([3, 12])
+        self.assertEqual(links.tolist(), [4])
+        self.assertEqual(self.ids.links[4], "3-12")
+
+    def test_path_going_back(self):
+        self.assertEqual(self.ids.path_to_links([1, 3, 1]), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
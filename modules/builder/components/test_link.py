@@ -1,5 +1,5 @@
 import unittest
-from link import BaseLink, RailwayLink
+from link import BaseLink, RailwayLink, CompactRailwayLink
 
 
 class LinkTestCase(unittest.TestCase):
@@ -84,5 +84,30 @@ class RailwayLinkTestCase(unittest.TestCase):
         self.link.revert_regroup(250)
         self.assertTrue(self.link.idle_capacity_regroup, 500)
 
+
+class CompactRailwayLinkTestCase(unittest.TestCase):
+
+    """Test slotted railway link behaves as RailwayLink."""
+
+    def setUp(self):
+        self.link = CompactRailwayLink("1009-1003", 1000, "ancha")
+
+    def test_no_dict(self):
+        self.assertFalse(hasattr(self.link, "__dict__"))
+
+    def test_regroup(self):
+        self.link.idle_capacity_regroup = 500
+        self.link.regroup(250)
+        self.assertEqual(self.link.idle_capacity_regroup, 250)
+        self.assertTrue(self.link.regrouped)
+
+    def test_turnouts(self):
+        self.link.turnout_freq = 10.0
+        self.link.turnout_max_density = 1000.0
+        self.link.net_to_gross_factor = 2.0
+        self.link.tons.add_original(100.0, 1, "1-3")
+        self.assertEqual(self.link.number_of_turnouts, 100.0)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from metrics import Metrics
+
+
+class MetricsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics()
+
+    def test_timer_and_count(self):
+
+        for i in xrange(3):
+            with self.metrics.timer("phase"):
+                self.metrics.count("events", 2)
+
+        # timers are accumulated even if the block raises an exception
+        with self.assertRaises(ValueError):
+            with self.metrics.timer("failing"):
+                raise ValueError()
+
+        self.assertEqual(self.metrics.timers["phase"]["calls"], 3)
+        self.assertGreaterEqual(self.metrics.timers["phase"]["seconds"], 0.0)
+        self.assertEqual(self.metrics.timers["failing"]["calls"], 1)
+        self.assertEqual(self.metrics.counters, {"events": 6})
+
+        self.metrics.reset()
+        self.assertEqual(self.metrics.as_dict(),
+                         {"timers": {}, "counters": {}})
+
+    def test_trace_memory(self):
+
+        self.metrics.trace_memory = True
+        with self.metrics.timer("allocation"):
+            allocated = [str(i) for i in xrange(100000)]
+
+        self.assertEqual(len(allocated), 100000)
+        self.assertIn("allocation", self.metrics.memory)
+        self.assertIn("memory", self.metrics.as_dict())
+
+        # the block is allocated over the peak memory of a fresh process
+        code = ("from metrics import Metrics\n"
+                "metrics = Metrics(trace_memory=True)\n"
+                "with metrics.timer('allocation'):\n"
+                "    allocated = [str(i) for i in xrange(100000)]\n"
+                "print metrics.memory['allocation']")
+        output = subprocess.check_output(
+            [sys.executable, "-c", code],
+            cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertGreater(int(output.split()[-1]), 0)
+
+    def test_update_and_write(self):
+
+        self.metrics.add_time("phase", 1.5)
+        self.metrics.count("events")
+
+        combined = Metrics()
+        combined.update(self.metrics, "rail.")
+        combined.update(self.metrics, "rail.")
+        self.assertEqual(combined.as_dict(),
+                         {"timers": {"rail.phase": {"seconds": 3.0,
+                                                    "calls": 2}},
+                          "counters": {"rail.events": 2}})
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            combined.write(os.path.join(temp_dir, "metrics.json"))
+            with open(os.path.join(temp_dir, "metrics.json")) as f:
+                self.assertEqual(json.load(f), combined.as_dict())
+
+            combined.write(os.path.join(temp_dir, "metrics.csv"))
+            with open(os.path.join(temp_dir, "metrics.csv")) as f:
+                self.assertEqual(len(f.readlines()), 3)
+
+            self.assertRaises(ValueError, combined.write,
+                              os.path.join(temp_dir, "metrics.txt"))
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,9 @@
 import unittest
+import cPickle
 from link import BaseLink
-from od import OD
-from path import Path
+from od import OD, CompactOD
+from path import Path, CompactPath
+from id_table import IdTable
 
 
 class ODTestCase(unittest.TestCase):
@@ -26,6 +28,17 @@ class ODTestCase(unittest.TestCase):
     def test_get_safe_id(self):
         self.assertEqual(self.od._get_safe_id("50-10"), "10-50")
 
+    def test_attach_ids(self):
+        ids = IdTable()
+        self.od.attach_ids(ids)
+        self.assertEqual(self.od.link_indexes.tolist(), [0, 1])
+
+        # link indexes follow the path of the od pair
+        self.od.set_path("70-71-68", "media")
+        self.assertEqual(self.od.link_indexes.tolist(), [2, 3])
+        self.assertEqual([ids.links[i] for i in self.od.link_indexes],
+                         self.od.links)
+
 
 class OdCostTestCase(unittest.TestCase):
 
@@ -85,5 +98,77 @@ class PathTestCase(unittest.TestCase):
         self.assertEqual(distance, 300)
 
 
+
+class CompactODTestCase(unittest.TestCase):
+
+    """Test slotted od pair behaves as OD."""
+
+    def setUp(self):
+        self.od = CompactOD("70-68", 333906, "068-069-070", "ancha")
+
+    def test_no_dict(self):
+        self.assertFalse(hasattr(self.od, "__dict__"))
+        self.assertFalse(hasattr(self.od.tons, "__dict__"))
+        self.assertFalse(hasattr(self.od.cost, "__dict__"))
+
+    def test_path_representations(self):
+        self.assertEqual(self.od.nodes, [68, 70])
+        self.assertEqual(self.od.path, "68-69-70")
+        self.assertEqual(self.od.path_nodes, [68, 69, 70])
+        self.assertEqual(self.od.links, ['68-69', '69-70'])
+
+    def test_set_path(self):
+        self.od.set_path("70-71-68", "media")
+        self.assertEqual(self.od.path_nodes, [68, 71, 70])
+        self.assertEqual(self.od.links, ['68-71', '70-71'])
+        self.assertEqual(self.od.gauge, "media")
+        self.assertTrue(self.od.has_operable_path())
+
+    def test_pathless(self):
+        od = CompactOD("5-5", 10, "5-5", "ancha")
+        self.assertTrue(od.is_intrazone())
+        self.assertEqual(od.path, "5-5")
+        self.assertEqual(od.path_nodes, None)
+        self.assertEqual(od.links, [])
+
+    def test_pickle(self):
+        od = cPickle.loads(cPickle.dumps(self.od, 2))
+        self.assertEqual(od.links, self.od.links)
+        self.assertEqual(od.tons.get(), 333906)
+
+    def test_attach_ids(self):
+        ids = IdTable()
+        self.od.attach_ids(ids)
+
+        self.assertEqual(self.od._path.tolist(), [0, 1])
+        self.assertEqual(self.od.path_nodes, [68, 69, 70])
+        self.assertEqual(self.od.links, ['68-69', '69-70'])
+
+        self.od.set_path("70-71-68", "media")
+        self.assertEqual(self.od._path.tolist(), [2, 3])
+        self.assertEqual(self.od.path, "68-71-70")
+        self.assertEqual(self.od.links, ['68-71', '70-71'])
+        self.assertEqual(self.od.link_indexes.tolist(), [2, 3])
+
+    def test_same_attributes_as_od(self):
+        od = OD("70-68", 333906, "68-69-70", "ancha")
+        self.assertEqual(self.od.get_attributes(), od.get_attributes())
+
+
+class CompactPathTestCase(unittest.TestCase):
+
+    """Test slotted path behaves as Path."""
+
+    def test_same_as_path(self):
+        path = Path("70-68", "070-069-068", "unica")
+        compact_path = CompactPath("70-68", "070-069-068", "unica")
+
+        for attr in ["id", "nodes", "path", "path_nodes", "links", "gauge"]:
+            self.assertEqual(getattr(compact_path, attr), getattr(path, attr))
+
+    def test_intrazone(self):
+        self.assertEqual(CompactPath("5-5", "5-5", "unica").path, None)
+
+
 if __name__ == '__main__':
     unittest.main()
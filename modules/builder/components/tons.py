@@ -1,11 +1,17 @@
 """Management for adding, removing and getting tons in Links and ODs."""
 from pprint import pprint
+import numpy as np
 
 
 class BaseTons(object):
 
+    # methods only, slots are declared by concrete classes
+    __slots__ = ()
+
     def __init__(self):
         self.tons = {"original": {}, "derived": {}}
+        self.tracker = None
+        self.key = None
 
     def __getitem__(self, key):
         self.tons[key]
@@ -13,23 +19,35 @@ class BaseTons(object):
     def __repr__(self):
         pprint(self.tons)
 
+    def attach_tracker(self, tracker, key):
+        """Attach a ChangeTracker to be notified of every change in tons.
 
-class OdTons(BaseTons):
+        Args:
+            tracker: ChangeTracker of the modal network owning the tons.
+            key: Key identifying the owner of the tons in the tracker.
+        """
+        self.tracker = tracker
+        self.key = key
 
-    """Keeps information about tons in an OD pair.
+    def notify_change(self):
+        """Notify the attached tracker (if any) that tons have changed."""
+        if self.tracker:
+            self._touch_tracker()
 
-    OdTons object knows the original transport mode of the tons in an OD pair.
-    It can add and remove tons keeping track of its original transport mode.
 
-    Data is stored in a dictionary that has the follwing structure:
+class BaseOdTons(BaseTons):
+
+    """Base class for tons of od pairs, subclassed by OdTons and
+    CompactOdTons which store the data members."""
+
+    __slots__ = ()
 
-    self.tons = {"original": 150000,
-                 "derived":  20000}
-    """
     def __init__(self, original_ton=0.0, category=None):
         self.tons = {"original": original_ton, "derived": 0.0}
         self.projection_factor = 1.0
         self.category = category
+        self.tracker = None
+        self.key = None
 
     # PUBLIC
     # getters
@@ -106,6 +124,56 @@ class OdTons(BaseTons):
 
         return (ton_to_derive, ton_to_return)
 
+    @classmethod
+    def derive_many(cls, tons, others, coeffs, allow_original=True):
+        """Derive tons of many od pairs to other transport mode at once.
+
+        Each OdTons object of tons derives to the one of others in the same
+        position, exactly as derive would do, but tons are calculated as
+        arrays.
+
+        Args:
+            tons: List of OdTons objects that will derive tons.
+            others: List of OdTons objects that will receive derived tons.
+            coeffs: Array with the coefficient of tons derived by each one.
+
+        Returns: (tons_to_derive, tons_to_return)
+            tons_to_derive: Array with original tons that were derived.
+            tons_to_return: Array with previously derived tons that are being
+                returned.
+        """
+
+        self_original = np.array([t.get_original() for t in tons],
+                                 dtype=float)
+        self_derived = np.array([t.get_derived() for t in tons], dtype=float)
+        other_derived = np.array([o.get_derived() for o in others],
+                                 dtype=float)
+
+        # calculate tons should be derived, as derive does
+        tons_should_be_derived = (self_original + other_derived) * coeffs
+        tons_to_derive = tons_should_be_derived - other_derived
+        tons_to_return = self_derived
+
+        # check if allowed to derive original tons
+        if not allow_original:
+            tons_to_derive = np.zeros(len(tons))
+
+        msg = "Can't remove more original tons than existent ones."
+        assert (tons_to_derive <= self_original).all(), msg
+
+        for t, o, ton_to_derive, ton_to_return in zip(
+                tons, others, tons_to_derive.tolist(),
+                tons_to_return.tolist()):
+            t.tons["original"] -= ton_to_derive
+            t.tons["derived"] -= ton_to_return
+            t.notify_change()
+
+            o.tons["derived"] += ton_to_derive
+            o.tons["original"] += ton_to_return
+            o.notify_change()
+
+        return tons_to_derive, tons_to_return
+
     # tons projection methods
     def project(self, projection_factor):
         """Multiply all tons of the od pair by projecton factor."""
@@ -113,6 +181,7 @@ class OdTons(BaseTons):
         self.projection_factor = projection_factor
         self.tons["original"] = self.get_original() * projection_factor
         self.tons["derived"] = self.get_derived() * projection_factor
+        self.notify_change()
 
     def revert_project(self):
         """Revert previous projection of all tons."""
@@ -120,8 +189,18 @@ class OdTons(BaseTons):
         self.tons["original"] = self.get_original() / self.projection_factor
         self.tons["derived"] = self.get_derived() / self.projection_factor
         self.projection_factor = 1.0
+        self.notify_change()
+
+    def notify_path_change(self):
+        """Notify the attached tracker (if any) that the path of the od pair
+        carrying the tons has changed."""
+        if self.tracker:
+            self.tracker.touch_path(self.key)
 
     # PRIVATE
+    def _touch_tracker(self):
+        self.tracker.touch_od(self.key)
+
     # add methods
     def _add_ton(self, ton, mode):
         """Add tons to od pair.
@@ -136,6 +215,8 @@ class OdTons(BaseTons):
         else:
             self.tons[mode] += ton
 
+        self.notify_change()
+
     def _add_derived_ton(self, ton):
         """Add derived tons to OD pair."""
         self._add_ton(ton, "derived")
@@ -154,6 +235,8 @@ class OdTons(BaseTons):
 
         self.tons[mode] -= ton
 
+        self.notify_change()
+
     def _remove_derived_ton(self, ton):
         """Remove derived tons from OD pair."""
         self._remove_ton(ton, "derived")
@@ -163,6 +246,27 @@ class OdTons(BaseTons):
         self._remove_ton(ton, "original")
 
 
+class OdTons(BaseOdTons):
+
+    """Keeps information about tons in an OD pair.
+
+    OdTons object knows the original transport mode of the tons in an OD pair.
+    It can add and remove tons keeping track of its original transport mode.
+
+    Data is stored in a dictionary that has the follwing structure:
+
+    self.tons = {"original": 150000,
+                 "derived":  20000}
+    """
+
+
+class CompactOdTons(BaseOdTons):
+
+    """Slotted OdTons."""
+
+    __slots__ = ("tons", "projection_factor", "category", "tracker", "key")
+
+
 class LinkTons(BaseTons):
 
     """Keeps information about tons in a Link.
@@ -184,8 +288,15 @@ class LinkTons(BaseTons):
                               "5": {"5-7": 20}
                               }
                  }
+
+    Tons of the link not filtered by od pair are kept until tons change, as
+    costing asks for them many times (see notify_change).
     """
 
+    def __init__(self):
+        super(LinkTons, self).__init__()
+        self._totals = {}
+
     # PUBLIC
     # getters
     def get(self, categories=None, id_ods=None, modes=None):
@@ -199,38 +310,15 @@ class LinkTons(BaseTons):
         if modes and (not type(modes) == list):
             modes = [modes]
 
-        # initialize result in zero
-        filtered_tons = 0.0
-
-        # iter modes
-        for iter_modes in self.tons.items():
-
-            mode_id = iter_modes[0]
-            mode_value = iter_modes[1]
-
-            # iter categories of the mode, if corresponds
-            if (not modes) or (mode_id in modes):
-
-                # iter categories
-                for iter_categories in mode_value.items():
-
-                    categ_id = iter_categories[0]
-                    categ_value = iter_categories[1]
-
-                    # iter values of the category, if corresponds
-                    if (not categories) or (categ_id in categories):
-
-                        # iter values (which keys are id_ods)
-                        for iter_values in categ_value.items():
-
-                            value_id_od = iter_values[0]
-                            value_tons = iter_values[1]
+        if id_ods:
+            return self._sum_tons(categories, id_ods, modes)
 
-                            # add value, if id_od corresponds
-                            if (not id_ods) or (value_id_od in id_ods):
-                                filtered_tons += value_tons
+        key = (tuple(categories) if categories else None,
+               tuple(modes) if modes else None)
+        if key not in self._totals:
+            self._totals[key] = self._sum_tons(categories, None, modes)
 
-        return filtered_tons
+        return self._totals[key]
 
     def get_original(self, categories=None, id_ods=None):
         """Returns tons of the original transport mode."""
@@ -283,6 +371,35 @@ class LinkTons(BaseTons):
             self._remove_all_ton(categories, id_ods, "derived")
             self._remove_ton(removing_orig_ton, categories, id_ods, "original")
 
+    def update_many(self, removed=(), added=()):
+        """Remove and add tons of many od pairs at once.
+
+        Tons end up as calling remove_original, remove_derived, add_original
+        and add_derived for each of them, but the tracker is notified once.
+
+        Args:
+            removed: List of (mode, category, id_od, ton) tuples of tons to
+                be removed.
+            added: List of (mode, category, id_od, ton) tuples of tons to be
+                added.
+        """
+
+        for mode, category, id_od, ton in removed:
+            self._remove_ton_value(ton, category, id_od, mode)
+
+        for mode, category, id_od, ton in added:
+            self._add_ton_value(ton, category, id_od, mode)
+
+        self.notify_change()
+
+    def notify_change(self):
+        """Forget tons kept and notify the tracker that tons have changed.
+
+        Every change of tons must call it, even with no tracker attached."""
+
+        self._totals = {}
+        super(LinkTons, self).notify_change()
+
     # other methods
     def clean_insignificant_ton_values(self, significance):
         """Checks stored values are significant."""
@@ -292,6 +409,35 @@ class LinkTons(BaseTons):
                 value = 0.0
 
     # PRIVATE
+    def _touch_tracker(self):
+        self.tracker.touch_link(self.key)
+
+    def _sum_tons(self, categories, id_ods, modes):
+        """Sum tons of the link in the lists of categories, id_ods and modes
+        passed (or in all of them, if None)."""
+
+        # initialize result in zero
+        filtered_tons = 0.0
+
+        # iter categories of the modes, if corresponds
+        for mode_id, mode_value in self.tons.iteritems():
+            if (not modes) or (mode_id in modes):
+
+                # iter values of the categories, if corresponds
+                for categ_id, categ_value in mode_value.iteritems():
+                    if (not categories) or (categ_id in categories):
+
+                        # add values (which keys are id_ods), if corresponds
+                        if not id_ods:
+                            filtered_tons += sum(categ_value.itervalues())
+                        else:
+                            filtered_tons += sum(
+                                value_tons for value_id_od, value_tons
+                                in categ_value.iteritems()
+                                if value_id_od in id_ods)
+
+        return filtered_tons
+
     def _iter_values(self):
         """Iterate all values."""
 
@@ -316,14 +462,26 @@ class LinkTons(BaseTons):
     def _add_ton(self, ton, category, id_od, mode):
         """Add ton to a mode-category-id_od value."""
 
+        self._add_ton_value(ton, category, id_od, mode)
+        self.notify_change()
+
+    def _remove_ton(self, ton, category, id_od, mode):
+        """Remove ton of a mode-category-id_od value."""
+
+        self._remove_ton_value(ton, category, id_od, mode)
+        self.notify_change()
+
+    def _add_ton_value(self, ton, category, id_od, mode):
+        """Add ton to a mode-category-id_od value, not notifying it."""
+
         # ensure necessary dictionaries exist
         self._safe_dict_keys(category, id_od, mode)
 
         # add tons
         self.tons[mode][category][id_od] += ton
 
-    def _remove_ton(self, ton, category, id_od, mode):
-        """Remove ton of a mode-category-id_od value."""
+    def _remove_ton_value(self, ton, category, id_od, mode):
+        """Remove ton of a mode-category-id_od value, not notifying it."""
 
         # ensure necessary dictionaries exist
         self._safe_dict_keys(category, id_od, mode)
@@ -345,7 +503,7 @@ class LinkTons(BaseTons):
 
         # when tons to remove are almost all (rounding), remove them all
         else:
-            self._remove_all_ton(category, id_od, mode)
+            del(self.tons[mode][category][id_od])
 
     def _remove_all_ton(self, category, id_od, mode):
         """Remove all tons of a mode-category-id_od value."""
@@ -355,3 +513,5 @@ class LinkTons(BaseTons):
 
         # delete item
         del(self.tons[mode][category][id_od])
+
+        self.notify_change()
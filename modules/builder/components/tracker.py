@@ -0,0 +1,116 @@
+"""Keeps track of changes in tons of links and od pairs of a modal network."""
+
+
+class ChangeTracker(object):
+
+    """Records links and od pairs whose tons have changed.
+
+    Tons objects attached to a tracker notify it every time they are
+    modified, so a modal network can limit its work to the links and od pairs
+    that changed since the last time it was costed.
+
+    Links are identified by (id_link, gauge) keys and od pairs by
+    (id_od, category) keys. Every change also increases the version of the
+    tracker, so anything calculated from the network can be reused while the
+    version doesn't change. Changes in paths or in the links and od pairs of
+    the network also increase the structure version, and links being removed
+    or put back increase the links version too."""
+
+    def __init__(self):
+        self.version = 0
+        self.structure_version = 0
+        self.links_version = 0
+        self.links = set()
+        self.od_pairs = set()
+        self.watched_links = {}
+        self.watched_od_pairs = {}
+
+    # PUBLIC
+    def touch_link(self, key):
+        """Register a change in a link."""
+        self.version += 1
+        self.links.add(key)
+        for links in self.watched_links.itervalues():
+            links.add(key)
+
+    def touch_od(self, key):
+        """Register a change in an od pair."""
+        self.version += 1
+        self.od_pairs.add(key)
+        for od_pairs in self.watched_od_pairs.itervalues():
+            od_pairs.add(key)
+
+    def touch_path(self, key):
+        """Register a change in the path of an od pair."""
+        self.structure_version += 1
+        self.touch_od(key)
+
+    def bump(self):
+        """Register a change in the network not attached to a single link or
+        od pair."""
+        self.version += 1
+
+    def bump_structure(self):
+        """Register a change in the structure of the network (eg. a link or
+        an od pair being removed)."""
+        self.version += 1
+        self.structure_version += 1
+
+    def bump_links(self):
+        """Register a change in the links of the network (eg. a link being
+        removed)."""
+        self.links_version += 1
+        self.bump_structure()
+
+    def watch_links(self, name):
+        """Start recording changed links for a consumer other than costing.
+
+        Args:
+            name: Name of the consumer, to pop its changes later.
+        """
+        self.watched_links[name] = set()
+
+    def pop_watched_links(self, name):
+        """Return links changed since the last pop of a consumer."""
+
+        links = self.watched_links[name]
+        self.watched_links[name] = set()
+
+        return links
+
+    def watch_od_pairs(self, name):
+        """Start recording changed od pairs for a consumer other than
+        costing.
+
+        Args:
+            name: Name of the consumer, to pop its changes later.
+        """
+        self.watched_od_pairs[name] = set()
+
+    def pop_watched_od_pairs(self, name):
+        """Return od pairs changed since the last pop of a consumer."""
+
+        od_pairs = self.watched_od_pairs[name]
+        self.watched_od_pairs[name] = set()
+
+        return od_pairs
+
+    def has_changes(self):
+        return bool(self.links or self.od_pairs)
+
+    def pop_changes(self):
+        """Return changed links and od pairs and start tracking again.
+
+        Returns: (links, od_pairs)
+            links: Set of (id_link, gauge) keys of changed links.
+            od_pairs: Set of (id_od, category) keys of changed od pairs.
+        """
+
+        links, od_pairs = self.links, self.od_pairs
+        self.clear()
+
+        return links, od_pairs
+
+    def clear(self):
+        self.links = set()
+        self.od_pairs = set()
@@ -1,6 +1,7 @@
 from xl_input import XlLoadParam, XlLoadOD, XlLoadRailwayLink, XlLoadPath
 from xl_input import XlLoadRoadwayLink
 from components import RollingMaterial, OD
+from components import CompactRollingMaterial, CompactOD
 
 
 class BaseModalNetworkBuilder(object):
@@ -11,7 +12,8 @@ class BaseModalNetworkBuilder(object):
 
     def __init__(self, xl_parameters=None, xl_od_pairs=None, xl_links=None,
                  xl_paths=None, xl_od_pairs_current=None,
-                 xl_restricted_links=None):
+                 xl_restricted_links=None, trace_memory=False,
+                 compact=False):
         """
         Args:
             xl_parameters: The path to excel file containing a list of general
@@ -25,6 +27,11 @@ class BaseModalNetworkBuilder(object):
             xl_od_pairs_current: The path to excel file containing a list of
                 od_pairs and tons of freight carried in them currently by
                 railway.
+            trace_memory: If True, the peak memory of each build phase is
+                recorded in the metrics of the network (see Metrics).
+            compact: If True, od pairs, links, paths, parameters and rolling
+                material are created with their slotted variants (eg.
+                CompactOD), taking much less memory by object.
         """
 
         # loading parameters or defaults
@@ -34,6 +41,8 @@ class BaseModalNetworkBuilder(object):
                                     self.XL_RESTRICTED_LINKS)
         self.xl_links = xl_links or self.XL_LINKS
         self.xl_paths = xl_paths or self.XL_PATHS
+        self.trace_memory = trace_memory
+        self.compact = compact
 
     # PUBLIC
     def build(self, mn):
@@ -45,33 +54,34 @@ class BaseModalNetworkBuilder(object):
             mn: a modal network object to be built.
         """
 
-        # load parameters, od_pairs and links to the RailwayNetwork object
-        print "Loading parameters..."
-        self._load_from_xl(XlLoadParam, self.xl_parameters, mn.params)
-        print "Loading od pairs..."
-        self._load_od_pairs_from_xl(mn.od_pairs, mn.projection_factor)
-        print "Loading restricted links..."
-        self._load_links_from_xl(self.xl_restricted_links, mn.restricted_links)
-        print "Loading links..."
-        self._load_links_from_xl(self.xl_links, mn.links)
-        print "Loading paths..."
-        self._load_from_xl(XlLoadPath, self.xl_paths, mn.paths)
-
-        if mn.restrictions:
-            self._remove_restricted_links(mn)
+        # paths found later by the network are created as its elements
+        mn.compact = self.compact
 
-        self._find_paths(mn)
+        if self.trace_memory:
+            started_tracing = mn.metrics.start_memory_tracing()
+            mn.metrics.trace_memory = True
 
-        self._calculate_od_distances(mn)
+        try:
+            self._build_phases(mn)
 
-        self._calculate_link_tons(mn)
+        finally:
+            if self.trace_memory:
+                mn.metrics.trace_memory = False
+                if started_tracing:
+                    mn.metrics.stop_memory_tracing()
 
-        mn.find_lowest_scale_links()
+    def get_input_files(self):
+        """Return the excel files the network is built from."""
+        return [self.xl_parameters, self.xl_od_pairs, self.xl_restricted_links,
+                self.xl_links, self.xl_paths]
 
     def create_od_pair(self, mn, id_od, category_od):
 
         # create od pair object
-        od = OD(id_od, 0.0)
+        if self.compact:
+            od = CompactOD(id_od, 0.0, ids=mn.ids)
+        else:
+            od = OD(id_od, 0.0, ids=mn.ids)
         od.tons.category = category_od
 
         # assign path
@@ -89,8 +99,88 @@ class BaseModalNetworkBuilder(object):
 
         # add new od pair
         mn.od_pairs[id_od][category_od] = od
+        od.tons.attach_tracker(mn.tracker, (od.id, category_od))
+        od.attach_index(mn.link_ods)
 
     # PRIVATE
+    def _build_phases(self, mn):
+        """Build a modal network timing each phase (see Metrics)."""
+
+        # load parameters, od_pairs and links to the RailwayNetwork object
+        print "Loading parameters..."
+        with mn.metrics.timer("load_xl.parameters"):
+            self._load_from_xl(XlLoadParam, self.xl_parameters, mn.params)
+        print "Loading od pairs..."
+        with mn.metrics.timer("load_xl.od_pairs"):
+            self._load_od_pairs_from_xl(mn.od_pairs, mn.projection_factor)
+        print "Loading restricted links..."
+        with mn.metrics.timer("load_xl.restricted_links"):
+            self._load_links_from_xl(self.xl_restricted_links,
+                                     mn.restricted_links)
+        print "Loading links..."
+        with mn.metrics.timer("load_xl.links"):
+            self._load_links_from_xl(self.xl_links, mn.links)
+        print "Loading paths..."
+        with mn.metrics.timer("load_xl.paths"):
+            self._load_from_xl(XlLoadPath, self.xl_paths, mn.paths)
+
+        with mn.metrics.timer("build.intern_ids"):
+            self._intern_ids(mn)
+
+        if mn.restrictions:
+            with mn.metrics.timer("build.remove_restricted_links"):
+                self._remove_restricted_links(mn)
+
+        with mn.metrics.timer("build.find_paths"):
+            self._find_paths(mn)
+
+        with mn.metrics.timer("build.od_distances"):
+            self._calculate_od_distances(mn)
+
+        with mn.metrics.timer("build.assign_tons"):
+            self._calculate_link_tons(mn)
+
+        with mn.metrics.timer("build.lowest_scale_links"):
+            mn.find_lowest_scale_links()
+
+        with mn.metrics.timer("build.index_ods"):
+            self._attach_trackers(mn)
+            self._index_ods_by_link(mn)
+
+    def _intern_ids(self, mn):
+        """Intern ids of links and nodes of the network as ints.
+
+        From then on, od pairs and paths keep the indexes of their links and
+        compact ones store their links only by index (see IdTable)."""
+
+        for links in [mn.links, mn.restricted_links]:
+            for id_link in sorted(links):
+                mn.ids.link_index(id_link)
+
+        for path in mn.paths.itervalues():
+            path.attach_ids(mn.ids)
+
+        for od in mn.iter_od_pairs():
+            od.attach_ids(mn.ids)
+
+    def _attach_trackers(self, mn):
+        """Make links and od pairs report changes in tons to the network."""
+
+        for link in mn.iter_links():
+            link.tons.attach_tracker(mn.tracker, (link.id, link.gauge))
+
+        for od in mn.iter_od_pairs():
+            od.tons.attach_tracker(mn.tracker, (od.id, od.category))
+
+        # tons changed while building the network were not tracked
+        mn.tracker.bump_structure()
+
+    def _index_ods_by_link(self, mn):
+        """Make od pairs keep the network index of od pairs by link."""
+
+        for od in mn.iter_od_pairs():
+            od.attach_index(mn.link_ods)
+
     def _remove_restricted_links(self, mn):
 
         for link in mn.iter_links(restricted=True):
@@ -107,7 +197,7 @@ class BaseModalNetworkBuilder(object):
         msg = "Too many ({}) repeated elements in {}".format(max_repeated,
                                                              xl_name)
 
-        for element in loader_class(xl_name):
+        for element in loader_class(xl_name, self.compact):
 
             assert repeated_counter < max_repeated, msg
 
@@ -123,7 +213,7 @@ class BaseModalNetworkBuilder(object):
         """Iterate an excel with data using a specific loader_class and storing
         results to output_dict."""
 
-        for od in XlLoadOD(self.xl_od_pairs):
+        for od in XlLoadOD(self.xl_od_pairs, self.compact):
 
             od.project(projection_factor)
 
@@ -234,7 +324,7 @@ class RoadwayNetworkBuilder(BaseModalNetworkBuilder):
         """Iterate an excel with data using a specific loader_class and storing
         results to output_dict."""
 
-        for link in XlLoadRoadwayLink(xl_links):
+        for link in XlLoadRoadwayLink(xl_links, self.compact):
 
             # add link.id entry if not already in output dict
             if link.id not in links:
@@ -274,7 +364,7 @@ class RailwayNetworkBuilder(BaseModalNetworkBuilder):
         """Iterate an excel with data using a specific loader_class and storing
         results to output_dict."""
 
-        for link in XlLoadRailwayLink(xl_links):
+        for link in XlLoadRailwayLink(xl_links, self.compact):
 
             # add link.id entry if not already in output dict
             if link.id not in links:
@@ -289,8 +379,12 @@ class RailwayNetworkBuilder(BaseModalNetworkBuilder):
         parameters dictionary loaded to RailwayNetwork object."""
 
         # create empty RollingMaterial objects for wagons and locomotives
-        rn.wagons = RollingMaterial()
-        rn.locoms = RollingMaterial()
+        if self.compact:
+            rn.wagons = CompactRollingMaterial()
+            rn.locoms = CompactRollingMaterial()
+        else:
+            rn.wagons = RollingMaterial()
+            rn.locoms = RollingMaterial()
 
         # wagons
         rn.wagons.minimum_units = rn.params["wagon_min_units"].value
@@ -1,14 +1,27 @@
-from openpyxl import load_workbook
 from components import RailwayLink, RoadwayLink, Parameter, OD, Path
+from components import CompactRailwayLink, CompactRoadwayLink
+from components import CompactParameter, CompactOD, CompactPath
 
 
 class BaseXlLoad():
-    """Creates base class for iterate rows of a worksheet."""
+    """Creates base class for iterate rows of a worksheet.
+
+    Elements are created with ELEMENT_CLASS, or with its slotted variant
+    COMPACT_CLASS if the loader is compact."""
+
+    def __init__(self, xl_name, compact=False):
+
+        # openpyxl takes long to import, so only builds of networks import it
+        from openpyxl import load_workbook
 
-    def __init__(self, xl_name):
         self.wb = load_workbook(xl_name, True)
         self.ws = self.wb.get_active_sheet()
 
+        if compact:
+            self.element_class = self.COMPACT_CLASS
+        else:
+            self.element_class = self.ELEMENT_CLASS
+
     def __iter__(self):
         return self._iterate_rows()
 
@@ -16,6 +29,9 @@ class BaseXlLoad():
 class XlLoadOD(BaseXlLoad):
     """Creates an iterator of OD pairs from an excel workbook."""
 
+    ELEMENT_CLASS = OD
+    COMPACT_CLASS = CompactOD
+
     def _iterate_rows(self):
 
         # iterate trough rows creating and yielding od pairs
@@ -33,7 +49,8 @@ class XlLoadOD(BaseXlLoad):
                 rail_category = row[2].value
 
                 # create od pair
-                od_pair = OD(id_od, ton, path, gauge, distance, rail_category)
+                od_pair = self.element_class(id_od, ton, path, gauge,
+                                             distance, rail_category)
 
                 yield od_pair
 
@@ -56,22 +73,27 @@ class XlLoadLink(BaseXlLoad):
 
                 # create link if all parameters are true
                 if id_link and distance and gauge:
-                    link = self.LINK_CLASS(id_link, distance, gauge)
+                    link = self.element_class(id_link, distance, gauge)
 
                     yield link
 
 
 class XlLoadRailwayLink(XlLoadLink):
-    LINK_CLASS = RailwayLink
+    ELEMENT_CLASS = RailwayLink
+    COMPACT_CLASS = CompactRailwayLink
 
 
 class XlLoadRoadwayLink(XlLoadLink):
-    LINK_CLASS = RoadwayLink
+    ELEMENT_CLASS = RoadwayLink
+    COMPACT_CLASS = CompactRoadwayLink
 
 
 class XlLoadParam(BaseXlLoad):
     """Creates an iterator of parameters from an excel workbook."""
 
+    ELEMENT_CLASS = Parameter
+    COMPACT_CLASS = CompactParameter
+
     def _iterate_rows(self):
 
         # iterate sheets
@@ -90,7 +112,8 @@ class XlLoadParam(BaseXlLoad):
 
                     # create variable if id is not none
                     if id_param:
-                        parameter = Parameter(id_param, value, desc)
+                        parameter = self.element_class(id_param, value,
+                                                       desc)
 
                         yield parameter
 
@@ -98,6 +121,9 @@ class XlLoadParam(BaseXlLoad):
 class XlLoadPath(BaseXlLoad):
     """Creates an iterator of paths from an excel workbook."""
 
+    ELEMENT_CLASS = Path
+    COMPACT_CLASS = CompactPath
+
     def _iterate_rows(self):
 
         # iterate trough rows creating and yielding od pairs
@@ -112,7 +138,7 @@ class XlLoadPath(BaseXlLoad):
                 gauge = row[2].value
 
                 # create variable
-                path = Path(id_path, path, gauge)
+                path = self.element_class(id_path, path, gauge)
 
                 yield path
 
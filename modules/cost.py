@@ -1,8 +1,22 @@
+import math
+import numpy as np
+
+
 class BaseNetworkCost(object):
 
-    def __init__(self, rn):
+    def __init__(self, rn, total_ton_km=None):
+        """
+        Args:
+            rn: Modal network to be costed.
+            total_ton_km (opt): Ton-km of the network, if already known by the
+                caller. Otherwise, it is calculated from the network.
+        """
         self.rn = rn
-        self.total_ton_km = self.rn.ton_km
+
+        if total_ton_km is None:
+            self.total_ton_km = self.rn.ton_km
+        else:
+            self.total_ton_km = total_ton_km
 
     def _market_to_shadow_prices(self, market_cost):
         """Convert market cost to shadow cost."""
@@ -26,6 +40,137 @@ class RailwayMobilityCost(BaseNetworkCost):
 
     MARKET_TO_SHADOW = "mobility_cost_rpc"
 
+    def calc_regroup_delta(self, num_locs, dist):
+        """Calculate the change in mobility cost of regrouping a link.
+
+        The change is calculated straight from the changes that regrouping
+        would make to rolling material (see RailwayNetwork._regroup_link),
+        without actually regrouping the link.
+
+        Args:
+            num_locs: Locomotives that would be eliminated regrouping trains.
+            dist: Distance of the link to be regrouped.
+
+        Returns:
+            Change in total mobility cost by ton-km.
+        """
+
+        delta_running, delta_locom_time, delta_wagon_time = \
+            self._calc_regroup_times(num_locs, dist)
+
+        # calculate change in units needed of rolling material
+        delta_locoms = (self._get_units_needed(self.rn.locoms,
+                                               delta_locom_time) -
+                        self.rn.locoms.get_units_needed_by_time())
+        delta_wagons = (self._get_units_needed(self.rn.wagons,
+                                               delta_wagon_time) -
+                        self.rn.wagons.get_units_needed_by_time())
+
+        return self._cost_mobility_delta(delta_locoms, delta_wagons,
+                                         delta_running, delta_locom_time)
+
+    def calc_regroup_deltas(self, num_locs, dists):
+        """Calculate the marginal change in mobility cost of regrouping links.
+
+        Vectorized version of calc_regroup_delta, taking numpy arrays. Units
+        of rolling material are taken as continuous, so the change of each
+        link is independent from the others and all of them can be decided
+        in a single sweep.
+
+        Args:
+            num_locs: Array of locomotives that would be eliminated by link.
+            dists: Array of distances of the links.
+
+        Returns:
+            Array of changes in total mobility cost by ton-km.
+        """
+
+        delta_running, delta_locom_time, delta_wagon_time = \
+            self._calc_regroup_times(num_locs, dists)
+
+        # calculate change in units needed of rolling material
+        delta_locoms = delta_locom_time / float(self.rn.locoms.availability)
+        delta_wagons = delta_wagon_time / float(self.rn.wagons.availability)
+
+        return self._cost_mobility_delta(delta_locoms, delta_wagons,
+                                         delta_running, delta_locom_time)
+
+    def _calc_regroup_times(self, num_locs, dist):
+        """Calculate changes in rolling material times due to regrouping.
+
+        Returns: (delta_running, delta_locom_time, delta_wagon_time)
+            delta_running: Change in locomotives running time.
+            delta_locom_time: Change in locomotives total (and operation) time.
+            delta_wagon_time: Change in wagons total time.
+        """
+
+        locoms = self.rn.locoms
+        wagons = self.rn.wagons
+
+        # calculate hours to run through the link
+        hours_running = dist / float(locoms.speed)
+        hours_idle_turnouts = (dist / float(locoms.turnout_freq) *
+                               locoms.turnout_time)
+
+        # locomotives don't run the link but spend time regrouping
+        delta_running = - hours_running * num_locs
+        delta_locom_time = (delta_running - hours_idle_turnouts * num_locs +
+                            num_locs * locoms.regroup_time)
+
+        # wagons only spend time regrouping
+        wagons_regrouped = num_locs * locoms.capacity / wagons.capacity
+        delta_wagon_time = wagons_regrouped * wagons.regroup_time
+
+        return delta_running, delta_locom_time, delta_wagon_time
+
+    def _get_units_needed(self, rolling_material, delta_time):
+        """Calculate units needed by rolling material if time changes."""
+
+        total_time = rolling_material.get_total_time() + delta_time
+        units_float = float(total_time) / float(rolling_material.availability)
+
+        return int(math.ceil(units_float))
+
+    def _cost_mobility_delta(self, delta_locoms, delta_wagons, delta_running,
+                             delta_operation):
+        """Calculate change in mobility cost by ton-km for rolling material
+        changes, adding up all the mobility costs that depend on them."""
+
+        # assign parameters to short variables
+        params = self.rn.params
+        int_rate = params["interest_rate"].value
+        crf_wagon = self._capital_recovery_factor(
+            int_rate, params["useful_life_wagon"].value)
+        crf_locom = self._capital_recovery_factor(
+            int_rate, params["useful_life_locom"].value)
+
+        # yearly cost by unit of rolling material (eac and maintenance)
+        wagon_cost = (params["wagon_price"].value * crf_wagon +
+                      params["maintenance_by_wagon"].value)
+        locom_cost = (params["locomotive_price"].value * crf_locom +
+                      params["maintenance_by_locomotive"].value)
+
+        # cost by hour of locomotives running (fuel and lubricants)
+        running_cost = (params["fuel_cost_by_km"].value *
+                        params["speed"].value *
+                        (1 + params["lubricants_fuel_ratio"].value))
+
+        # cost by hour of locomotives operating (manpower)
+        operation_cost = (params["manpower_cost_by_hour"].value *
+                          params["manpower_by_loc"].value)
+
+        year_cost = (wagon_cost * delta_wagons + locom_cost * delta_locoms +
+                     running_cost * delta_running +
+                     operation_cost * delta_operation)
+
+        # calculate cost per ton_km
+        if self.total_ton_km > 0.1:
+            market_cost = year_cost / self.total_ton_km
+        else:
+            market_cost = year_cost * 0.0
+
+        return self._market_to_shadow_prices(market_cost)
+
     def _cost_eac_ton_km(self, eac, units):
         """Calculate eac by ton_km for a number of units."""
 
@@ -156,6 +301,44 @@ class RailwayInfrastructureCost(BaseNetworkCost):
 
     MARKET_TO_SHADOW = "infrast_cost_rpc"
 
+    def cost_link(self, link):
+        """Calculate yearly infrastructure costs of a link.
+
+        Costs are written to the link object and returned in a dictionary
+        (not expressed in terms of ton-km)."""
+
+        # check if there is load on that link
+        if link.tons.get() > 0.0:
+
+            # calculate gross ton-km carried by the link
+            gross_tk = link.gross_ton_km
+
+            # ask to the railway network if this is a main track
+            main_track = self.rn.is_main_track(gross_tk, link.dist)
+
+            # store the result to the link
+            link.main_track = main_track
+
+            # calculate costs of link infrastructure
+            eac_turnout = self._cost_turnout(gross_tk, link.dist)
+            eac_track = self._cost_eac_track(gross_tk, link.dist, main_track)
+            maintenance = self._cost_infrast_maint(gross_tk, link.dist)
+
+        # set all costs in the link to zero
+        else:
+            eac_turnout = 0.0
+            eac_track = 0.0
+            maintenance = 0.0
+
+        # write costs to link object
+        link.eac_turnout = eac_turnout
+        link.eac_track = eac_track
+        link.maintenance = maintenance
+
+        return {"eac_turnout": eac_turnout,
+                "eac_track": eac_track,
+                "maintenance": maintenance}
+
     def _cost_turnout(self, gross_tk, dist):
         """Calculate equivalent annual cost of turnouts."""
 
@@ -288,114 +471,160 @@ class RailwayTimeCost(BaseNetworkCost):
 
     MARKET_TO_SHADOW = "time_cost_rpc"
 
-    def _cost_deposit(self):
-        """Calculate cost of freight deposit while waiting a train service."""
-
-        # get parameters into short name variables
-        cost_day_ton = self.rn.params["deposit_cost_per_day_ton"].value
+    def cost_od(self, od):
+        """Calculate yearly time costs of a single od pair.
 
-        # calculate deposit cost for each od pair
-        total_deposit_cost = 0.0
-        for od in self.rn.iter_od_pairs():
+        Costs are written to the od pair cost object and returned in a
+        dictionary (not expressed in terms of ton-km), with the same
+        conditions used to cost the whole network."""
 
-            if (od.tons.get() > 0 and od.tons.category != 1 and
-                    od.get_lowest_link_scale()):
+        RV = {"deposit": 0.0, "immobilized_value": 0.0, "short_freight": 0.0}
 
-                # calculate days of deposit
-                lowest_link_scale = od.get_lowest_link_scale() / 2
-                days_of_deposit = self._calc_deposit_days(lowest_link_scale)
+        # railway category 1 has no time costs
+        if od.tons.category == 1:
+            return RV
 
-                # calculate od deposit cost
-                od.cost.deposit = (cost_day_ton * days_of_deposit *
-                                   od.tons.get())
+        ton = od.tons.get()
+        lowest_link_scale = od.get_lowest_link_scale()
 
-                total_deposit_cost += od.cost.deposit
+        if ton > 0 and lowest_link_scale:
 
-        if self.total_ton_km > 0.1:
+            # calculate days of deposit and travel
+            days_of_deposit = float(
+                self._calc_deposit_days(lowest_link_scale / 2))
+            days_of_travel = self._calc_travel_days(
+                *self._get_travel_inputs(od))
 
-            # total deposit cost is returned in ton-km
-            deposit_cost = total_deposit_cost / self.total_ton_km
+            # calculate od deposit cost
+            cost_day_ton = self.rn.params["deposit_cost_per_day_ton"].value
+            od.cost.deposit = cost_day_ton * days_of_deposit * ton
+            RV["deposit"] = od.cost.deposit
 
-        else:
-            deposit_cost = 0.0
+            # calculate od immobilized value cost
+            cost_ton_day = self.rn.params["cost_of_immobilized_ton"].value
+            immobilized_days = days_of_deposit + days_of_travel
+            od.cost.immo_value = immobilized_days * ton * cost_ton_day
+            RV["immobilized_value"] = od.cost.immo_value
 
-        # convert market cost to shadow cost
-        market_cost = deposit_cost
-        shadow_cost = self._market_to_shadow_prices(market_cost)
+        # calculate od short freight cost
+        short_freight_cost_ton = self.rn.params["short_freight_to_train"].value
+        od.cost.short_freight = short_freight_cost_ton * ton * 2
+        RV["short_freight"] = od.cost.short_freight
 
-        return shadow_cost
+        return RV
 
-    def _cost_immobilized_value(self):
-        """Calculate immobilizing value cost during deposit and travel time."""
+    def cost_ods(self, ods, by_od=False):
+        """Calculate yearly time costs of many od pairs in a single pass.
+
+        Inputs of every od pair are gathered once into arrays (turnouts and
+        regroups of their paths summed by the network through the od pairs -
+        links incidence) and the three time costs are calculated vectorized.
+        Costs are written to the od pairs cost objects, as cost_od does.
+
+        Args:
+            ods: Iterable of od pairs to be costed.
+            by_od: If True, costs of each od pair are returned instead of
+                their sum.
+
+        Returns:
+            Dictionary with the sum of each time cost of the od pairs (not
+            expressed in terms of ton-km). With by_od, a list with the
+            dictionary of costs of each od pair, as cost_od returns it.
+        """
+
+        all_ods = list(ods)
+        ods = [od for od in all_ods if od.tons.category != 1]
+
+        # gather inputs of od pairs
+        tons = np.zeros(len(ods))
+        scales = np.zeros(len(ods))
+        dists = np.zeros(len(ods))
+        for i, od in enumerate(ods):
+            tons[i] = od.tons.get()
+
+            # only od pairs with tons and a lowest link scale have time costs
+            if tons[i] > 0:
+                lowest_link_scale = od.get_lowest_link_scale()
+                if lowest_link_scale:
+                    scales[i] = lowest_link_scale
+                    dists[i] = od.dist
+
+        turnouts, regroups = self.rn.get_ods_turnouts_regroups(ods)
+
+        has_time_costs = scales > 0
+
+        # calculate days of deposit and travel
+        days_of_deposit = np.where(has_time_costs,
+                                   self._calc_deposit_days(scales / 2), 0.0)
+        days_of_travel = np.where(has_time_costs,
+                                  self._calc_travel_days(dists, turnouts,
+                                                         regroups), 0.0)
+
+        # calculate od pairs costs
+        cost_day_ton = self.rn.params["deposit_cost_per_day_ton"].value
+        deposit = cost_day_ton * days_of_deposit * tons
 
         cost_ton_day = self.rn.params["cost_of_immobilized_ton"].value
+        immo_value = (days_of_deposit + days_of_travel) * tons * cost_ton_day
 
-        # calculate immobilized time for each od pair
-        total_immo_ton_days = 0.0
-        for od in self.rn.iter_od_pairs():
-
-            if (od.tons.get() > 0 and od.tons.category != 1 and
-                    od.get_lowest_link_scale()):
-
-                # calculate days of deposit
-                lowest_link_scale = od.get_lowest_link_scale() / 2
-                days_of_deposit = self._calc_deposit_days(lowest_link_scale)
-
-                # calculate days of travel
-                days_of_travel = self._calc_travel_days(od)
-
-                # total immobilized days and ton-days for od pair
-                immobilized_days = days_of_deposit + days_of_travel
-                immobilized_ton_days = immobilized_days * od.tons.get()
-
-                total_immo_ton_days += immobilized_ton_days
-                od.cost.immo_value = immobilized_ton_days * cost_ton_day
-
-        total_cost_immo_value = total_immo_ton_days * cost_ton_day
+        short_freight_cost_ton = self.rn.params["short_freight_to_train"].value
+        short_freight = short_freight_cost_ton * tons * 2
+
+        # write costs to od pairs
+        for i, od in enumerate(ods):
+            if has_time_costs[i]:
+                od.cost.deposit = float(deposit[i])
+                od.cost.immo_value = float(immo_value[i])
+            od.cost.short_freight = float(short_freight[i])
+
+        # railway category 1 has no time costs
+        if by_od:
+            costs = iter(zip(deposit, immo_value, short_freight))
+            RV = []
+            for od in all_ods:
+                od_costs = (0.0, 0.0, 0.0)
+                if od.tons.category != 1:
+                    od_costs = next(costs)
+                RV.append({"deposit": float(od_costs[0]),
+                           "immobilized_value": float(od_costs[1]),
+                           "short_freight": float(od_costs[2])})
+            return RV
+
+        return {"deposit": float(deposit.sum()),
+                "immobilized_value": float(immo_value.sum()),
+                "short_freight": float(short_freight.sum())}
+
+    def cost_to_ton_km(self, market_cost):
+        """Express a yearly market cost in shadow cost by ton-km."""
 
         if self.total_ton_km > 0.1:
-
-            # total cost of immobilized value is returned in ton-km
-            immobilized_value_cost = total_cost_immo_value / self.total_ton_km
-
+            cost_tk = market_cost / self.total_ton_km
         else:
-            immobilized_value_cost = 0.0
+            cost_tk = 0.0
 
-        # convert market cost to shadow cost
-        market_cost = immobilized_value_cost
-        shadow_cost = self._market_to_shadow_prices(market_cost)
+        return self._market_to_shadow_prices(cost_tk)
 
-        return shadow_cost
-
-    def _cost_short_freight(self):
-        """Calculate cost of transport from door to train station."""
+    def _get_travel_inputs(self, od):
+        """Return inputs of an od pair needed to calculate its travel time.
 
-        short_freight_cost_ton = self.rn.params["short_freight_to_train"].value
+        Returns: (dist, num_turnouts, num_regroups)
+        """
 
-        # calculate short freight cost for each od pair
-        total_short_freight_cost = 0.0
-        for od in self.rn.iter_od_pairs():
-            if od.tons.category != 1:
-                short_freight_cost = short_freight_cost_ton * od.tons.get() * 2
-                total_short_freight_cost += short_freight_cost
-                od.cost.short_freight = short_freight_cost
-
-        if self.total_ton_km > 0.1:
-
-            # total cost of short freight is returned in ton-km
-            short_freight_cost_tk = total_short_freight_cost / self.total_ton_km
+        num_turnouts = self.rn.get_turnouts(od.links, od.gauge)
 
+        if self.rn.od_can_be_regrouped(od):
+            num_regroups = self.rn.get_regroups(od.links, od.gauge)
         else:
-            short_freight_cost_tk = 0.0
-
-        # convert market cost to shadow cost
-        market_cost = short_freight_cost_tk
-        shadow_cost = self._market_to_shadow_prices(market_cost)
+            num_regroups = 0
 
-        return shadow_cost
+        return od.dist, num_turnouts, num_regroups
 
     def _calc_deposit_days(self, lowest_link_scale):
-        """Calculate deposit days to hold a load while waiting a train."""
+        """Calculate deposit days to hold a load while waiting a train.
+
+        Args:
+            lowest_link_scale: Scale (or array of scales) of lowest link.
+        """
 
         # get parameters into short name variables
         locomotive_load = (self.rn.params["locomotive_capacity"].value /
@@ -404,7 +633,8 @@ class RailwayTimeCost(BaseNetworkCost):
 
         # calculate how many trains per week will be at that scale
         weekly_train_freq = (lowest_link_scale / locomotive_load) / (365 / 7)
-        weekly_train_freq = max(weekly_train_freq, min_weekly_train_freq)
+        weekly_train_freq = np.maximum(weekly_train_freq,
+                                       min_weekly_train_freq)
 
         # calculate average days of deposit waiting the train
         average_days_waiting = 1 / weekly_train_freq * 7 / 2
@@ -414,8 +644,8 @@ class RailwayTimeCost(BaseNetworkCost):
 
         return total_deposit_days
 
-    def _calc_travel_days(self, od):
-        """Calculate travel time of an od pair."""
+    def _calc_travel_days(self, dist, num_turnouts, num_regroups):
+        """Calculate travel time of an od pair (or arrays of od pairs)."""
 
         # get parameters into short name variables
         truck_to_train_time = self.rn.params["ratio_truck_to_train_travel_time"].value
@@ -424,18 +654,13 @@ class RailwayTimeCost(BaseNetworkCost):
         regroup_time = self.rn.params["regroup_time"].value
 
         # calculate days of train running
-        running_days = od.dist / speed / 24
+        running_days = dist / speed / 24
 
         # calculate days of train stopped in turnouts
-        num_turnouts = self.rn.get_turnouts(od.links, od.gauge)
         idle_turnout_days = num_turnouts * turnout_time / 24
 
         # calculate days of train stopped at regrouping tasks
-        if self.rn.od_can_be_regrouped(od):
-            num_regroups = self.rn.get_regroups(od.links, od.gauge)
-            idle_regroup_days = num_regroups * regroup_time / 24
-        else:
-            idle_regroup_days = 0
+        idle_regroup_days = num_regroups * regroup_time / 24
 
         total_days = running_days + idle_turnout_days + idle_regroup_days
 
@@ -449,7 +674,7 @@ class RailwayNetworkCost(BaseNetworkCost):
         RV = {}
 
         # init object to cost mobility
-        rmc = RailwayMobilityCost(self.rn)
+        rmc = RailwayMobilityCost(self.rn, self.total_ton_km)
 
         # fill RV with moblity costs per ton-km
         RV["eac_wagon"] = rmc._cost_eac_wagon()
@@ -463,6 +688,25 @@ class RailwayNetworkCost(BaseNetworkCost):
 
         return RV
 
+    def cost_regroup(self, num_locs, dist):
+        """Calculate the change in mobility cost of regrouping a link."""
+
+        rmc = RailwayMobilityCost(self.rn, self.total_ton_km)
+
+        return rmc.calc_regroup_delta(num_locs, dist)
+
+    def cost_regroups(self, num_locs, dists):
+        """Calculate the marginal change in mobility cost of regrouping links.
+
+        Args:
+            num_locs: Array of locomotives that would be eliminated by link.
+            dists: Array of distances of the links.
+        """
+
+        rmc = RailwayMobilityCost(self.rn, self.total_ton_km)
+
+        return rmc.calc_regroup_deltas(num_locs, dists)
+
     def cost_infrast(self):
         """Calculate each type of infrastructure cost."""
 
@@ -473,45 +717,15 @@ class RailwayNetworkCost(BaseNetworkCost):
         RV["maintenance"] = 0.0
 
         # init object to cost infrastructure
-        ric = RailwayInfrastructureCost(self.rn)
+        ric = RailwayInfrastructureCost(self.rn, self.total_ton_km)
 
         # calculate gross ton_km and infrastructure cost for each link
         for link in self.rn.iter_links():
 
-            # check if there is load on that link
-            if link.tons.get() > 0.0:
-
-                # calculate gross ton-km carried by the link
-                gross_tk = link.gross_ton_km
-
-                # ask to the railway network if this is a main track
-                main_track = self.rn.is_main_track(gross_tk, link.dist)
-
-                # store the result to the link
-                link.main_track = main_track
-
-                # calculate costs of link infrastructure
-                eac_turnout = ric._cost_turnout(gross_tk, link.dist)
-                eac_track = ric._cost_eac_track(gross_tk, link.dist,
-                                                main_track)
-                maintenance = ric._cost_infrast_maint(gross_tk,
-                                                      link.dist)
-
-                # update RV cost category with traffic of the link
-                RV["eac_turnout"] += eac_turnout
-                RV["eac_track"] += eac_track
-                RV["maintenance"] += maintenance
-
-                # write costs to link object
-                link.eac_turnout = eac_turnout
-                link.eac_track = eac_track
-                link.maintenance = maintenance
-
-            # set all costs in the link to zero
-            else:
-                link.eac_turnout = 0.0
-                link.eac_track = 0.0
-                link.maintenance = 0.0
+            # update RV cost category with traffic of the link
+            link_costs = ric.cost_link(link)
+            for infrast_cost in link_costs:
+                RV[infrast_cost] += link_costs[infrast_cost]
 
         # divide all costs to express them in terms of ton-km
         for infrast_cost in RV:
@@ -530,12 +744,12 @@ class RailwayNetworkCost(BaseNetworkCost):
         RV = {}
 
         # init object to cost time
-        rtc = RailwayTimeCost(self.rn)
+        rtc = RailwayTimeCost(self.rn, self.total_ton_km)
 
-        # fill RV with moblity costs per ton-km
-        RV["deposit"] = rtc._cost_deposit()
-        RV["immobilized_value"] = rtc._cost_immobilized_value()
-        RV["short_freight"] = rtc._cost_short_freight()
+        # fill RV with time costs per ton-km, costing od pairs in one pass
+        time_costs = rtc.cost_ods(self.rn.iter_od_pairs())
+        for cost_name in time_costs:
+            RV[cost_name] = rtc.cost_to_ton_km(time_costs[cost_name])
 
         # sum all costs and add it to total mobility
         RV["total_time"] = sum(RV.values())
@@ -552,7 +766,7 @@ class RoadwayMobilityCost(BaseNetworkCost):
         """Calculate cost of truck mobility."""
 
         mobility_cost_tk = self.rn.params["mobility_cost_tk"].value
-        mobility_cost = self.rn.ton_km * mobility_cost_tk
+        mobility_cost = self.total_ton_km * mobility_cost_tk
 
         # convert market cost to shadow cost
         market_cost = mobility_cost / self.total_ton_km
@@ -565,6 +779,26 @@ class RoadwayInfrastructureCost(BaseNetworkCost):
 
     MARKET_TO_SHADOW = "infrast_cost_rpc"
 
+    def cost_link(self, link):
+        """Calculate yearly infrastructure costs of a link.
+
+        Cost is written to the link object (only if link has load, as it has
+        always been done for roadway links) and returned in a dictionary."""
+
+        # check if there is load on that link
+        if link.tons.get() > 0:
+
+            # calculate costs of link infrastructure
+            eac_track = self._cost_eac_track(link.tons.get(), link.dist)
+
+            # write costs to link object
+            link.eac_track = eac_track
+
+        else:
+            eac_track = 0.0
+
+        return {"eac_track": eac_track}
+
     def _cost_eac_track(self, ton, dist):
         """Calculate equivalent annual cost of track."""
 
@@ -587,7 +821,7 @@ class RoadwayNetworkCost(BaseNetworkCost):
         RV = {}
 
         # init object to cost mobility
-        rmc = RoadwayMobilityCost(self.rn)
+        rmc = RoadwayMobilityCost(self.rn, self.total_ton_km)
 
         # sum all costs and add it to total mobility
         RV["total_mobility"] = rmc._cost_mobility()
@@ -600,23 +834,13 @@ class RoadwayNetworkCost(BaseNetworkCost):
         RV["eac_track"] = 0
 
         # init object to cost mobility
-        ric = RoadwayInfrastructureCost(self.rn)
+        ric = RoadwayInfrastructureCost(self.rn, self.total_ton_km)
 
         # calculate gross ton_km and infrastructure cost for each link
         for link in self.rn.iter_links():
 
-            # check if there is load on that link
-            if link.tons.get() > 0:
-
-                # calculate costs of link infrastructure
-                eac_track = ric._cost_eac_track(link.tons.get(),
-                                                link.dist)
-
-                # update RV cost category with traffic of the link
-                RV["eac_track"] += eac_track
-
-                # write costs to link object
-                link.eac_track = eac_track
+            # update RV cost category with traffic of the link
+            RV["eac_track"] += ric.cost_link(link)["eac_track"]
 
         # divide all costs to express them in terms of ton-km
         for infrast_cost in RV:
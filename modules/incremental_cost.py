@@ -0,0 +1,352 @@
+from cost import RailwayNetworkCost, RoadwayNetworkCost
+from cost import RailwayInfrastructureCost, RoadwayInfrastructureCost
+from cost import RailwayTimeCost
+
+"""
+    Incremental costing of modal networks. After a network has been fully
+    costed, only links and od pairs reported as changed by the network
+    ChangeTracker (and those depending on them) are costed again.
+"""
+
+
+class BaseIncrementalCost(object):
+
+    """Keeps costs of a modal network up to date re-costing only changes.
+
+    After a full costing of the network, rebase() stores the cost of every
+    link (and od pair, if the mode has od pair costs). From then on, update()
+    takes links and od pairs reported by the network ChangeTracker, re-costs
+    only those and the few global terms (ton-km, rolling material units) and
+    adjusts running totals instead of iterating the entire network.
+
+    It must be subclassed to cost a specific modal network."""
+
+    def __init__(self, mn):
+        self.mn = mn
+        self.is_based = False
+
+        # ton-km of the network and of each link
+        self.total_ton_km = 0.0
+        self.links_ton_km = {}
+
+        # yearly infrastructure costs of each link and its totals
+        self.links_costs = {}
+        self.infrast_totals = {}
+
+    # PUBLIC
+    def invalidate(self):
+        """Mark stored costs as outdated, a new rebase() will be needed."""
+        self.is_based = False
+
+    def is_current(self):
+        """Check stored costs correspond to the current state of network."""
+        return self.is_based and not self.mn.tracker.has_changes()
+
+    def rebase(self):
+        """Store costs of every link and od pair of a fully costed network."""
+
+        # changes up to now are already included in the full costing
+        self.mn.tracker.clear()
+
+        self.total_ton_km = 0.0
+        self.links_ton_km = {}
+        self.links_costs = {}
+        self.infrast_totals = dict.fromkeys(self.INFRAST_COSTS, 0.0)
+
+        for link in self.mn.iter_links():
+            self._update_link_ton_km(link.id, link.gauge)
+
+        infrast_cost = self.INFRAST_COST_CLASS(self.mn, self.total_ton_km)
+        for link in self.mn.iter_links():
+            self._update_link_costs(link.id, link.gauge, infrast_cost)
+
+        self._rebase_ods()
+
+        self.is_based = True
+
+    def update(self):
+        """Re-cost links and od pairs that changed since the last costing."""
+
+        assert self.is_based, "Network must be fully costed before update."
+
+        links, od_pairs = self.mn.tracker.pop_changes()
+
+        # ton-km must be known before anything else is costed
+        for id_link, gauge in links:
+            self._update_link_ton_km(id_link, gauge)
+
+        self._update_ods(links, od_pairs)
+
+        infrast_cost = self.INFRAST_COST_CLASS(self.mn, self.total_ton_km)
+        for id_link, gauge in links:
+            self._update_link_costs(id_link, gauge, infrast_cost)
+
+        self._store_costs()
+
+        # network doesn't need to iterate its links to know ton-km
+        self.mn._store_cached("ton_km", self.total_ton_km)
+
+    # PRIVATE
+    def _update_link_ton_km(self, id_link, gauge):
+        """Replace the ton-km of a link in the network total."""
+
+        self.total_ton_km -= self.links_ton_km.pop((id_link, gauge), 0.0)
+
+        if self.mn.has_link(id_link, gauge):
+            link = self.mn.get_link(id_link, gauge)
+            self.links_ton_km[(id_link, gauge)] = link.tons.get() * link.dist
+            self.total_ton_km += self.links_ton_km[(id_link, gauge)]
+
+    def _update_link_costs(self, id_link, gauge, infrast_cost):
+        """Replace the infrastructure costs of a link in the totals."""
+
+        old_costs = self.links_costs.pop((id_link, gauge), {})
+        for cost_name in old_costs:
+            self.infrast_totals[cost_name] -= old_costs[cost_name]
+
+        if self.mn.has_link(id_link, gauge):
+            link = self.mn.get_link(id_link, gauge)
+            new_costs = infrast_cost.cost_link(link)
+            for cost_name in new_costs:
+                self.infrast_totals[cost_name] += new_costs[cost_name]
+            self.links_costs[(id_link, gauge)] = new_costs
+
+    def _get_infrast_costs(self):
+        """Express infrastructure totals in terms of ton-km."""
+
+        RV = {}
+        for cost_name in self.infrast_totals:
+            if self.total_ton_km > 0.1:
+                RV[cost_name] = (self.infrast_totals[cost_name] /
+                                 self.total_ton_km)
+            else:
+                RV[cost_name] = 0.0
+
+        # sum all costs and add it to total infrastructure
+        RV["total_infrastructure"] = sum(RV.values())
+
+        return RV
+
+    def _get_od(self, key):
+        """Return the od pair of a (id_od, category) key, or None."""
+
+        id_od, category = key
+        if self.mn.has_od(id_od, category):
+            return self.mn.od_pairs[id_od][category]
+        else:
+            return None
+
+
+class RoadwayIncrementalCost(BaseIncrementalCost):
+
+    """Incremental costing of a RoadwayNetwork.
+
+    Roadway costs depend only on links tons, so changes in od pairs need no
+    further costing."""
+
+    INFRAST_COST_CLASS = RoadwayInfrastructureCost
+    INFRAST_COSTS = ["eac_track"]
+
+    # PRIVATE
+    def _rebase_ods(self):
+        pass
+
+    def _update_ods(self, links, od_pairs):
+        pass
+
+    def _store_costs(self):
+
+        network_cost = RoadwayNetworkCost(self.mn, self.total_ton_km)
+        self.mn.costs["mob"] = network_cost.cost_mobility()
+        self.mn.costs["inf"] = self._get_infrast_costs()
+        self.mn.costs["time"] = {"total_time": 0.0}
+
+
+class RailwayIncrementalCost(BaseIncrementalCost):
+
+    """Incremental costing of a RailwayNetwork.
+
+    Besides links costs, it keeps the mobility requirements each od pair
+    added to the rolling material and to the idle capacity of its links, and
+    the time costs of each od pair. Changed od pairs swap their old
+    requirements for the new ones, links whose idle capacity changed are
+    regrouped again and od pairs using any of those links are time costed
+    again."""
+
+    INFRAST_COST_CLASS = RailwayInfrastructureCost
+    INFRAST_COSTS = ["eac_turnout", "eac_track", "maintenance"]
+    TIME_COSTS = ["deposit", "immobilized_value", "short_freight"]
+
+    def __init__(self, mn):
+        super(RailwayIncrementalCost, self).__init__(mn)
+
+        # mobility requirements added by each od pair
+        self.ods_requirements = {}
+
+        # links used by each od pair and od pairs using each link
+        self.ods_links = {}
+        self.links_ods = {}
+
+        # yearly time costs of each od pair and its totals
+        self.ods_costs = {}
+        self.time_totals = {}
+
+    # PRIVATE
+    def _rebase_ods(self):
+
+        self.ods_requirements = {}
+        self.ods_links = {}
+        self.links_ods = {}
+        self.ods_costs = {}
+        self.time_totals = dict.fromkeys(self.TIME_COSTS, 0.0)
+
+        for od in self.mn.iter_od_pairs():
+            key = (od.id, od.category)
+            self._index_od_links(key, od)
+            self.ods_requirements[key] = self._get_requirements(od)
+
+        time_cost = RailwayTimeCost(self.mn, self.total_ton_km)
+        self._update_ods_costs([(od.id, od.category)
+                                for od in self.mn.iter_od_pairs()], time_cost)
+
+    def _update_ods(self, links, od_pairs):
+
+        # links whose idle capacity may change
+        affected_links = set(links)
+        for key in od_pairs:
+            affected_links.update(self.ods_links.get(key, []))
+            od = self._get_od(key)
+            if od:
+                affected_links.update(self._get_od_link_keys(od))
+
+        # restore idleness regrouped, it will be regrouped again later
+        for id_link, gauge in affected_links:
+            if self.mn.has_link(id_link, gauge):
+                link = self.mn.get_link(id_link, gauge)
+                if link.regrouped_locs:
+                    self.mn._revert_regroup_link(link)
+
+        # replace mobility requirements of changed od pairs
+        for key in od_pairs:
+            self._remove_requirements(self.ods_requirements.pop(key, None))
+
+            od = self._get_od(key)
+            if od:
+                self._index_od_links(key, od)
+                self.mn.increase_mobility_requirements(od)
+                self.ods_requirements[key] = self._get_requirements(od)
+            else:
+                self._index_od_links(key, None)
+
+        # regroup again links whose idle capacity may have changed
+        for id_link, gauge in affected_links:
+            if self.mn.has_link(id_link, gauge):
+                link = self.mn.get_link(id_link, gauge)
+                self.mn.regroup_link(link, self.total_ton_km)
+
+        # time cost changed od pairs and those using affected links
+        ods_to_cost = set(od_pairs)
+        for link_key in affected_links:
+            ods_to_cost.update(self.links_ods.get(link_key, []))
+
+        time_cost = RailwayTimeCost(self.mn, self.total_ton_km)
+        self._update_ods_costs(ods_to_cost, time_cost)
+
+    def _store_costs(self):
+
+        self.mn.costs["mob"] = self.mn._calc_mobility_cost(self.total_ton_km)
+        self.mn.costs["inf"] = self._get_infrast_costs()
+        self.mn.costs["time"] = self._get_time_costs()
+
+    def _get_time_costs(self):
+        """Express time totals in terms of ton-km."""
+
+        RV = {}
+        time_cost = RailwayTimeCost(self.mn, self.total_ton_km)
+        for cost_name in self.time_totals:
+            RV[cost_name] = time_cost.cost_to_ton_km(
+                self.time_totals[cost_name])
+
+        # sum all costs and add it to total time
+        RV["total_time"] = sum(RV.values())
+
+        return RV
+
+    def _update_ods_costs(self, keys, time_cost):
+        """Replace the time costs of some od pairs in the totals.
+
+        Lowest scale links and time costs of all the od pairs are found in a
+        single vectorized pass (see RailwayTimeCost.cost_ods)."""
+
+        ods = []
+        for key in keys:
+            old_costs = self.ods_costs.pop(key, {})
+            for cost_name in old_costs:
+                self.time_totals[cost_name] -= old_costs[cost_name]
+
+            od = self._get_od(key)
+            if od:
+                ods.append((key, od))
+
+        if not ods:
+            return
+
+        self.mn.find_lowest_scale_links([od for key, od in ods])
+        all_costs = time_cost.cost_ods([od for key, od in ods], by_od=True)
+        for (key, od), new_costs in zip(ods, all_costs):
+            for cost_name in new_costs:
+                self.time_totals[cost_name] += new_costs[cost_name]
+            self.ods_costs[key] = new_costs
+
+    def _get_od_link_keys(self, od):
+        if od.has_operable_path():
+            return [(id_link, od.gauge) for id_link in od.links]
+        else:
+            return []
+
+    def _index_od_links(self, key, od):
+        """Update links used by an od pair in the link-od index."""
+
+        for link_key in self.ods_links.pop(key, []):
+            self.links_ods[link_key].discard(key)
+
+        if od:
+            self.ods_links[key] = self._get_od_link_keys(od)
+            for link_key in self.ods_links[key]:
+                self.links_ods.setdefault(link_key, set()).add(key)
+
+    def _get_requirements(self, od):
+        """Return mobility requirements the od pair has added to the network.
+
+        Requirements are calculated the same way increase_mobility_requirements
+        does, so they can be exactly removed later."""
+
+        ton = od.tons.get()
+        if not ton > 0.1:
+            return None
+
+        units_needed = self.mn.locoms._get_units_needed_by_weight(ton)
+        idle_cap_l = self.mn.locoms._get_idle_capacity(ton, units_needed)
+        can_be_regrouped = self.mn._can_od_be_regrouped(od)
+
+        return (ton, od.dist, idle_cap_l, can_be_regrouped,
+                self._get_od_link_keys(od))
+
+    def _remove_requirements(self, requirements):
+        """Remove mobility requirements previously added by an od pair."""
+
+        if not requirements:
+            return
+
+        ton, dist, idle_cap_l, can_be_regrouped, link_keys = requirements
+
+        self.mn._remove_rolling_material(ton, dist)
+
+        for id_link, gauge in link_keys:
+            if self.mn.has_link(id_link, gauge):
+                link = self.mn.get_link(id_link, gauge)
+
+                if can_be_regrouped:
+                    link.idle_capacity_regroup -= idle_cap_l
+                else:
+                    link.idle_capacity_no_regroup -= idle_cap_l
@@ -1,8 +1,8 @@
-from openpyxl import Workbook, load_workbook
-from openpyxl.cell import get_column_letter
-from openpyxl.styles import Style, Alignment, Font
 from pprint import pprint
 
+# openpyxl takes long to import, so it's imported by the methods writing excel
+# reports and not with the module
+
 
 class BaseReport():
 
@@ -12,12 +12,9 @@ class BaseReport():
 
     XL_GLOBAL_REPORT = "reports/freight_network_report.xlsx"
     WS_GLOBAL_NAME = "global_results"
-    ALIGN = Alignment(vertical='center')
-    ALIGN_HEADER = Alignment(horizontal='center', vertical='center',
-                             wrap_text=True)
-    CELL_STYLE = Style(alignment=ALIGN)
-    FONT = Font(bold=True)
-    HEADER_STYLE = Style(alignment=ALIGN_HEADER, font=FONT)
+
+    # (cell style, header style), created the first time a report is styled
+    _styles = None
 
     def __init__(self, xl_report=None, description=None, append_report=True):
         """
@@ -67,6 +64,7 @@ class BaseReport():
 
     def links_by_od_to_excel(self, paths, xl_links_by_od):
         """Write table of links by od pair to excel."""
+        from openpyxl import Workbook
 
         # create a workbook
         wb = Workbook(write_only=True)
@@ -94,6 +92,7 @@ class BaseReport():
     @classmethod
     def create_new_global_report(self):
         """Create new workbook for global report."""
+        from openpyxl import Workbook
 
         wb = Workbook(write_only=True)
         wb.create_sheet(title=self.WS_GLOBAL_NAME)
@@ -101,6 +100,7 @@ class BaseReport():
 
     # PRIVATE
     def _report_links_to_xl(self, rn, wb, ws_name):
+        from openpyxl.cell import get_column_letter
 
         # create ws
         ws = wb.create_sheet()
@@ -120,6 +120,7 @@ class BaseReport():
         ws.auto_filter.ref = "A1:" + col_letter + "1"
 
     def _report_od_pairs_to_xl(self, rn, wb, ws_name):
+        from openpyxl.cell import get_column_letter
 
         # create ws
         ws = wb.create_sheet()
@@ -223,12 +224,29 @@ class BaseReport():
                 for key, value in rn.costs[cost_type].items():
                     ws.append([key, value])
 
+    @classmethod
+    def _get_styles(cls):
+        """Return cell and header styles of reports."""
+
+        if not BaseReport._styles:
+            from openpyxl.styles import Style, Alignment, Font
+
+            align = Alignment(vertical='center')
+            align_header = Alignment(horizontal='center', vertical='center',
+                                     wrap_text=True)
+            BaseReport._styles = (Style(alignment=align),
+                                  Style(alignment=align_header,
+                                        font=Font(bold=True)))
+
+        return BaseReport._styles
+
     def _style_ws(self, ws):
+        cell_style, header_style = self._get_styles()
 
         # style cells with values
         for col in ws.columns[1:]:
             for cell in col[1:]:
-                cell.style = self.CELL_STYLE
+                cell.style = cell_style
 
         # styling first column
         for i_col in ws.column_dimensions:
@@ -238,10 +256,11 @@ class BaseReport():
         # styling first row
         ws.row_dimensions[1].height = 60.0
         for cell in ws.rows[0]:
-            cell.style = self.HEADER_STYLE
+            cell.style = header_style
 
     def _get_wb_freight_network_report(self):
         """Return worksheet with freight network report."""
+        from openpyxl import Workbook, load_workbook
 
         # open or create the wb global report
         try:
@@ -314,6 +333,7 @@ class RoadwayNetworkReport(BaseReport):
     # PRIVATE
     def _make_roadway_network_report(self, rn):
         """Make the complete report of roadway network results in excel."""
+        from openpyxl import Workbook, load_workbook
 
         if self.append_report:
             try:
@@ -366,6 +386,7 @@ class RailwayNetworkReport(BaseReport):
     # PRIVATE
     def _make_railway_network_report(self, rn):
         """Make the complete report of railway network results in excel."""
+        from openpyxl import Workbook, load_workbook
 
         if self.append_report:
             try:
@@ -398,3 +419,37 @@ class RailwayNetworkReport(BaseReport):
 
         # save excel report
         wb.save(self.xl_report)
+
+
+class ScenariosReport(BaseReport):
+
+    """Consolidated report of a batch of freight network scenarios.
+
+    Every scenario is a row with its definition followed by its results,
+    as returned by ScenarioRunner."""
+
+    XL_REPORT = "reports/scenarios_report.xlsx"
+    WS_NAME = "scenarios"
+
+    # PUBLIC
+    def report_to_excel(self, fields, results):
+        """Write results of scenarios to a new excel report.
+
+        Args:
+            fields: List with the names of the fields of each result.
+            results: List of dictionaries with the results of each scenario.
+        """
+        from openpyxl import Workbook
+
+        wb = Workbook()
+        ws = wb.active
+        ws.title = self.WS_NAME
+
+        ws.append(fields)
+        for result in results:
+            ws.append([result.get(field) for field in fields])
+
+        self._style_ws(ws)
+
+        # save excel report
+        wb.save(self.xl_report)
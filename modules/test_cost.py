@@ -118,6 +118,20 @@ class RailwayNetworkCostTestCase(unittest.TestCase):
         total_time_cost_tk = self.nc.cost_time()["total_time"]
         self.assertAlmostEqual(total_time_cost_tk, 0.012058865470056235)
 
+    def test_cost_ods(self):
+        ods = list(self.rn.iter_od_pairs())
+        time_costs = self.time.cost_ods(ods)
+
+        # single pass costing must match costing od pairs one by one
+        for cost_name in time_costs:
+            total_cost = sum([self.time.cost_od(od)[cost_name] for od in ods])
+            self.assertAlmostEqual(time_costs[cost_name] / total_cost, 1.0)
+
+        # and costs of each od pair are the ones of cost_od
+        for od, od_costs in zip(ods, self.time.cost_ods(ods, by_od=True)):
+            for cost_name, cost in self.time.cost_od(od).iteritems():
+                self.assertAlmostEqual(od_costs[cost_name], cost)
+
     # AUXILIAR METHODS
     def _load_from_xl(self, loader_class, xl_name, output_dict):
         """Iterate an excel with data using a specific loader_class and storing
@@ -1,18 +1,373 @@
+import heapq
+import math
+import random
+import time
+
+# freight network copy held by each worker process of a parallel optimization
+_worker_fn = None
+
+
+def _init_worker(fn):
+    global _worker_fn
+    _worker_fn = fn
+
+
+def _score_candidates(args):
+    """Score a batch of candidate moves with the network of a worker."""
+
+    strategy_class, incremental, candidates = args
+    strategy = strategy_class(_worker_fn, incremental)
+
+    return strategy._score_moves(candidates)
+
+
 class BaseOptimizationStrategy(object):
 
     ALLOW_ORIGINAL = False
 
-    def __init__(self, fn):
+    # batches of candidates sent to each worker process in every round
+    BATCHES_BY_PROCESS = 4
+
+    # incremental costs are approximate: moves not increasing them by more
+    # than this share of total cost are decided with a full costing
+    FULL_COST_MARGIN = 0.00001
+
+    def __init__(self, fn, incremental=False, processes=1, lazy=False,
+                 checkpointer=None, phase=None, resume=None):
+        """
+        Args:
+            fn: FreightNetwork to be optimized.
+            incremental: If True, trial moves are costed re-costing only links
+                and od pairs changed by the move (see FreightNetwork.
+                cost_network).
+            processes: Number of worker processes scoring candidate moves in
+                parallel. If 1, candidates are tested one after the other.
+            lazy: If True, moves are applied in a lazy-greedy way, re-scoring
+                only the best candidate until it stays the best one.
+            checkpointer: Checkpointer saving periodic checkpoints of the
+                optimization. Lazy optimizations keep their state in a
+                priority queue that can't be checkpointed, so ValueError is
+                raised if both are passed.
+            phase: Name of the phase of the run, saved in checkpoints.
+            resume: Tuple (candidates, position) of a checkpoint to resume the
+                optimization from.
+        """
         self.fn = fn
+        self.incremental = incremental
+        self.processes = processes
+        self.lazy = lazy
+        self.checkpointer = checkpointer
+        self.phase = phase
+        self.resume = resume
+
+        if lazy and checkpointer:
+            raise ValueError("Lazy optimizations can't be checkpointed.")
+
+        # full cost of the network with the moves accepted up to now
+        self._full_cost = None
+
+    def optimize(self):
+        """Optimize the modal split of the network.
+
+        With incremental costing, regrouping decisions are only taken again in
+        changed links, so costs are approximate. Moves are only rejected on
+        incremental costs if they clearly increase them, every other move is
+        decided with a full costing, and the network is fully costed at the
+        end, so reported costs are exact."""
+
+        if self.incremental:
+            self._full_cost = self._get_full_cost()
+
+        self._optimize()
+
+        if self.incremental:
+            self._get_full_cost()
+
+    def _optimize(self):
+
+        if self.lazy:
+            self._optimize_lazy()
+        elif self.processes > 1:
+            self._optimize_parallel()
+        else:
+            self._optimize_sequential()
+
+    def _optimize_lazy(self):
+        """Apply the best move while it improves cost, in a lazy-greedy way.
+
+        All candidates are scored once (in worker processes, if there are
+        more than one) and kept in a priority queue with the last known cost
+        delta. Only the best candidate is scored again, until it stays on top
+        with a score taken after the last applied move. As economies of scale
+        can also make deltas better after a move, candidates left with stale
+        positive deltas are scored again once before stopping.
+
+        It stops where no single move improves cost, as the sequential search
+        does, but it applies the best move first instead of the first
+        improving one, so it can end in a different modal split."""
+
+        # queue of (cost delta, candidate, number of moves applied at scoring)
+        if self.processes > 1:
+            scores = self._score_in_workers(self._get_candidates())
+        else:
+            scores = self._score_moves(self._get_candidates())
+        queue = [(delta, candidate, 0) for candidate, delta in scores]
+        heapq.heapify(queue)
+
+        applied_moves = 0
+        base_cost = self._get_total_cost()
+        while queue:
+            while queue and queue[0][0] < 0:
+                delta, candidate, scored_at = heapq.heappop(queue)
+
+                if not self._is_candidate(candidate):
+                    continue
+
+                # score again a candidate scored before the last applied move
+                if scored_at < applied_moves:
+                    for candidate, delta in self._score_moves([candidate],
+                                                              base_cost):
+                        heapq.heappush(queue,
+                                       (delta, candidate, applied_moves))
+                    continue
+
+                print "Applying", candidate,
+
+                revert_info = self._apply_move(candidate)
+                if self._cost_has_increased(base_cost):
+                    self._revert_move(revert_info)
+                    print "...ok."
+
+                else:
+                    applied_moves += 1
+                    base_cost = self.fn.total_cost
+                    print "...APPLIED!"
+
+            # score again candidates whose positive delta is stale
+            stale = [candidate for delta, candidate, scored_at in queue
+                     if scored_at < applied_moves]
+            if not stale:
+                break
+
+            queue = [(delta, candidate, scored_at)
+                     for delta, candidate, scored_at in queue
+                     if scored_at == applied_moves]
+            for candidate, delta in self._score_moves(stale, base_cost):
+                queue.append((delta, candidate, applied_moves))
+            heapq.heapify(queue)
+
+    def _optimize_sequential(self):
+        """Analyze candidate moves one after the other, applying each of them
+        if it reduces total cost."""
+
+        candidates, start = self._get_start_position()
+        for position in xrange(start, len(candidates)):
+            self._save_checkpoint(candidates, position, position == start)
+
+            candidate = candidates[position]
+            if self._is_candidate(candidate):
+
+                print self.ANALYZING_MSG, self._get_element(candidate),
+
+                old_cost = self._get_total_cost()
+                revert_info = self._apply_move(candidate)
+
+                if self._cost_has_increased(old_cost):
+                    self._revert_move(revert_info)
+                    print "...ok."
+
+                else:
+                    print self.APPLIED_MSG
+
+    def _optimize_parallel(self):
+        """Apply the best improving moves, scored by worker processes.
+
+        In every round, workers get a copy of the network, score the
+        remaining candidate moves independently and send back their cost
+        deltas. Improving moves are applied from the best one, skipping those
+        changing links already changed by an applied move, and checking cost
+        really decreases. Skipped moves and those sharing links with an
+        applied move are scored again in the next round, with the new state.
+        As applied moves also change global terms (like rolling material
+        costs), every other move left is scored again once before stopping,
+        so it stops where no single move improves cost."""
+
+        candidates, start = self._get_start_position()
+        remaining = candidates[start:]
+        candidates = remaining
+
+        # number of moves applied when each candidate was last scored
+        scored_at = {}
+        applied_moves = 0
+
+        num_round = 1
+        while candidates:
+            self._save_checkpoint(remaining, 0, True)
+
+            footprints = {candidate: self._get_footprint(candidate)
+                          for candidate in candidates}
+            scores = self._score_in_workers(candidates)
+            for candidate in candidates:
+                scored_at[candidate] = applied_moves
+            improving = sorted([(delta, candidate)
+                                for candidate, delta in scores if delta < 0])
+
+            print "Round", num_round, "scored", len(candidates), \
+                "candidates in", self.processes, "processes...", \
+                len(improving), "improving moves."
+
+            # apply the best moves that don't change the same links
+            changed_links = set()
+            decided = set()
+            for delta, candidate in improving:
+                if not footprints[candidate] & changed_links:
+
+                    print "Applying", candidate,
+
+                    old_cost = self._get_total_cost()
+                    revert_info = self._apply_move(candidate)
+
+                    if self._cost_has_increased(old_cost):
+                        self._revert_move(revert_info)
+                        print "...ok."
+
+                    else:
+                        changed_links.update(footprints[candidate])
+                        applied_moves += 1
+                        print "...APPLIED!"
+
+                    decided.add(candidate)
+
+            # score again candidates skipped or affected by applied moves
+            remaining = [candidate for candidate in remaining
+                         if candidate not in decided and
+                         self._is_candidate(candidate)]
+            improving_candidates = set([candidate for delta, candidate
+                                        in improving])
+            candidates = [candidate for candidate in remaining
+                          if candidate in improving_candidates or
+                          (candidate in footprints and
+                           footprints[candidate] & changed_links)]
+
+            # before stopping, score again candidates with a stale score
+            if not candidates:
+                candidates = [candidate for candidate in remaining
+                              if scored_at[candidate] < applied_moves]
+
+            num_round += 1
+
+    def _get_start_position(self):
+        """Return candidates and position to start the optimization from.
+
+        Returns: (candidates, position)
+        """
+
+        if self.resume:
+            return self.resume
+        else:
+            return self._get_candidates(), 0
+
+    def _save_checkpoint(self, candidates, position, force=False):
+        """Save a checkpoint (if due or forced) with a checkpointer."""
+
+        if self.checkpointer:
+            if force:
+                self.checkpointer.save(self.fn, self.phase, candidates,
+                                       position)
+            else:
+                self.checkpointer.save_if_due(self.fn, self.phase, candidates,
+                                              position)
+
+    def _score_in_workers(self, candidates):
+        """Score candidate moves in worker processes.
+
+        Workers are started again with every call, so they all get a copy of
+        the current state of the network.
+
+        Returns:
+            List of (candidate, cost delta) tuples.
+        """
+
+        # workers inherit an already costed network
+        self._get_total_cost()
+
+        num_batches = self.processes * self.BATCHES_BY_PROCESS
+        batches = [(self.__class__, self.incremental,
+                    candidates[i::num_batches]) for i in xrange(num_batches)]
+
+        # only parallel optimizations import multiprocessing
+        import multiprocessing
+
+        pool = multiprocessing.Pool(self.processes, _init_worker, (self.fn,))
+        try:
+            results = pool.map(_score_candidates, batches)
+        finally:
+            pool.close()
+            pool.join()
+
+        scores = [score for batch_scores in results for score in batch_scores]
+
+        # evaluations done by workers are lost with their networks
+        self.fn.freight_metrics.count("optimizer.evaluations", len(scores))
+
+        return scores
+
+    def _score_moves(self, candidates, base_cost=None):
+        """Calculate the change in total cost of each candidate move.
+
+        Every move is reverted after being costed, so all of them are scored
+        against the same state of the network.
+
+        Args:
+            candidates: List of candidate moves.
+            base_cost (opt): Total cost of the network, if already known.
+
+        Returns:
+            List of (candidate, cost delta) tuples.
+        """
+
+        if base_cost is None:
+            base_cost = self._get_total_cost()
+
+        scores = []
+        for candidate in candidates:
+            if self._is_candidate(candidate):
+                revert_info = self._apply_move(candidate)
+                scores.append((candidate, self._get_total_cost() - base_cost))
+                self._revert_move(revert_info)
+
+        return scores
 
     def _cost_has_increased(self, old_cost):
-        self.fn.cost_network()
+        self.fn.freight_metrics.count("optimizer.evaluations")
+        self.fn.cost_network(self.incremental)
         new_cost = self.fn.total_cost
 
-        return new_cost > old_cost
+        # only moves clearly increasing cost are rejected on incremental costs
+        margin = abs(old_cost) * self.FULL_COST_MARGIN
+        if not self.incremental or new_cost > old_cost + margin:
+            return new_cost > old_cost
+
+        new_full_cost = self._get_full_cost()
+        if new_full_cost > self._full_cost:
+            return True
+
+        self._full_cost = new_full_cost
+        return False
+
+    def _get_full_cost(self):
+        """Cost the network from scratch, rebasing incremental costing."""
+
+        self.fn.freight_metrics.count("optimizer.full_costings")
+        self.fn.rail.incremental_cost.invalidate()
+        self.fn.road.incremental_cost.invalidate()
+        self.fn.cost_network(self.incremental)
+
+        return self.fn.total_cost
 
     def _get_total_cost(self):
-        self.fn.cost_network()
+        self.fn.freight_metrics.count("optimizer.evaluations")
+        self.fn.cost_network(self.incremental)
 
         return self.fn.total_cost
 
@@ -25,6 +380,9 @@ class BaseDerivationStrategy(BaseOptimizationStrategy):
         for road_od in deriv_ods:
             self.fn.derive.od_to_railway(road_od)
 
+    def _revert_move(self, deriv_ods):
+        self._revert_derivations(deriv_ods)
+
 
 class BaseReroutingStrategy(BaseOptimizationStrategy):
 
@@ -39,7 +397,7 @@ class LinksTrafficRerouter(BaseDerivationStrategy, BaseReroutingStrategy):
 
     """docstring for LinksTrafficRerouter   """
 
-    def optimize(self):
+    def _optimize(self):
 
         for rail_link in self.fn.iter_rail_links(sorted_by=True):
 
@@ -69,53 +427,274 @@ class LinksTrafficRerouter(BaseDerivationStrategy, BaseReroutingStrategy):
 
 class WeakLinksAggregator(BaseDerivationStrategy):
 
-    def optimize(self):
+    ANALYZING_MSG = "Analyzing derivation of"
+    APPLIED_MSG = "...DERIVED BACK TO ROADWAY!"
 
-        for rail_link in self.fn.iter_rail_links(sorted_by=True):
+    # candidate moves are rail links, derived back to roadway
+    def _get_candidates(self):
+        return [(rail_link.id, rail_link.gauge)
+                for rail_link in self.fn.iter_rail_links(sorted_by=True)
+                if rail_link.tons.get() > 0.0]
 
-            # only check links that has more than zero tons
-            if rail_link.tons.get() > 0.0:
+    def _is_candidate(self, candidate):
+        id_link, gauge = candidate
+        return (self.fn.rail.has_link(id_link, gauge) and
+                self.fn.rail.get_link(id_link, gauge).tons.get() > 0.0)
 
-                print "Analyzing derivation of", rail_link,
+    def _get_element(self, candidate):
+        return self.fn.rail.get_link(*candidate)
 
-                old_cost = self._get_total_cost()
+    def _apply_move(self, candidate):
+        id_link, gauge = candidate
+        return self.fn.derive.link_to_roadway(id_link, gauge,
+                                              self.ALLOW_ORIGINAL)
 
-                # derive all od pairs of a link to roadway network
-                rail_link_id = rail_link.id
-                rail_link_gauge = rail_link.gauge
-                deriv_ods = self.fn.derive.link_to_roadway(rail_link_id,
-                                                           rail_link_gauge,
-                                                           self.ALLOW_ORIGINAL)
-
-                if self._cost_has_increased(old_cost):
-                    self._revert_derivations(deriv_ods)
-                    print "...ok."
+    def _get_footprint(self, candidate):
+        """Return rail links whose tons change deriving the link."""
 
-                else:
-                    print "...DERIVED BACK TO ROADWAY!"
+        id_link, gauge = candidate
+        return set([(id_od_link, rail_od.gauge) for rail_od
+                    in self.fn.rail.get_ods_using_link(id_link, gauge)
+                    for id_od_link in rail_od.links])
 
 
 class WeakOdsAggregator(BaseDerivationStrategy):
 
-    def optimize(self):
-
-        for rail_od in self.fn.iter_rail_ods(sorted_by=True):
-
-            # only check links that has more than zero tons
-            if rail_od.tons.get() > 0.0:
+    ANALYZING_MSG = "Analyzing derivation of"
+    APPLIED_MSG = "...DERIVED BACK TO ROADWAY!"
+
+    # candidate moves are rail od pairs, derived back to roadway
+    def _get_candidates(self):
+        return [(rail_od.id, rail_od.category)
+                for rail_od in self.fn.iter_rail_ods(sorted_by=True)
+                if rail_od.tons.get() > 0.0]
+
+    def _is_candidate(self, candidate):
+        id_od, category = candidate
+        return (self.fn.rail.has_od(id_od, category) and
+                self.fn.rail.get_od(id_od, category).tons.get() > 0.0)
+
+    def _get_element(self, candidate):
+        return self.fn.rail.get_od(*candidate)
+
+    def _apply_move(self, candidate):
+        rail_od = self.fn.rail.get_od(*candidate)
+        road_od = self.fn.derive.od_to_roadway(rail_od, None,
+                                               self.ALLOW_ORIGINAL)
+        return [road_od]
+
+    def _get_footprint(self, candidate):
+        """Return rail links whose tons change deriving the od pair."""
+
+        rail_od = self.fn.rail.get_od(*candidate)
+        return set([(id_link, rail_od.gauge) for id_link in rail_od.links])
+
+
+class ModalSplitAnnealer(BaseDerivationStrategy):
+
+    """Simulated annealing over the modal split of derivable od pairs.
+
+    The state is the set of derivable od pairs sent back to roadway. Every
+    move either toggles the mode of a single od pair or toggles all the od
+    pairs using a rail link (to roadway if any of them is in railway, back to
+    railway otherwise). Moves are costed incrementally and accepted if they
+    reduce total cost or, with a probability decreasing with the temperature,
+    if they increase it. When the budget of evaluations (or seconds) is
+    spent, the best configuration found is restored.
+
+    Temperatures are relative to the total cost of the network when the
+    optimization starts, but never lower than MIN_TEMPERATURE_SHARE of the
+    mean absolute cost delta of the moves evaluated, so they keep the scale
+    of the moves whatever the cost of the network is (even with no cost)."""
+
+    INITIAL_TEMPERATURE = 0.0001
+    FINAL_TEMPERATURE = 0.0000001
+    MIN_TEMPERATURE_SHARE = 0.01
+    LINK_MOVES_SHARE = 0.2
+    MAX_EVALUATIONS = 1000
+
+    def __init__(self, fn, incremental=True, max_evaluations=None,
+                 max_seconds=None, seed=None):
+        """
+        Args:
+            fn: FreightNetwork to be optimized.
+            incremental: If True, moves are costed re-costing only links and
+                od pairs changed by the move.
+            max_evaluations: Maximum number of moves to be costed.
+            max_seconds: Maximum seconds the search can take. If neither
+                max_evaluations nor max_seconds are passed, MAX_EVALUATIONS
+                is used.
+            seed: Seed of the random generator, to repeat a search.
+        """
+        super(ModalSplitAnnealer, self).__init__(fn, incremental)
+
+        if not max_evaluations and not max_seconds:
+            max_evaluations = self.MAX_EVALUATIONS
+        self.max_evaluations = max_evaluations
+        self.max_seconds = max_seconds
+        self.random = random.Random(seed)
+
+        # best configuration found
+        self.best_cost = None
+        self.best_on_roadway = None
 
-                print "Analyzing derivation of", rail_od,
-
-                old_cost = self._get_total_cost()
-
-                # derive rail od pair to roadway mode
-                road_od = self.fn.derive.od_to_roadway(rail_od, None,
-                                                       self.ALLOW_ORIGINAL)
-                deriv_ods = [road_od]
+    def optimize(self):
 
-                if self._cost_has_increased(old_cost):
-                    self._revert_derivations(deriv_ods)
-                    print "...ok."
+        ods, links_ods, on_roadway = self._get_search_space()
+        links = sorted(links_ods)
+
+        # there is nothing to move if no od pair is derivable
+        if not ods:
+            print "Annealing has no derivable od pairs to move."
+            return
+
+        start_cost = current_cost = self._get_total_cost()
+        self.best_cost = current_cost
+        self.best_on_roadway = set(on_roadway)
+
+        # sum of absolute cost deltas, the scale of the moves
+        sum_deltas = 0.0
+
+        evaluations = 0
+        accepted_moves = 0
+        start_time = time.time()
+        progress = 0.0
+        while progress < 1.0:
+
+            # choose a random move
+            if links and self.random.random() < self.LINK_MOVES_SHARE:
+                move_ods = links_ods[self.random.choice(links)]
+            else:
+                move_ods = [self.random.choice(ods)]
+            to_roadway, to_railway = self._get_toggles(move_ods, on_roadway)
+
+            self._toggle(to_roadway, to_railway, on_roadway)
+            new_cost = self._get_total_cost()
+            evaluations += 1
+
+            delta = new_cost - current_cost
+            sum_deltas += abs(delta)
+            temperature = self._get_temperature(start_cost, progress,
+                                                sum_deltas / evaluations)
+
+            # moves not increasing cost are always accepted
+            if delta <= 0 or self.random.random() < math.exp(-delta /
+                                                             temperature):
+                current_cost = new_cost
+                accepted_moves += 1
+
+                if current_cost < self.best_cost:
+                    self.best_cost = current_cost
+                    self.best_on_roadway = set(on_roadway)
+
+            else:
+                self._toggle(to_railway, to_roadway, on_roadway)
+
+            progress = self._get_progress(evaluations, start_time)
+
+        # restore best configuration found
+        self._toggle(self.best_on_roadway - on_roadway,
+                     on_roadway - self.best_on_roadway, on_roadway)
+        self.fn.cost_network()
 
-                else:
-                    print "...DERIVED BACK TO ROADWAY!"
+        print "Annealing evaluated", evaluations, "moves in", \
+            round(time.time() - start_time, 1), "seconds, accepting", \
+            accepted_moves, "of them."
+        print "Best configuration found sends", len(self.best_on_roadway), \
+            "of", len(ods), "derivable od pairs back to roadway, with", \
+            "total cost", self.fn.total_cost
+
+    def _get_search_space(self):
+        """Return od pairs and links the search can move.
+
+        Returns: (ods, links_ods, on_roadway)
+            ods: List of (id_od, category) keys of derivable od pairs.
+            links_ods: Dictionary with keys of derivable od pairs using each
+                (id_link, gauge) rail link.
+            on_roadway: Set of keys of derivable od pairs in roadway.
+        """
+
+        ods = sorted([(road_od.id, road_od.category)
+                      for road_od in self.fn.road.iter_od_pairs()
+                      if self.fn.derive.road_od_pair_is_derivable(road_od)])
+
+        on_roadway = set([key for key in ods
+                          if not self._is_in_railway(key)])
+
+        derivable = set(ods)
+        links_ods = {}
+        for rail_link in self.fn.rail.iter_links():
+            link_ods = [(rail_od.id, rail_od.category) for rail_od in
+                        self.fn.rail.get_ods_using_link(rail_link.id,
+                                                        rail_link.gauge)]
+            link_ods = [key for key in link_ods if key in derivable]
+            if link_ods:
+                links_ods[(rail_link.id, rail_link.gauge)] = link_ods
+
+        return ods, links_ods, on_roadway
+
+    def _is_in_railway(self, key):
+        id_od, category = key
+        return (self.fn.rail.has_od(id_od, category) and
+                self.fn.rail.get_od(id_od, category).tons.get_derived() > 0.0)
+
+    def _get_toggles(self, move_ods, on_roadway):
+        """Split od pairs of a move by the mode they will be sent to.
+
+        Returns: (to_roadway, to_railway)
+        """
+
+        in_railway = [key for key in move_ods if key not in on_roadway]
+        if in_railway:
+            return set(in_railway), set()
+        else:
+            return set(), set(move_ods)
+
+    def _toggle(self, to_roadway, to_railway, on_roadway):
+        """Derive od pairs between modes, keeping the set of those in roadway.
+
+        Args:
+            to_roadway: Keys of rail od pairs to be derived to roadway.
+            to_railway: Keys of road od pairs to be derived to railway.
+            on_roadway: Set of keys of od pairs in roadway, to be updated.
+        """
+
+        for key in sorted(to_roadway):
+            self.fn.derive.od_to_roadway(self.fn.rail.get_od(*key), None,
+                                         self.ALLOW_ORIGINAL)
+            on_roadway.add(key)
+
+        for key in sorted(to_railway):
+            self.fn.derive.od_to_railway(self.fn.road.get_od(*key))
+            on_roadway.discard(key)
+
+    def _get_temperature(self, start_cost, progress, delta_scale):
+        """Return the temperature at some progress of the search.
+
+        It cools down geometrically from INITIAL_TEMPERATURE to
+        FINAL_TEMPERATURE of the cost, but never below MIN_TEMPERATURE_SHARE
+        of the scale of cost deltas.
+
+        Args:
+            start_cost: Total cost when the optimization started.
+            progress: Share of the budget already spent.
+            delta_scale: Mean absolute cost delta of the moves evaluated.
+        """
+
+        temperature = self.INITIAL_TEMPERATURE * abs(start_cost) * \
+            (self.FINAL_TEMPERATURE / self.INITIAL_TEMPERATURE) ** progress
+
+        return max(temperature, self.MIN_TEMPERATURE_SHARE * delta_scale)
+
+    def _get_progress(self, evaluations, start_time):
+        """Return the share of the budget already spent."""
+
+        progress = 0.0
+        if self.max_evaluations:
+            progress = max(progress,
+                           evaluations / float(self.max_evaluations))
+        if self.max_seconds:
+            progress = max(progress,
+                           (time.time() - start_time) / self.max_seconds)
+
+        return progress
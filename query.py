@@ -0,0 +1,123 @@
+import sys
+from snapshot import BuildSnapshot
+
+"""
+    Quick queries to a build snapshot of the freight network from the command
+    line. They are answered from the index of the snapshot, without loading
+    the networks nor importing the model, so they can be called from scripts
+    many times:
+
+        python query.py path Railway 1-3
+        python query.py summary data/freight_network.restricted.snapshot
+
+    The snapshot must be built from the current excel inputs (see
+    build-snapshot in freight_network.py).
+"""
+
+SUMMARY_FIELDS = ["od_pairs", "links", "ton", "ton_km", "average_distance",
+                  "dimension", "density"]
+
+
+def get_index(path=None):
+    """Return the index of a valid build snapshot, or None."""
+
+    snapshot = BuildSnapshot.open(path)
+    if not snapshot:
+        return None
+
+    return snapshot.load_index()
+
+
+def query_path(index, mode, id_od):
+    """Return lines with the path of every category of an od pair.
+
+    Od pairs are found with their nodes in any order (eg. "3-1" is "1-3")."""
+
+    network = _get_network(index, mode)
+    id_od = _get_safe_id(id_od)
+    if id_od not in network["od_pairs"]:
+        raise KeyError("No od pair " + id_od + " in " + mode + " network")
+
+    lines = []
+    for category, path, gauge, dist, ton in sorted(network["od_pairs"][id_od]):
+        lines.append("\t".join([str(category), str(path), str(gauge),
+                                "{:.1f}".format(dist or 0.0),
+                                "{:.1f}".format(ton)]))
+
+    return lines
+
+
+def query_summary(index):
+    """Return lines with the summary of every network of the snapshot."""
+
+    lines = ["\t".join(["mode"] + SUMMARY_FIELDS)]
+    for mode, network in sorted(index.iteritems()):
+        summary = network["summary"]
+        lines.append("\t".join([mode] + [str(summary[field])
+                                         for field in SUMMARY_FIELDS]))
+
+    return lines
+
+
+def _get_safe_id(id_od):
+    """Return id of an od pair with its lowest node first, as od pairs are
+    kept (see BasePath._get_safe_id). Ids that are not two nodes are kept."""
+
+    try:
+        nodes = sorted(int(node) for node in id_od.split("-"))
+    except ValueError:
+        return id_od
+
+    if len(nodes) != 2:
+        return id_od
+
+    return str(nodes[0]) + "-" + str(nodes[1])
+
+
+def _get_network(index, mode):
+
+    for mode_name, network in index.iteritems():
+        if mode_name.lower() == mode.lower():
+            return network
+
+    raise KeyError("No " + mode + " network in the snapshot")
+
+
+def main(args):
+    """Answer a query, printing its result.
+
+    Args:
+        args: ["path", mode, id_od, (snapshot)] or ["summary", (snapshot)].
+
+    Returns:
+        Exit status of the command.
+    """
+
+    if args[:1] == ["path"] and len(args) in (3, 4):
+        query, query_args, path = query_path, args[1:3], args[3:4]
+    elif args[:1] == ["summary"] and len(args) in (1, 2):
+        query, query_args, path = query_summary, [], args[1:2]
+    else:
+        print >> sys.stderr, \
+            "Usage: query.py path <mode> <id_od> [snapshot]\n" + \
+            "       query.py summary [snapshot]"
+        return 2
+
+    index = get_index(*path)
+    if not index:
+        print >> sys.stderr, "Build snapshot is missing or out of date, " + \
+            "run: python freight_network.py build-snapshot"
+        return 1
+
+    try:
+        lines = query(index, *query_args)
+    except KeyError as error:
+        print >> sys.stderr, error.args[0]
+        return 1
+
+    print "\n".join(lines)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,253 @@
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from freight_network import FreightNetwork
+from modules import ScenariosReport
+from dijkstra.modules import get_file_name
+
+"""
+    Batch runner of freight network scenarios. Scenarios are read from a
+    JSON or CSV file, base networks are built only once and every scenario
+    branches from a snapshot of them, in parallel worker processes. Results
+    of all scenarios are written to one consolidated report.
+"""
+
+# base networks and snapshots held by each worker process of a batch
+_worker_bases = None
+_worker_metrics_dir = None
+
+
+def _init_worker(bases, metrics_dir=None):
+    global _worker_bases, _worker_metrics_dir
+    _worker_bases = bases
+    _worker_metrics_dir = metrics_dir
+
+
+def _run_scenario(scenario):
+    """Run a scenario with the base networks of a worker."""
+
+    fn, baseline = _worker_bases[scenario["restrictions"]]
+
+    return ScenarioRunner.run_scenario(fn, baseline, scenario,
+                                       _worker_metrics_dir)
+
+
+class ScenarioRunner(object):
+
+    """Runs a batch of scenarios branching from common base networks.
+
+    A scenario is a dictionary with a name, a projection factor, whether
+    restricted links are removed or not and the derivation policy applied to
+    the current situation (one of POLICIES). Base networks are built once for
+    each restrictions value used, costed at the current situation and
+    snapshotted; every scenario restores that snapshot projecting its tons,
+    applies its policy and is costed."""
+
+    DEFAULTS = {"projection_factor": 1.0,
+                "restrictions": False,
+                "policy": "current"}
+
+    POLICIES = {
+        "current": lambda fn: None,
+        "all_to_railway": lambda fn: fn.derive.all_to_railway(),
+        "all_to_roadway": lambda fn: fn.derive.all_to_roadway(),
+        "min_cost": lambda fn: fn.min_network_cost(),
+        "rerouting": lambda fn: fn.min_network_cost_rerouting_links(),
+        "annealing": lambda fn: fn.min_network_cost_annealing()
+    }
+
+    FIELDS = ["name", "projection_factor", "restrictions", "policy",
+              "total_cost", "rail_total_cost", "road_total_cost",
+              "rail_ton", "road_ton", "rail_ton_km", "road_ton_km",
+              "rail_cost_tk", "road_cost_tk", "seconds"]
+
+    def __init__(self, scenarios, processes=1, xl_report=None,
+                 metrics_dir=None):
+        """
+        Args:
+            scenarios: List of scenario dictionaries (see load_scenarios).
+            processes: Number of worker processes running scenarios in
+                parallel. If 1, scenarios are run one after the other.
+            xl_report (opt): Path to excel file of the consolidated report.
+            metrics_dir (opt): Directory where timers and counters of each
+                scenario are written, as "<name>.json" (name made safe
+                for a file name).
+        """
+
+        self.scenarios = [self._complete_scenario(scenario, i)
+                          for i, scenario in enumerate(scenarios)]
+        self.processes = processes
+        self.xl_report = xl_report
+        self.metrics_dir = metrics_dir
+
+    # PUBLIC
+    @classmethod
+    def load_scenarios(cls, path):
+        """Read a list of scenarios from a JSON or CSV file.
+
+        A JSON file has a list of objects and a CSV file a row for each
+        scenario, both with some of the keys: name, projection_factor,
+        restrictions and policy. Missing keys take DEFAULTS values.
+
+        Args:
+            path: Path to the file with the scenarios.
+        """
+
+        extension = os.path.splitext(path)[1].lower()
+
+        if extension == ".json":
+            with open(path) as f:
+                scenarios = json.load(f)
+
+        elif extension == ".csv":
+            with open(path, "rb") as f:
+                scenarios = [{key: value for key, value in row.iteritems()
+                              if value != ""} for row in csv.DictReader(f)]
+
+        else:
+            raise ValueError("Scenarios file must be .json or .csv: " + path)
+
+        return scenarios
+
+    def run(self):
+        """Run all scenarios and write the consolidated report.
+
+        Returns:
+            List with a dictionary of results (see FIELDS) of each scenario,
+                in the order scenarios were given.
+        """
+
+        if self.metrics_dir and not os.path.isdir(self.metrics_dir):
+            os.makedirs(self.metrics_dir)
+
+        bases = self._build_bases()
+
+        if self.processes > 1:
+            pool = multiprocessing.Pool(self.processes, _init_worker,
+                                        (bases, self.metrics_dir))
+            try:
+                results = pool.map(_run_scenario, self.scenarios, 1)
+            finally:
+                pool.close()
+                pool.join()
+
+        else:
+            _init_worker(bases, self.metrics_dir)
+            results = [_run_scenario(scenario)
+                       for scenario in self.scenarios]
+
+        ScenariosReport(self.xl_report).report_to_excel(self.FIELDS, results)
+
+        return results
+
+    @classmethod
+    def run_scenario(cls, fn, baseline, scenario, metrics_dir=None):
+        """Run a scenario branching from the baseline of a freight network.
+
+        Args:
+            fn: FreightNetwork the baseline snapshot was taken from.
+            baseline: Snapshot of fn at the current situation.
+            scenario: Complete scenario dictionary.
+            metrics_dir (opt): Directory where timers and counters of the
+                scenario are written.
+
+        Returns:
+            Dictionary with the results of the scenario (see FIELDS).
+        """
+
+        print "Running scenario", scenario["name"]
+        start = time.time()
+        fn.reset_metrics()
+
+        fn.restore(tuple(snapshot.project(scenario["projection_factor"])
+                         for snapshot in baseline))
+        cls.POLICIES[scenario["policy"]](fn)
+        fn.cost_network()
+
+        result = dict(scenario)
+        result["total_cost"] = fn.total_cost
+        for prefix, mn in [("rail_", fn.rail), ("road_", fn.road)]:
+            result[prefix + "total_cost"] = mn.total_cost
+            result[prefix + "ton"] = mn.ton
+            result[prefix + "ton_km"] = mn.ton_km
+            result[prefix + "cost_tk"] = mn.total_cost_tk
+        result["seconds"] = time.time() - start
+
+        if metrics_dir:
+            file_name = get_file_name(scenario["name"]) + ".json"
+            fn.metrics().write(os.path.join(metrics_dir, file_name))
+
+        return result
+
+    # PRIVATE
+    def _complete_scenario(self, scenario, index):
+        """Fill missing keys of a scenario and convert values read as text."""
+
+        complete = dict(self.DEFAULTS)
+        complete["name"] = "scenario " + str(index + 1)
+        complete.update(scenario)
+
+        complete["projection_factor"] = float(complete["projection_factor"])
+        if isinstance(complete["restrictions"], basestring):
+            complete["restrictions"] = (complete["restrictions"].lower() in
+                                        ("true", "yes", "1"))
+
+        if complete["policy"] not in self.POLICIES:
+            raise ValueError("Unknown policy " + complete["policy"] +
+                             " in scenario " + complete["name"])
+
+        return complete
+
+    def _build_bases(self):
+        """Build and snapshot a freight network for each restrictions value.
+
+        Returns:
+            Dictionary with a (FreightNetwork, snapshot) tuple by
+                restrictions value.
+        """
+
+        bases = {}
+        for restrictions in set(scenario["restrictions"]
+                                for scenario in self.scenarios):
+            fn = FreightNetwork(restrictions=restrictions)
+            fn.cost_network()
+            bases[restrictions] = (fn, fn.snapshot())
+
+            # building the base networks is not part of any scenario
+            if self.metrics_dir:
+                name = "base restricted" if restrictions else "base"
+                file_name = get_file_name(name) + ".json"
+                fn.metrics().write(os.path.join(self.metrics_dir, file_name))
+
+        return bases
+
+
+def main(path, processes=None, metrics_dir=None):
+    """Run the scenarios of a file and report them all together."""
+
+    scenarios = ScenarioRunner.load_scenarios(path)
+    runner = ScenarioRunner(scenarios,
+                            processes or multiprocessing.cpu_count(),
+                            metrics_dir=metrics_dir)
+
+    return runner.run()
+
+
+if __name__ == '__main__':
+
+    # parse arguments if called with arguments
+    if len(sys.argv) == 4:
+        main(sys.argv[1], int(sys.argv[2]), sys.argv[3])
+
+    elif len(sys.argv) == 3:
+        main(sys.argv[1], int(sys.argv[2]))
+
+    elif len(sys.argv) == 2:
+        main(sys.argv[1])
+
+    else:
+        print "Usage: python scenarios.py scenarios_file [processes]",
+        print "[metrics_dir]"
@@ -0,0 +1,383 @@
+import copy
+import cPickle
+import gc
+import hashlib
+import os
+import sys
+
+"""
+    Snapshots of the state of modal networks. Scenarios can branch from a
+    common baseline restoring a snapshot in memory, instead of building the
+    networks again from the excel inputs, and fully built networks can be
+    saved to a build snapshot file to start later runs without building them.
+"""
+
+
+def get_ods_state(mn, pathless=False):
+    """Return tons and path of every od pair of a modal network.
+
+    Args:
+        mn: Modal network.
+        pathless: If True, state of od pairs removed for having no path.
+
+    Returns:
+        Dictionary with (original_ton, derived_ton, path, gauge) of every
+            od pair by its (id_od, category) key.
+    """
+
+    return {(od.id, od.category): (od.tons.get_original(),
+                                   od.tons.get_derived(),
+                                   od.path, od.gauge)
+            for od in mn.iter_od_pairs(pathless=pathless)}
+
+
+def set_ods_state(mn, ods_state):
+    """Set tons and paths of od pairs, loading their tons to the links.
+
+    Od pairs of the network not in the state keep no tons.
+
+    Args:
+        mn: Modal network.
+        ods_state: Dictionary returned by get_ods_state.
+    """
+
+    for link in mn.iter_links():
+        link.tons.tons = {"original": {}, "derived": {}}
+        link.tons.notify_change()
+
+    for od in list(mn.iter_od_pairs()):
+        if (od.id, od.category) not in ods_state:
+            od.tons.tons = {"original": 0.0, "derived": 0.0}
+            od.tons.notify_change()
+
+    for (id_od, category), state in ods_state.iteritems():
+        original_ton, derived_ton, path, gauge = state
+
+        od = mn.get_od(id_od, category)
+        if od.path != path or od.gauge != gauge:
+            od.set_path(path, gauge)
+            od.calc_distance(mn.links)
+
+        od.tons.tons = {"original": original_ton, "derived": derived_ton}
+        od.tons.notify_change()
+
+        for id_link in od.links:
+            link = mn.get_link(id_link, od.gauge)
+            link.tons.add_original(original_ton, category, id_od)
+            link.tons.add_derived(derived_ton, category, id_od)
+
+    mn.incremental_cost.invalidate()
+
+
+def hash_files(paths):
+    """Return a hash of the names and contents of some files.
+
+    Missing files are hashed by their names only, so creating them changes
+    the hash too."""
+
+    sha = hashlib.sha1()
+    for path in paths:
+        sha.update(path + "\0")
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 16), ""):
+                    sha.update(chunk)
+        sha.update("\0")
+
+    return sha.hexdigest()
+
+
+def copy_networks(networks, protocol=2):
+    """Return independent copies of networks, through a pickle round trip.
+
+    Args:
+        networks: Tuple of modal networks to be copied together.
+        protocol (opt): Pickle protocol used.
+    """
+
+    # networks are deeply nested structures of objects
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+
+    return cPickle.loads(cPickle.dumps(networks, protocol))
+
+
+class NetworkSnapshot(object):
+
+    """In memory snapshot of the state of a modal network.
+
+    It keeps the tons and paths of the od pairs of the network (those
+    removed for having no path too) and references to its links, so links
+    removed after the snapshot can be put back. Restoring it returns the
+    network to the modal split it had when the snapshot was taken, and the
+    same snapshot can be restored many times."""
+
+    def __init__(self, mn):
+        """
+        Args:
+            mn: Modal network whose state is taken.
+        """
+
+        self.links = {id_link: dict(gauges)
+                      for id_link, gauges in mn.links.iteritems()}
+        self.od_pairs_removed = {id_od: dict(categories) for id_od, categories
+                                 in mn.od_pairs_removed.iteritems()}
+
+        self.projection_factor = mn.projection_factor
+        self.ods_state = get_ods_state(mn)
+        self.pathless_ods_state = get_ods_state(mn, pathless=True)
+
+    # PUBLIC
+    def restore(self, mn):
+        """Return a modal network to the state of the snapshot.
+
+        Args:
+            mn: Modal network the snapshot was taken from.
+        """
+
+        self._restore_links(mn)
+        self._restore_od_pairs(mn)
+
+        set_ods_state(mn, self.ods_state)
+
+        for od in mn.iter_od_pairs(pathless=True):
+            original_ton, derived_ton, path, gauge = \
+                self.pathless_ods_state[(od.id, od.category)]
+            od.tons.tons = {"original": original_ton, "derived": derived_ton}
+
+        # tons are projected as if the network was built projecting them
+        mn.projection_factor = self.projection_factor
+        for pathless in (False, True):
+            for od in mn.iter_od_pairs(pathless=pathless):
+                od.tons.projection_factor = self.projection_factor
+
+    def project(self, projection_factor):
+        """Return a copy of the snapshot with projected tons.
+
+        Restoring it is the same as building the network with a projection
+        factor, as tons are projected after the snapshot modal split.
+
+        Args:
+            projection_factor: Factor to project tons of od pairs.
+        """
+
+        projected = copy.copy(self)
+        projected.projection_factor = self.projection_factor * \
+            projection_factor
+        projected.ods_state = self._project_state(self.ods_state,
+                                                  projection_factor)
+        projected.pathless_ods_state = self._project_state(
+            self.pathless_ods_state, projection_factor)
+
+        return projected
+
+    # PRIVATE
+    def _project_state(self, ods_state, projection_factor):
+
+        return {key: (original_ton * projection_factor,
+                      derived_ton * projection_factor, path, gauge)
+                for key, (original_ton, derived_ton, path, gauge)
+                in ods_state.iteritems()}
+
+    def _restore_links(self, mn):
+        """Put back links removed after the snapshot was taken."""
+
+        links = {id_link: dict(gauges)
+                 for id_link, gauges in self.links.iteritems()}
+
+        if links != mn.links:
+            mn.links = links
+            mn.tracker.bump_links()
+
+    def _restore_od_pairs(self, mn):
+        """Remove od pairs created after the snapshot was taken."""
+
+        for od in list(mn.iter_od_pairs()):
+            if (od.id, od.category) not in self.ods_state:
+                od.detach_index()
+                del mn.od_pairs[od.id][od.category]
+                if not mn.od_pairs[od.id]:
+                    del mn.od_pairs[od.id]
+                mn.tracker.bump_structure()
+
+        mn.od_pairs_removed = {id_od: dict(categories) for id_od, categories
+                               in self.od_pairs_removed.iteritems()}
+
+
+class BuildSnapshot(object):
+
+    """Fully built railway and roadway networks saved to a single file.
+
+    The file starts with a header (MAGIC, format VERSION, input files the
+    networks were built from with their hash and the settings of the build),
+    followed by a small index of the networks and then the pickled networks,
+    so a snapshot can be checked and queried without loading them. A
+    snapshot is only loaded if its version, input hash and settings are the
+    ones expected: otherwise the networks have to be built again from the
+    inputs. VERSION must be increased whenever networks change in a way old
+    snapshots don't have.
+
+    The index has, by mode name (eg. "Railway"), a "summary" of the network
+    (number of od pairs and links, tons, ton-km, average distance, dimension
+    and density) and the "od_pairs" with their (category, path, gauge,
+    distance, tons) by id_od."""
+
+    MAGIC = "FTN-BUILD-SNAPSHOT"
+    VERSION = 3
+    PICKLE_PROTOCOL = 2
+    PATH = "data/freight_network.snapshot"
+
+    def __init__(self, path, input_files, settings=None):
+        """
+        Args:
+            path: File of the snapshot.
+            input_files: List of files the networks are built from.
+            settings (opt): Dictionary with the settings of the build (eg.
+                projection_factor), that must match to load the snapshot.
+        """
+
+        self.path = path
+        self.input_files = input_files
+        self.settings = settings or {}
+        self._input_hash = None
+
+    # PUBLIC
+    @classmethod
+    def open(cls, path=None):
+        """Return the build snapshot saved in a file, checked against the
+        inputs and settings it was built with.
+
+        Args:
+            path (opt): File of the snapshot (PATH by default).
+
+        Returns:
+            BuildSnapshot, or None if the file is not a build snapshot of
+                this VERSION.
+        """
+
+        header = cls._read_header(path or cls.PATH)
+        if (not header or header.get("magic") != cls.MAGIC or
+                header.get("version") != cls.VERSION):
+            return None
+
+        return cls(path or cls.PATH, header["input_files"],
+                   header["settings"])
+
+    @property
+    def input_hash(self):
+
+        if not self._input_hash:
+            self._input_hash = hash_files(self.input_files)
+
+        return self._input_hash
+
+    def get_header(self):
+        return {"magic": self.MAGIC,
+                "version": self.VERSION,
+                "input_files": self.input_files,
+                "input_hash": self.input_hash,
+                "settings": self.settings}
+
+    def is_valid(self):
+        """Check the snapshot exists and was built from the current inputs
+        with the same settings."""
+
+        return self._read_header(self.path) == self.get_header()
+
+    def save(self, rail, road):
+        """Save built railway and roadway networks, replacing the file only
+        when it's complete."""
+
+        # networks are deeply nested structures of objects
+        sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as f:
+            cPickle.dump(self.get_header(), f, self.PICKLE_PROTOCOL)
+            cPickle.dump(self.get_index([rail, road]), f,
+                         self.PICKLE_PROTOCOL)
+            cPickle.dump((rail, road), f, self.PICKLE_PROTOCOL)
+
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+        os.rename(temp_path, self.path)
+
+    def load(self):
+        """Load railway and roadway networks of the snapshot.
+
+        Returns:
+            Tuple (rail, road), or None if the snapshot is not valid for the
+                current inputs and settings.
+        """
+
+        if not self.is_valid():
+            return None
+
+        sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+
+        # garbage collection is useless while unpickling millions of objects
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with open(self.path, "rb") as f:
+                cPickle.load(f)
+                cPickle.load(f)
+                return cPickle.load(f)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def load_index(self):
+        """Load the index of the networks of the snapshot (see BuildSnapshot),
+        without loading the networks.
+
+        Returns:
+            Dictionary with the index, or None if the snapshot is not valid
+                for the current inputs and settings.
+        """
+
+        if not self.is_valid():
+            return None
+
+        with open(self.path, "rb") as f:
+            cPickle.load(f)
+            return cPickle.load(f)
+
+    @classmethod
+    def get_index(cls, networks):
+        """Return the index of some modal networks, by mode name."""
+
+        index = {}
+        for mn in networks:
+            od_pairs = {}
+            for od in mn.iter_od_pairs():
+                od_pairs.setdefault(od.id, []).append(
+                    (od.category, od.path, od.gauge, od.dist, od.tons.get()))
+
+            index[mn.MODE_NAME] = {
+                "summary": {"od_pairs": len(list(mn.iter_od_pairs())),
+                            "links": len(list(mn.iter_links())),
+                            "ton": mn.ton,
+                            "ton_km": mn.ton_km,
+                            "average_distance": mn.average_distance,
+                            "dimension": mn.dimension,
+                            "density": mn.density},
+                "od_pairs": od_pairs}
+
+        return index
+
+    # PRIVATE
+    @classmethod
+    def _read_header(cls, path):
+
+        if not os.path.isfile(path):
+            return None
+
+        try:
+            with open(path, "rb") as f:
+                return cPickle.load(f)
+        except Exception:
+            return None
@@ -0,0 +1,440 @@
+import heapq
+import math
+import os
+import random
+import StringIO
+from openpyxl import Workbook, load_workbook
+from modal_networks import RailwayNetwork, RoadwayNetwork
+from modules import RailwayNetworkBuilder, RoadwayNetworkBuilder
+from freight_network import FreightNetwork
+
+"""
+    Generator of synthetic bimodal freight networks. Networks of any size are
+    generated as the same tables the model reads from the excel inputs in
+    "data", so they can be written to workbooks or built directly in memory,
+    to find out how the model behaves with networks bigger than the real one.
+"""
+
+
+class SyntheticNetworkGenerator(object):
+
+    """Generates the inputs of a random railway and roadway network.
+
+    Nodes are placed at random on a square. Roadway links join every node
+    with its nearest ones, and railway links do the same for a share of the
+    nodes, split in bands of different gauges (there are no paths between
+    gauges). Roadway od pairs join random nodes and railway od pairs random
+    railway nodes of the same gauge, with lognormal tons and categories
+    drawn from a categories mix. Paths of all od pairs are the shortest ones
+    and parameters are taken from the real inputs, with optional overrides.
+
+    Tables are kept as lists of rows, with the layout of the workbooks
+    loaded by modules.builder."""
+
+    GAUGES = ["ancha", "media", "angosta"]
+    ROAD_GAUGE = "unica"
+
+    # share of tons of od pairs by railway category (0 is never derivable)
+    CATEGORIES_MIX = {0: 0.3, 1: 0.2, 2: 0.15, 3: 0.15, 4: 0.1, 5: 0.1}
+
+    # average kilometers between a node and its nearest one
+    KM_BY_NODE = 60.0
+
+    # links are longer than the straight line between their nodes
+    RAIL_DETOUR = 1.15
+    ROAD_DETOUR = 1.25
+
+    # median tons of od pairs and dispersion of its logarithm
+    MEDIAN_TONS = 5000.0
+    TONS_SIGMA = 1.5
+
+    XL_PARAMETERS = {"railway": RailwayNetworkBuilder.XL_PARAMETERS,
+                     "roadway": RoadwayNetworkBuilder.XL_PARAMETERS}
+    XL_NAMES = ["parameters", "od_pairs", "links", "paths",
+                "restricted_links"]
+
+    def __init__(self, nodes=100, links_by_node=3, rail_nodes_share=0.6,
+                 gauges=None, od_pairs=1000, rail_od_pairs_share=0.2,
+                 categories_mix=None, restricted_links_share=0.05,
+                 params=None, seed=None):
+        """
+        Args:
+            nodes: Number of nodes of the network.
+            links_by_node: Number of nearest nodes each node is linked to.
+            rail_nodes_share: Share of nodes with railway access.
+            gauges (opt): List of railway gauges.
+            od_pairs: Number of roadway od pairs.
+            rail_od_pairs_share: Number of railway od pairs, as a share of
+                roadway ones.
+            categories_mix (opt): Dictionary with the probability of each
+                railway category (see CATEGORIES_MIX).
+            restricted_links_share: Share of railway links restricted.
+            params (opt): Dictionary with parameters of "railway" and
+                "roadway" overriding those of the real inputs.
+            seed (opt): Seed of the random generator, to repeat a network.
+        """
+
+        self.nodes = nodes
+        self.links_by_node = links_by_node
+        self.rail_nodes_share = rail_nodes_share
+        self.gauges = gauges or self.GAUGES
+        self.od_pairs = od_pairs
+        self.rail_od_pairs_share = rail_od_pairs_share
+        self.categories_mix = categories_mix or self.CATEGORIES_MIX
+        self.restricted_links_share = restricted_links_share
+        self.params = params or {}
+        self.random = random.Random(seed)
+
+        # tables of each mode, generated once
+        self.tables = None
+
+    # PUBLIC
+    def generate(self):
+        """Generate tables of railway and roadway inputs.
+
+        Returns:
+            Dictionary with the tables (lists of rows, with a header row) of
+                each input of each mode: tables[mode][xl_name].
+        """
+
+        if self.tables:
+            return self.tables
+
+        coords = self._place_nodes()
+        rail_gauges = self._assign_gauges(coords)
+
+        road_links = self._create_links(coords, coords.keys(),
+                                        self.ROAD_DETOUR)
+        rail_links = {}
+        for gauge in self.gauges:
+            gauge_nodes = [node for node in rail_gauges
+                           if rail_gauges[node] == gauge]
+            for key, dist in self._create_links(coords, gauge_nodes,
+                                                self.RAIL_DETOUR).iteritems():
+                rail_links[key] = (dist, gauge)
+
+        road_ods = self._create_od_pairs(coords.keys(), self.od_pairs)
+        rail_ods = self._create_od_pairs(
+            rail_gauges.keys(),
+            int(self.od_pairs * self.rail_od_pairs_share), rail_gauges,
+            with_category_zero=False)
+
+        # both modes need paths of every od pair that can be derived
+        ids_od = sorted(set(road_ods) | set(rail_ods))
+
+        self.tables = {
+            "roadway": self._get_mode_tables(
+                "roadway", road_ods,
+                {key: (dist, self.ROAD_GAUGE)
+                 for key, dist in road_links.iteritems()},
+                ids_od, restricted_share=0.0),
+            "railway": self._get_mode_tables(
+                "railway", rail_ods, rail_links, ids_od,
+                self.restricted_links_share)}
+
+        return self.tables
+
+    def get_workbooks(self):
+        """Return in memory workbooks of railway and roadway inputs.
+
+        Returns:
+            Dictionary with a file-like object of each input of each mode:
+                workbooks[mode][xl_name]. New objects are returned with every
+                call, as they are consumed when loaded.
+        """
+
+        if not hasattr(self, "_workbooks_data"):
+            self._workbooks_data = {}
+            for mode, tables in self.generate().iteritems():
+                self._workbooks_data[mode] = {}
+                for xl_name, table in tables.iteritems():
+                    output = StringIO.StringIO()
+                    self._create_workbook(table).save(output)
+                    self._workbooks_data[mode][xl_name] = output.getvalue()
+
+        return {mode: {xl_name: StringIO.StringIO(data)
+                       for xl_name, data in workbooks.iteritems()}
+                for mode, workbooks in self._workbooks_data.iteritems()}
+
+    def write_workbooks(self, directory):
+        """Write workbooks of railway and roadway inputs to a directory.
+
+        Workbooks are named as those in "data" (eg. railway_links.xlsx).
+
+        Returns:
+            Dictionary with the path of each input of each mode:
+                paths[mode][xl_name].
+        """
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        paths = {}
+        for mode, workbooks in self.get_workbooks().iteritems():
+            paths[mode] = {}
+            for xl_name, workbook in workbooks.iteritems():
+                path = os.path.join(directory, mode + "_" + xl_name + ".xlsx")
+                with open(path, "wb") as f:
+                    f.write(workbook.getvalue())
+                paths[mode][xl_name] = path
+
+        return paths
+
+    def build(self, projection_factor=1.0, restrictions=False,
+              directory=None):
+        """Build a FreightNetwork with the generated network.
+
+        Args:
+            projection_factor: Factor to project tons of od pairs.
+            restrictions: If True, restricted links are removed.
+            directory (opt): If passed, workbooks are written there and
+                loaded from disk, otherwise they are loaded from memory.
+        """
+
+        if directory:
+            inputs = self.write_workbooks(directory)
+        else:
+            inputs = self.get_workbooks()
+
+        rail = RailwayNetwork(self._get_builder(RailwayNetworkBuilder,
+                                                inputs["railway"]),
+                              projection_factor, restrictions)
+        road = RoadwayNetwork(self._get_builder(RoadwayNetworkBuilder,
+                                                inputs["roadway"]),
+                              projection_factor, restrictions)
+
+        return FreightNetwork(rail, road)
+
+    # PRIVATE
+    def _place_nodes(self):
+        """Return random coordinates (in km) of every node."""
+
+        side = self.KM_BY_NODE * math.sqrt(self.nodes)
+
+        return {node: (self.random.uniform(0, side),
+                       self.random.uniform(0, side))
+                for node in xrange(1, self.nodes + 1)}
+
+    def _assign_gauges(self, coords):
+        """Return the gauge of each node with railway access.
+
+        Gauges are assigned by vertical bands, so each gauge has its own
+        region of the network."""
+
+        side = self.KM_BY_NODE * math.sqrt(self.nodes)
+        rail_nodes = self.random.sample(
+            sorted(coords), int(round(self.nodes * self.rail_nodes_share)))
+
+        return {node: self.gauges[min(int(coords[node][0] / side *
+                                          len(self.gauges)),
+                                      len(self.gauges) - 1)]
+                for node in rail_nodes}
+
+    def _create_links(self, coords, nodes, detour):
+        """Link nodes with their nearest ones, keeping all of them connected.
+
+        Returns:
+            Dictionary with the distance of each (node_a, node_b) link.
+        """
+
+        def distance(node_a, node_b):
+            (xa, ya), (xb, yb) = coords[node_a], coords[node_b]
+            return max(1, int(round(math.hypot(xa - xb, ya - yb) * detour)))
+
+        def key(node_a, node_b):
+            return (min(node_a, node_b), max(node_a, node_b))
+
+        nodes = sorted(nodes)
+        links = {}
+
+        # link each node with the nearest of the previous ones
+        for i, node in enumerate(nodes[1:], 1):
+            nearest = min(nodes[:i], key=lambda other: distance(node, other))
+            links[key(node, nearest)] = distance(node, nearest)
+
+        # link each node with its nearest ones
+        for node in nodes:
+            others = sorted([other for other in nodes if other != node],
+                            key=lambda other: distance(node, other))
+            for other in others[:self.links_by_node]:
+                links[key(node, other)] = distance(node, other)
+
+        return links
+
+    def _create_od_pairs(self, nodes, number, gauges=None,
+                         with_category_zero=True):
+        """Create od pairs between random nodes (of the same gauge, if
+        gauges are passed).
+
+        Returns:
+            Dictionary with (tons, category) of each od pair id.
+        """
+
+        nodes = sorted(nodes)
+        categories = sorted(category for category in self.categories_mix
+                            if with_category_zero or category != 0)
+
+        # there can't be more od pairs than pairs of nodes
+        max_number = len(nodes) * (len(nodes) - 1) / 2
+        number = min(number, max_number)
+
+        od_pairs = {}
+        attempts = 0
+        while len(od_pairs) < number and attempts < number * 20:
+            attempts += 1
+            node_a, node_b = sorted(self.random.sample(nodes, 2))
+            if gauges and gauges[node_a] != gauges[node_b]:
+                continue
+
+            tons = self.MEDIAN_TONS * math.exp(
+                self.random.gauss(0, self.TONS_SIGMA))
+            category = self._draw_category(categories)
+            od_pairs[str(node_a) + "-" + str(node_b)] = (tons, category)
+
+        return od_pairs
+
+    def _draw_category(self, categories):
+
+        total = sum(self.categories_mix[category] for category in categories)
+        value = self.random.uniform(0, total)
+        for category in categories:
+            value -= self.categories_mix[category]
+            if value <= 0:
+                return category
+
+        return categories[-1]
+
+    def _get_mode_tables(self, mode, od_pairs, links, ids_od,
+                         restricted_share):
+        """Return tables of all the inputs of a mode."""
+
+        links_rows = [[str(node_a) + "-" + str(node_b), dist, gauge]
+                      for (node_a, node_b), (dist, gauge)
+                      in sorted(links.iteritems())]
+
+        restricted = sorted(self.random.sample(
+            links_rows, int(round(len(links_rows) * restricted_share))))
+
+        return {
+            "parameters": self._get_parameters_tables(mode),
+            "od_pairs": ([["id_od", "tons", "category"]] +
+                         [[id_od, tons, category] for id_od, (tons, category)
+                          in sorted(od_pairs.iteritems())]),
+            "links": [["id_link", "dist", "gauge"]] + links_rows,
+            "paths": ([["id_od", "path", "gauge"]] +
+                      self._find_paths(links, ids_od)),
+            "restricted_links": [["id_link", "distance", "gauge"]] + restricted
+        }
+
+    def _get_parameters_tables(self, mode):
+        """Return sheets of parameters of a mode, with overrides applied.
+
+        Returns:
+            List of (sheet title, table) tuples.
+        """
+
+        overrides = self.params.get(mode, {})
+
+        sheets = []
+        for ws in load_workbook(self.XL_PARAMETERS[mode], True):
+            table = []
+            for row in ws.iter_rows():
+                values = ([cell.value for cell in row] + [None] * 3)[:3]
+
+                # empty rows would be written without cells
+                if not any(value is not None for value in values):
+                    continue
+
+                if values[0] in overrides:
+                    values[1] = overrides[values[0]]
+                table.append(values)
+            sheets.append((ws.title, table))
+
+        return sheets
+
+    def _find_paths(self, links, ids_od):
+        """Find the shortest path of od pairs, in the gauge joining them.
+
+        Returns:
+            List of [id_od, path, gauge] rows of od pairs that have a path.
+        """
+
+        graph = {}
+        for (node_a, node_b), (dist, gauge) in links.iteritems():
+            graph.setdefault(node_a, []).append((node_b, dist, gauge))
+            graph.setdefault(node_b, []).append((node_a, dist, gauge))
+
+        # od pairs by origin, to search paths once from each origin
+        destinations = {}
+        for id_od in ids_od:
+            node_a, node_b = [int(node) for node in id_od.split("-")]
+            if node_a in graph and node_b in graph:
+                destinations.setdefault(node_a, []).append(node_b)
+
+        rows = []
+        for origin in sorted(destinations):
+            previous, gauge = self._search_paths(graph, origin)
+            for destination in destinations[origin]:
+                if destination in previous:
+                    path = [destination]
+                    while path[-1] != origin:
+                        path.append(previous[path[-1]])
+                    path.reverse()
+                    rows.append([str(origin) + "-" + str(destination),
+                                 "-".join(str(node).zfill(3)
+                                          for node in path), gauge])
+
+        return rows
+
+    def _search_paths(self, graph, origin):
+        """Dijkstra search of the shortest paths from a node.
+
+        Returns: (previous, gauge)
+            previous: Dictionary with the previous node in the path of each
+                node reached.
+            gauge: Gauge of the links reached from the node.
+        """
+
+        distances = {origin: 0}
+        previous = {}
+        gauge = None
+        queue = [(0, origin)]
+        while queue:
+            distance, node = heapq.heappop(queue)
+            if distance > distances[node]:
+                continue
+
+            for other, dist, link_gauge in graph[node]:
+                gauge = link_gauge
+                if distance + dist < distances.get(other, float("inf")):
+                    distances[other] = distance + dist
+                    previous[other] = node
+                    heapq.heappush(queue, (distance + dist, other))
+
+        return previous, gauge
+
+    def _create_workbook(self, table):
+        """Create a workbook with a table (or a list of titled tables)."""
+
+        wb = Workbook(write_only=True)
+
+        if table and isinstance(table[0], tuple):
+            sheets = table
+        else:
+            sheets = [("Hoja1", table)]
+
+        for title, rows in sheets:
+            ws = wb.create_sheet()
+            ws.title = title
+            for row in rows:
+                ws.append(row)
+
+        return wb
+
+    def _get_builder(self, builder_class, inputs):
+
+        return builder_class(xl_parameters=inputs["parameters"],
+                             xl_od_pairs=inputs["od_pairs"],
+                             xl_links=inputs["links"],
+                             xl_paths=inputs["paths"],
+                             xl_restricted_links=inputs["restricted_links"])
@@ -1,5 +1,10 @@
 import unittest
+import os
+import shutil
+import tempfile
 from freight_network import FreightNetwork
+from checkpoint import Checkpointer
+from snapshot import BuildSnapshot
 from modules.builder.components import OD
 
 
@@ -73,6 +78,76 @@ class FreightNetworkTestCase(unittest.TestCase):
                                                                  categ)
         self.assertAlmostEqual(coefficient, expected_coefficient)
 
+    # @unittest.skip("skip to speed up")
+    def test_get_derivation_coefficients(self):
+
+        ods_ton = [1412010, 100, 50000000, 1412010, 20000, 300000]
+        distances = [216, 2000, 2000, 10, 500, 80]
+        categories = [1, 1, 2, 3, 4, 1]
+        coeffs = self.fn.derive.get_derivation_coefficients(
+            ods_ton, distances, categories)
+
+        for od_ton, distance, category, coeff in zip(ods_ton, distances,
+                                                     categories, coeffs):
+            self.assertAlmostEqual(coeff,
+                                   self.fn.derive._get_derivation_coefficient(
+                                       od_ton, distance, category))
+
+    # @unittest.skip("skip to speed up")
+    def test_path_conditions_cache(self):
+
+        road_od = [road_od for road_od in self.fn.road.iter_od_pairs()
+                   if self.fn.derive.road_od_pair_is_derivable(road_od)][0]
+        conditions = self.fn.derive._get_path_conditions(road_od)
+        self.assertTrue(conditions[0] and conditions[3])
+        self.assertEqual(conditions,
+                         self.fn.derive._calc_path_conditions(road_od))
+
+        # conditions are calculated only once
+        key = (road_od.id, road_od.tons.category)
+        self.fn.derive._path_conditions[key] = "cached"
+        self.assertEqual(self.fn.derive._get_path_conditions(road_od),
+                         "cached")
+
+        # removing a link of the railway path invalidates conditions
+        rail_path = self.fn.rail.get_path(road_od.id)
+        self.fn.rail.remove_link(rail_path.links[0], rail_path.gauge)
+        self.assertNotEqual(self.fn.derive._get_path_conditions(road_od),
+                            "cached")
+
+    # @unittest.skip("skip to speed up")
+    def test_bulk_derivation(self):
+
+        def get_tons(fn):
+            ods_tons = {}
+            links_tons = {}
+            for mn in [fn.rail, fn.road]:
+                for od in mn.iter_od_pairs():
+                    ods_tons[(mn.MODE_NAME, od.id, od.category)] = \
+                        od.tons.get()
+                for link in mn.iter_links():
+                    links_tons[(mn.MODE_NAME, link.id, link.gauge)] = \
+                        link.tons.get()
+            return ods_tons, links_tons
+
+        baseline = self.fn.snapshot()
+
+        # derive od pairs one by one and all at once
+        results = []
+        for bulk in [False, True]:
+            self.fn.restore(baseline)
+            self.fn.derive.all_to_railway(bulk)
+            to_railway = get_tons(self.fn)
+            self.fn.derive.all_to_roadway(bulk)
+            results.append((to_railway, get_tons(self.fn)))
+
+        for one_by_one, bulk in zip(*results):
+            for tons, bulk_tons in zip(one_by_one, bulk):
+                self.assertEqual(set(tons), set(bulk_tons))
+                for key in tons:
+                    self.assertAlmostEqual(tons[key], bulk_tons[key],
+                                           places=5)
+
     # @unittest.skip("skip to speed up")
     def test_consistent_result(self):
 
@@ -118,6 +193,334 @@ class FreightNetworkTestCase(unittest.TestCase):
         self.assertEqual(total_cost_5, total_cost_7)
         self.assertEqual(total_cost_6, total_cost_8)
 
+    # @unittest.skip("skip to speed up")
+    def test_incremental_cost_network(self):
+
+        self.fn.derive.all_to_railway()
+        self.fn.cost_network(incremental=True)
+
+        # derive back to roadway the most loaded rail link
+        rail_link = max(self.fn.rail.iter_links())
+        self.fn.derive.link_to_roadway(rail_link.id, rail_link.gauge)
+
+        self.fn.cost_network(incremental=True)
+        incremental_cost = self.fn.total_cost
+
+        self.fn.cost_network()
+        full_cost = self.fn.total_cost
+
+        # regrouping decisions are only taken again in changed links
+        self.assertAlmostEqual(incremental_cost / full_cost, 1.0, places=3)
+
+    # @unittest.skip("skip to speed up")
+    def test_incremental_optimization(self):
+
+        incremental_fn = FreightNetwork()
+        for fn in (self.fn, incremental_fn):
+            fn.derive.all_to_railway()
+
+        self.fn.min_network_cost_deriving_links(incremental=False)
+        incremental_fn.min_network_cost_deriving_links(incremental=True)
+
+        # close calls are decided on full costs, so the modal split is the same
+        for rail_od in self.fn.rail.iter_od_pairs():
+            incremental_od = incremental_fn.rail.get_od(rail_od.id,
+                                                        rail_od.category)
+            self.assertAlmostEqual(incremental_od.tons.get(),
+                                   rail_od.tons.get(), places=3)
+
+        # and the network is fully costed at the end
+        self.fn.cost_network()
+        self.assertAlmostEqual(incremental_fn.total_cost / self.fn.total_cost,
+                               1.0, places=7)
+
+    # @unittest.skip("skip to speed up")
+    def test_full_cost_decides(self):
+
+        self.fn.derive.all_to_railway()
+        optimizer = self.fn.ODS_OPTIMIZATION_CLASS(self.fn, incremental=True)
+        self.fn.cost_network(incremental=True)
+        cost = self.fn.total_cost
+        optimizer._full_cost = cost
+
+        # incremental costs decrease, but full costs increase
+        optimizer._get_full_cost = lambda: cost + 1.0
+        self.assertTrue(optimizer._cost_has_increased(cost * 1.01))
+        self.assertEqual(optimizer._full_cost, cost)
+
+        # full costs decrease too
+        optimizer._get_full_cost = lambda: cost - 1.0
+        self.assertFalse(optimizer._cost_has_increased(cost * 1.01))
+        self.assertEqual(optimizer._full_cost, cost - 1.0)
+
+    # @unittest.skip("skip to speed up")
+    def test_parallel_scores(self):
+
+        self.fn.derive.all_to_railway()
+        optimizer = self.fn.LINKS_OPTIMIZATION_CLASS(self.fn, processes=2)
+        candidates = optimizer._get_candidates()[:4]
+
+        # workers score moves against copies of the same network state
+        parallel_scores = dict(optimizer._score_in_workers(candidates))
+        scores = dict(optimizer._score_moves(candidates))
+
+        for candidate in candidates:
+            self.assertAlmostEqual(parallel_scores[candidate],
+                                   scores[candidate], delta=1.0)
+
+        # scoring moves doesn't change the network
+        total_cost = self.fn.total_cost
+        self.fn.cost_network()
+        self.assertAlmostEqual(self.fn.total_cost / total_cost, 1.0)
+
+    # @unittest.skip("skip to speed up")
+    def test_parallel_optimization(self):
+
+        sequential_fn = FreightNetwork()
+        for fn in (self.fn, sequential_fn):
+            fn.derive.all_to_railway()
+
+        self.fn.min_network_cost_deriving_links(processes=2)
+        sequential_fn.min_network_cost_deriving_links()
+
+        # best moves first end in the same modal split than the first ones
+        self.fn.cost_network()
+        sequential_fn.cost_network()
+        self.assertAlmostEqual(self.fn.total_cost / sequential_fn.total_cost,
+                               1.0, places=7)
+        for rail_od in self.fn.rail.iter_od_pairs():
+            sequential_od = sequential_fn.rail.get_od(rail_od.id,
+                                                      rail_od.category)
+            self.assertAlmostEqual(rail_od.tons.get(),
+                                   sequential_od.tons.get(), places=3)
+
+    # @unittest.skip("skip to speed up")
+    def test_lazy_optimization(self):
+
+        sequential_fn = FreightNetwork()
+        for fn in (self.fn, sequential_fn):
+            fn.derive.all_to_railway()
+        self.fn.cost_network()
+        start_cost = self.fn.total_cost
+
+        optimizer = self.fn.LINKS_OPTIMIZATION_CLASS(self.fn, incremental=True,
+                                                     lazy=True)
+        optimizer.optimize()
+        sequential_fn.min_network_cost_deriving_links(incremental=True)
+
+        # no move left would improve total cost
+        self.fn.cost_network()
+        end_cost = self.fn.total_cost
+        self.assertLess(end_cost, start_cost)
+        for candidate, delta in optimizer._score_moves(
+                optimizer._get_candidates()):
+            self.assertGreaterEqual(delta / end_cost, -0.001)
+
+        # best moves first can end in another modal split, of similar cost
+        self.assertAlmostEqual(end_cost / sequential_fn.total_cost, 1.0,
+                               places=3)
+
+    def test_lazy_optimization_checkpointed(self):
+
+        with self.assertRaises(ValueError):
+            self.fn.LINKS_OPTIMIZATION_CLASS(self.fn, lazy=True,
+                                             checkpointer=object())
+
+    # @unittest.skip("skip to speed up")
+    def test_annealing_optimization(self):
+
+        self.fn.derive.all_to_railway()
+        self.fn.cost_network()
+        start_cost = self.fn.total_cost
+
+        optimizer = self.fn.ANNEALING_OPTIMIZATION_CLASS(
+            self.fn, max_evaluations=30, seed=1)
+        optimizer.optimize()
+
+        # best configuration found is restored
+        self.assertLessEqual(self.fn.total_cost / start_cost, 1.0001)
+        self.assertAlmostEqual(self.fn.total_cost / optimizer.best_cost, 1.0,
+                               places=3)
+        for key in optimizer.best_on_roadway:
+            self.assertFalse(optimizer._is_in_railway(key))
+
+    # @unittest.skip("skip to speed up")
+    def test_annealing_zero_cost(self):
+
+        self.fn.derive.all_to_railway()
+        optimizer = self.fn.ANNEALING_OPTIMIZATION_CLASS(
+            self.fn, max_evaluations=5, seed=1)
+
+        # temperatures don't go to zero with a network with no cost
+        optimizer._get_total_cost = lambda: 0.0
+        optimizer.optimize()
+        self.assertEqual(optimizer.best_cost, 0.0)
+
+        # they are kept at the scale of cost deltas
+        self.assertEqual(optimizer._get_temperature(0.0, 0.5, 1000.0),
+                         optimizer.MIN_TEMPERATURE_SHARE * 1000.0)
+        self.assertEqual(optimizer._get_temperature(1000000.0, 0.0, 1.0),
+                         optimizer.INITIAL_TEMPERATURE * 1000000.0)
+
+    # @unittest.skip("skip to speed up")
+    def test_checkpoint_resume(self):
+
+        self.fn.derive.all_to_railway()
+        optimizer = self.fn.ODS_OPTIMIZATION_CLASS(self.fn)
+        candidates = optimizer._get_candidates()
+        self.fn.derive.od_to_roadway(self.fn.rail.get_od(*candidates[0]))
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, "test.checkpoint")
+
+            # base files left by other runs are replaced
+            with open(path + ".base", "wb") as f:
+                f.write("stale")
+            checkpointer = Checkpointer(path)
+            checkpointer.save(self.fn, "ods", candidates, 0)
+            checkpointer.save(self.fn, "ods", candidates, 1)
+            fn = FreightNetwork(resume_from=path)
+        finally:
+            shutil.rmtree(temp_dir)
+
+        # networks are restored with tons of the checkpoint
+        self.assertEqual(fn.resume_point, ("ods", candidates, 1))
+        for link in self.fn.rail.iter_links():
+            resumed_link = fn.rail.get_link(link.id, link.gauge)
+            self.assertAlmostEqual(resumed_link.tons.get(), link.tons.get(),
+                                   places=3)
+        # links are regrouped in dictionary order, changed by unpickling
+        self.fn.cost_network()
+        fn.cost_network()
+        self.assertAlmostEqual(fn.total_cost / self.fn.total_cost, 1.0,
+                               places=4)
+
+    # @unittest.skip("skip to speed up")
+    def test_snapshot_restore(self):
+
+        self.fn.cost_network()
+        start_cost = self.fn.total_cost
+        snapshot = self.fn.snapshot()
+        clone = self.fn.clone()
+
+        # branch deriving everything to railway
+        self.fn.derive.all_to_railway()
+        self.fn.cost_network()
+        self.assertNotAlmostEqual(self.fn.total_cost / start_cost, 1.0,
+                                  places=4)
+
+        # links removed from the network are put back by restore
+        rail_link = list(self.fn.rail.iter_links())[0]
+        self.fn.rail.remove_link(rail_link.id, rail_link.gauge)
+
+        # the clone is not affected by changes in the original network
+        clone.cost_network()
+        self.assertAlmostEqual(clone.total_cost / start_cost, 1.0, places=4)
+
+        # the snapshot can be restored many times
+        for i in xrange(2):
+            self.fn.restore(snapshot)
+            self.assertTrue(self.fn.rail.has_link(rail_link.id,
+                                                  rail_link.gauge))
+            self.fn.cost_network()
+            self.assertAlmostEqual(self.fn.total_cost / start_cost, 1.0,
+                                   places=7)
+            self.fn.derive.all_to_roadway()
+
+        # projections of restored tons can be reverted
+        self.fn.restore(tuple(network_snapshot.project(2.0)
+                              for network_snapshot in snapshot))
+        rail_od = next(od for od in self.fn.rail.iter_od_pairs()
+                       if od.tons.get() > 0.0)
+        projected_ton = rail_od.tons.get()
+        rail_od.tons.revert_project()
+        self.assertAlmostEqual(rail_od.tons.get() * 2.0, projected_ton)
+
+    # @unittest.skip("skip to speed up")
+    def test_build_snapshot(self):
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, "test.snapshot")
+
+            # the first time networks are built and saved to the snapshot
+            fn = FreightNetwork(snapshot=path)
+            build_snapshot = FreightNetwork.get_build_snapshot(path)
+            self.assertTrue(build_snapshot.is_valid())
+            self.assertFalse(FreightNetwork.get_build_snapshot(
+                path, projection_factor=2.0).is_valid())
+
+            # then they are loaded from it, already built
+            snapshot_fn = FreightNetwork(snapshot=path)
+            self.assertIsNot(snapshot_fn.rail, fn.rail)
+            self.assertEqual(len(list(snapshot_fn.rail.iter_od_pairs())),
+                             len(list(fn.rail.iter_od_pairs())))
+
+            # networks with restrictions have their own snapshot
+            restricted_fn = FreightNetwork(restrictions=True, snapshot=path)
+            restricted_path = os.path.join(temp_dir,
+                                           "test.restricted.snapshot")
+            modified = os.path.getmtime(restricted_path)
+            self.assertTrue(build_snapshot.is_valid())
+
+            restricted_snapshot_fn = FreightNetwork(restrictions=True,
+                                                    snapshot=path)
+            self.assertEqual(os.path.getmtime(restricted_path), modified)
+            self.assertEqual(
+                len(list(restricted_snapshot_fn.rail.iter_links())),
+                len(list(restricted_fn.rail.iter_links())))
+            self.assertLess(len(list(restricted_fn.rail.iter_links())),
+                            len(list(fn.rail.iter_links())))
+
+            # a change in the inputs invalidates the snapshot
+            xl_input = os.path.join(temp_dir, "input.xlsx")
+            with open(xl_input, "wb") as f:
+                f.write("original")
+            input_snapshot = BuildSnapshot(path, [xl_input])
+            input_snapshot.save(fn.rail, fn.road)
+            self.assertTrue(input_snapshot.is_valid())
+            with open(xl_input, "wb") as f:
+                f.write("changed")
+            self.assertFalse(BuildSnapshot(path, [xl_input]).is_valid())
+            self.assertIsNone(BuildSnapshot(path, [xl_input]).load())
+        finally:
+            shutil.rmtree(temp_dir)
+
+        # networks of the snapshot cost the same as the built ones
+        self.fn.cost_network()
+        snapshot_fn.cost_network()
+        self.assertAlmostEqual(snapshot_fn.total_cost / self.fn.total_cost,
+                               1.0, places=4)
+
+    # @unittest.skip("skip to speed up")
+    def test_metrics(self):
+
+        # building the networks loads every excel input
+        timers = self.fn.metrics().timers
+        for mode in ["railway", "roadway"]:
+            for xl_name in ["parameters", "od_pairs", "links", "paths"]:
+                self.assertIn(mode + ".load_xl." + xl_name, timers)
+
+        self.fn.reset_metrics()
+        self.fn.derive.all_to_railway()
+        self.fn.cost_network()
+        self.fn.min_network_cost_annealing(max_evaluations=5, seed=1)
+
+        metrics = self.fn.metrics()
+        self.assertEqual(metrics.timers["freight.derive.all_to_railway"]
+                         ["calls"], 1)
+        self.assertGreater(metrics.counters["freight.derive.ods"], 0)
+        self.assertGreaterEqual(metrics.counters[
+            "freight.optimizer.evaluations"], 5)
+        self.assertIn("freight.optimize.annealing", metrics.timers)
+        for phase in ["mobility", "infrastructure", "time"]:
+            self.assertIn("railway.cost." + phase, metrics.timers)
+            self.assertIn("roadway.cost." + phase, metrics.timers)
+        self.assertGreater(metrics.counters["railway.regroup_link.trials"],
+                           0)
+        self.assertNotIn("railway.load_xl.links", metrics.timers)
+
 
 if __name__ == '__main__':
     unittest.main()
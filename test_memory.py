@@ -0,0 +1,91 @@
+import unittest
+import os
+import subprocess
+import sys
+from memory import get_footprint, NetworkMemoryFootprint
+from modal_networks import RoadwayNetwork
+from modules import RoadwayNetworkBuilder
+from synthetic import SyntheticNetworkGenerator
+
+
+class MemoryTestCase(unittest.TestCase):
+
+    def setUp(self):
+
+        self.generator = SyntheticNetworkGenerator(nodes=30, od_pairs=150,
+                                                   seed=1)
+        self.rn = self._build(trace_memory=True)
+
+    def _build(self, trace_memory=False, compact=False):
+
+        inputs = self.generator.get_workbooks()["roadway"]
+        builder = RoadwayNetworkBuilder(
+            xl_parameters=inputs["parameters"],
+            xl_od_pairs=inputs["od_pairs"], xl_links=inputs["links"],
+            xl_paths=inputs["paths"],
+            xl_restricted_links=inputs["restricted_links"],
+            trace_memory=trace_memory, compact=compact)
+
+        return RoadwayNetwork(builder)
+
+    def test_get_footprint(self):
+
+        shared = ["a" * 100]
+        size, objects = get_footprint([shared, shared])
+        self.assertEqual(objects, 3)
+
+        # objects already seen are not counted again
+        seen = set()
+        get_footprint(shared, seen)
+        self.assertEqual(get_footprint([shared], seen)[1], 1)
+
+    def test_footprint(self):
+
+        footprint = NetworkMemoryFootprint(self.rn).as_dict()
+
+        for structure in ["params", "links", "od_pairs", "paths", "graphs"]:
+            self.assertGreater(footprint[structure]["bytes"], 0)
+        self.assertNotIn("shortest_paths", footprint)
+
+        # every od pair, its tons and its list of links are counted
+        self.assertGreater(footprint["od_pairs"]["objects"],
+                           3 * len(list(self.rn.iter_od_pairs())))
+
+    def test_trace_memory(self):
+
+        self.assertFalse(self.rn.metrics.trace_memory)
+        for phase in ["load_xl.od_pairs", "load_xl.paths", "build.find_paths",
+                      "build.assign_tons"]:
+            self.assertIn(phase, self.rn.metrics.memory)
+
+        # without tracemalloc peaks are growths of the peak memory of the
+        # process, so loading od pairs surely grows it in a fresh process
+        code = ("import test_memory\n"
+                "test = test_memory.MemoryTestCase('test_trace_memory')\n"
+                "test.setUp()\n"
+                "print test.rn.metrics.memory['load_xl.od_pairs']")
+        output = subprocess.check_output(
+            [sys.executable, "-c", code],
+            cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertGreater(int(output.split()[-1]), 0)
+
+    def test_compact(self):
+
+        compact_rn = self._build(compact=True)
+        footprint = NetworkMemoryFootprint(self.rn).as_dict()
+        compact_footprint = NetworkMemoryFootprint(compact_rn).as_dict()
+
+        for structure in ["od_pairs", "paths"]:
+            self.assertLess(compact_footprint[structure]["bytes"],
+                            footprint[structure]["bytes"])
+
+        # the same network is built
+        self.assertEqual(
+            sorted((od.id, od.category, od.path, od.links, od.tons.get())
+                   for od in compact_rn.iter_od_pairs()),
+            sorted((od.id, od.category, od.path, od.links, od.tons.get())
+                   for od in self.rn.iter_od_pairs()))
+
+
+if __name__ == '__main__':
+    unittest.main()
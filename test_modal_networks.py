@@ -2,6 +2,7 @@ import unittest
 import os
 from modules.builder import RailwayNetworkBuilder
 from modal_networks import RailwayNetwork
+from modules import RailwayNetworkCost
 
 
 # @unittest.skip("RailwayNetwork test skipped")
@@ -43,6 +44,49 @@ class RailwayNetworkTestCase(unittest.TestCase):
         self.assertEqual(self.rn.high_density_dimension, 0.0)
         self.assertEqual(self.rn.low_density_dimension, 8121.0)
 
+    def test_cached_properties(self):
+        ton_km = self.rn.ton_km
+
+        # aggregates are reused while the network doesn't change
+        self.assertEqual(self.rn._cached["ton_km"], ton_km)
+
+        # adding tons to a link invalidates them
+        link = self.rn.iter_links().next()
+        link.tons.add_original(1000.0, "test", "test")
+        self.assertAlmostEqual(self.rn.ton_km, ton_km + 1000.0 * link.dist)
+
+    def test_to_arrays(self):
+        arrays = self.rn.to_arrays()
+
+        self.assertAlmostEqual(arrays.od_tons.sum(),
+                               sum(od.tons.get()
+                                   for od in self.rn.iter_od_pairs()))
+        self.assertAlmostEqual(arrays.link_dist[arrays.link_tons > 0].sum(),
+                               sum(link.dist for link in self.rn.iter_links()
+                                   if link.tons.get() > 0))
+        self.assertAlmostEqual(arrays.link_gross_ton_km.sum(),
+                               sum(link.gross_ton_km
+                                   for link in self.rn.iter_links()),
+                               delta=1)
+
+        # paths go through the links of od pairs
+        row = arrays.od_tons.argmax()
+        od = arrays.ods[row]
+        self.assertEqual(sorted(arrays.link_keys[column][0] for column
+                                in arrays.get_path_links(row)),
+                         sorted(od.links))
+
+        # only changed links and od pairs are taken again
+        link = self.rn.get_link(od.links[0], od.gauge)
+        column = arrays.link_columns[(link.id, link.gauge)]
+        tons = arrays.link_tons[column]
+        link.tons.add_original(1000.0, od.category, od.id)
+        od.tons.add_original(1000.0)
+
+        self.assertIs(self.rn.to_arrays(), arrays)
+        self.assertAlmostEqual(arrays.link_tons[column], tons + 1000.0)
+        self.assertAlmostEqual(arrays.od_tons[row], od.tons.get())
+
     def test_get_average_distance(self):
         distance = self.rn.average_distance
         self.assertAlmostEqual(distance, 500.0, delta=1)
@@ -52,6 +96,96 @@ class RailwayNetworkTestCase(unittest.TestCase):
         mobility_cost = self.rn.costs["mob"]["total_mobility"]
         self.assertAlmostEqual(mobility_cost, 0.0151102490303395, delta=0.0001)
 
+    def test_regroup_delta(self):
+        self.rn.calc_simple_mobility_cost()
+        total_ton_km = self.rn.ton_km
+
+        # take the link with more idle capacity to be regrouped
+        link = max(self.rn.iter_links(),
+                   key=lambda x: x.idle_capacity_regroup)
+        idle_locs = self.rn._get_idle_locs(link)
+        self.assertGreater(idle_locs, 0)
+
+        # closed form change in cost must match regrouping the link
+        network_cost = RailwayNetworkCost(self.rn, total_ton_km)
+        delta_cost = network_cost.cost_regroup(idle_locs, link.dist)
+
+        old_cost = self.rn._calc_mobility_cost(total_ton_km)["total_mobility"]
+        self.rn._regroup_link(link)
+        new_cost = self.rn._calc_mobility_cost(total_ton_km)["total_mobility"]
+
+        self.assertAlmostEqual(delta_cost, new_cost - old_cost)
+
+    def test_regroup_decisions(self):
+        self.rn.calc_simple_mobility_cost()
+        total_ton_km = self.rn.ton_km
+
+        for link in self.rn.iter_links():
+            network_cost = RailwayNetworkCost(self.rn, total_ton_km)
+            delta_cost = network_cost.cost_regroup(
+                self.rn._get_idle_locs(link), link.dist)
+
+            # regroup the link recosting all mobility, and revert it
+            old_cost = self.rn._calc_mobility_cost(
+                total_ton_km)["total_mobility"]
+            self.rn._regroup_link(link)
+            new_cost = self.rn._calc_mobility_cost(
+                total_ton_km)["total_mobility"]
+            self.rn._revert_regroup_link(link)
+            self.assertEqual(self.rn._calc_mobility_cost(
+                total_ton_km)["total_mobility"], old_cost)
+
+            # closed form decision is the same as the recosted one
+            self.assertAlmostEqual(delta_cost, new_cost - old_cost)
+            self.assertEqual(delta_cost < 0, new_cost < old_cost)
+            self.rn.regroup_link(link, total_ton_km)
+
+    def test_calc_optimized_mobility_cost_batched(self):
+        self.rn.calc_optimized_mobility_cost(batched=True)
+        mobility_cost = self.rn.costs["mob"]["total_mobility"]
+        self.assertAlmostEqual(mobility_cost, 0.0151102490303395, delta=0.0001)
+
+    def test_find_lowest_scale_links(self):
+
+        # change scale of some links after the index was built
+        self.rn.find_lowest_scale_links()
+        for link in list(self.rn.iter_links())[::3]:
+            link.tons.add_original(1000000.0, 2, "test")
+        self.rn.find_lowest_scale_links()
+        lowest_links = [od.lowest_link for od in self.rn.iter_od_pairs()]
+
+        # must match finding the lowest link of od pairs one by one
+        for od, lowest_link in zip(self.rn.iter_od_pairs(), lowest_links):
+            self.rn.find_lowest_scale_link(od)
+            self.assertIs(od.lowest_link, lowest_link)
+
+    def test_get_ods_using_link(self):
+        for link in self.rn.iter_links():
+            ods = [od for od in self.rn.iter_od_pairs()
+                   if link.id in od.links and link.gauge == od.gauge]
+
+            self.assertItemsEqual(self.rn.get_ods_using_link(link.id,
+                                                             link.gauge), ods)
+
+        # removed od pairs are removed from the index
+        od = [od for od in self.rn.iter_od_pairs() if od.links][0]
+        self.rn.remove_od(od.id, od.category)
+        self.assertNotIn(od, self.rn.get_ods_using_link(od.links[0],
+                                                        od.gauge))
+
+    def test_get_ods_turnouts_regroups(self):
+        self.rn.cost_network()
+        ods = [od for od in self.rn.iter_od_pairs() if od.has_operable_path()]
+        turnouts, regroups = self.rn.get_ods_turnouts_regroups(ods)
+
+        # summed through incidence must match summing links of each od
+        for od, num_turnouts, num_regroups in zip(ods, turnouts, regroups):
+            self.assertAlmostEqual(num_turnouts,
+                                   self.rn.get_turnouts(od.links, od.gauge))
+            if self.rn.od_can_be_regrouped(od):
+                self.assertEqual(num_regroups,
+                                 self.rn.get_regroups(od.links, od.gauge))
+
     def test_calc_infrastructure_cost(self):
         self.rn.calc_optimized_mobility_cost()
         self.rn.calc_infrastructure_cost()
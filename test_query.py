@@ -0,0 +1,71 @@
+import unittest
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import query
+from freight_network import FreightNetwork
+
+
+class QueryTestCase(unittest.TestCase):
+
+    def setUp(self):
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "test.snapshot")
+        self.fn = FreightNetwork(snapshot=self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_query_path(self):
+
+        index = query.get_index(self.path)
+        od = self.fn.rail.iter_od_pairs().next()
+
+        lines = query.query_path(index, "railway", od.id)
+        categories = [line.split("\t")[0] for line in lines]
+        self.assertIn(str(od.category), categories)
+
+        line = lines[categories.index(str(od.category))]
+        self.assertEqual(line.split("\t")[1:3], [od.path, od.gauge])
+
+        # nodes of the od pair can be given in any order
+        reversed_id = "-".join(reversed(od.id.split("-")))
+        self.assertEqual(query.query_path(index, "railway", reversed_id),
+                         lines)
+
+        self.assertRaises(KeyError, query.query_path, index, "railway", "x")
+
+    def test_query_summary(self):
+
+        index = query.get_index(self.path)
+        lines = query.query_summary(index)
+
+        self.assertEqual(len(lines), 3)
+        fields = dict(zip(lines[0].split("\t"), lines[1].split("\t")))
+        self.assertEqual(fields["mode"], self.fn.rail.MODE_NAME)
+        self.assertAlmostEqual(float(fields["ton"]), self.fn.rail.ton,
+                               delta=1)
+
+    def test_main(self):
+
+        self.assertEqual(query.main(["summary", self.path]), 0)
+        self.assertEqual(query.main(["summary", self.path + ".missing"]), 1)
+        self.assertEqual(query.main(["path"]), 2)
+
+    def test_lean_imports(self):
+
+        # excel and parallel processing modules are only imported when used
+        code = ("import sys, freight_network, query\n"
+                "from dijkstra import find_paths\n"
+                "heavy = ['openpyxl', 'multiprocessing']\n"
+                "sys.exit(any(name in sys.modules for name in heavy))")
+        self.assertEqual(subprocess.call([sys.executable, "-c", code],
+                                         cwd=os.path.dirname(
+                                             os.path.abspath(__file__))), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
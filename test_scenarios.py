@@ -0,0 +1,63 @@
+import unittest
+import os
+import shutil
+import tempfile
+from scenarios import ScenarioRunner
+
+
+class ScenarioRunnerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_load_scenarios(self):
+
+        path = os.path.join(self.temp_dir, "scenarios.csv")
+        with open(path, "wb") as f:
+            f.write("name,projection_factor,restrictions,policy\n")
+            f.write("base,,,\n")
+            f.write("projected,1.5,true,all_to_roadway\n")
+
+        runner = ScenarioRunner(ScenarioRunner.load_scenarios(path))
+
+        self.assertEqual(runner.scenarios[0],
+                         {"name": "base", "projection_factor": 1.0,
+                          "restrictions": False, "policy": "current"})
+        self.assertEqual(runner.scenarios[1],
+                         {"name": "projected", "projection_factor": 1.5,
+                          "restrictions": True, "policy": "all_to_roadway"})
+
+        self.assertRaises(ValueError, ScenarioRunner, [{"policy": "none"}])
+
+    # @unittest.skip("skip to speed up")
+    def test_run(self):
+
+        scenarios = [{"name": "current"},
+                     {"name": "Projected x2", "projection_factor": 2.0},
+                     {"name": "roadway", "policy": "all_to_roadway"}]
+        xl_report = os.path.join(self.temp_dir, "scenarios_report.xlsx")
+        metrics_dir = os.path.join(self.temp_dir, "metrics")
+        results = ScenarioRunner(scenarios, 2, xl_report, metrics_dir).run()
+
+        self.assertTrue(os.path.isfile(xl_report))
+        self.assertEqual(sorted(os.listdir(metrics_dir)),
+                         ["base.json", "current.json", "projected_x2.json",
+                          "roadway.json"])
+        self.assertEqual([result["name"] for result in results],
+                         ["current", "Projected x2", "roadway"])
+
+        # scenarios branch from the same current situation
+        current, projected, roadway = results
+        self.assertAlmostEqual(projected["road_ton"] / current["road_ton"],
+                               2.0, places=5)
+        self.assertAlmostEqual(roadway["rail_ton"], 0.0, places=3)
+        self.assertAlmostEqual(roadway["road_ton"],
+                               current["road_ton"] + current["rail_ton"],
+                               places=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from synthetic import SyntheticNetworkGenerator
+from benchmark import BenchmarkSuite
+
+
+class SyntheticNetworkGeneratorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.generator = SyntheticNetworkGenerator(nodes=30, od_pairs=150,
+                                                   seed=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_generate(self):
+
+        tables = self.generator.generate()
+
+        # the same seed generates the same network
+        other = SyntheticNetworkGenerator(nodes=30, od_pairs=150, seed=1)
+        self.assertEqual(other.generate()["railway"]["links"],
+                         tables["railway"]["links"])
+
+        # every od pair of each mode has a path
+        for mode in ["railway", "roadway"]:
+            ids_with_path = set(row[0] for row in tables[mode]["paths"][1:])
+            for row in tables[mode]["od_pairs"][1:]:
+                self.assertIn(row[0], ids_with_path)
+
+        # railway od pairs never have category 0
+        self.assertNotIn(0, [row[2] for row in
+                             tables["railway"]["od_pairs"][1:]])
+
+    def test_build(self):
+
+        params = {"railway": {"min_tons_to_derive": 0.0}}
+        generator = SyntheticNetworkGenerator(nodes=30, od_pairs=150,
+                                              params=params, seed=1)
+        fn = generator.build(directory=self.temp_dir)
+        fn.cost_network()
+
+        self.assertTrue(os.path.isfile(os.path.join(self.temp_dir,
+                                                    "railway_links.xlsx")))
+        self.assertEqual(fn.rail.params["min_tons_to_derive"].value, 0.0)
+        self.assertEqual(len(list(fn.road.iter_od_pairs())), 150)
+        self.assertGreater(fn.total_cost, 0.0)
+
+        # networks built from memory are the same as those built from disk
+        fn_memory = generator.build()
+        fn_memory.cost_network()
+        self.assertAlmostEqual(fn_memory.total_cost, fn.total_cost, places=3)
+
+
+class BenchmarkSuiteTestCase(unittest.TestCase):
+
+    def test_run(self):
+
+        benchmarks = ["generate", "build", "cost_network",
+                      "scenario_all_to_railway", "optimizer_links"]
+        suite = BenchmarkSuite([0.5, 1], {"nodes": 20, "od_pairs": 100},
+                               benchmarks)
+        records = suite.run()
+
+        self.assertEqual([record["benchmark"] for record in records],
+                         benchmarks * 2)
+        self.assertEqual([record["nodes"] for record in records],
+                         [10] * 5 + [20] * 5)
+        for record in records:
+            self.assertGreaterEqual(record["seconds"], 0.0)
+            self.assertIn("rail_links", record)
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, "benchmark.json")
+            suite.write(path)
+            with open(path) as f:
+                self.assertEqual(len(json.load(f)), 10)
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()